@@ -0,0 +1,102 @@
+import threading
+from bisect import bisect_left
+
+from db import db
+
+
+class Availability:
+    """Кэш занятости номеров по активным броням.
+
+    Для каждого номера хранится отсортированный по заезду список броней.
+    Активные брони одного номера не пересекаются (ограничение
+    bookings_no_overlap), поэтому занятость периода проверяется бинарным
+    поиском: O(log n) на номер. Если ограничения в базе нет (миграции ещё не
+    дошли до 0005), проверяем все брони номера подряд. Кэш сбрасывается invalidate() после любой записи и
+    перечитывается при следующем обращении — из фонового потока, а не из GUI.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._loaded = None  # номер поколения, для которого загружены данные
+        self._rooms = []  # (id, number, status) по порядку номеров
+        self._starts = {}  # room_id -> [date_from, ...]
+        self._stays = {}  # room_id -> [(date_from, date_to, booking_id), ...]
+        self._no_overlap = False  # есть ли в базе ограничение bookings_no_overlap
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def load(self):
+        """Перечитываем номера и брони, если кэш устарел (ходит в БД)."""
+        with self._lock:
+            if self._loaded == self._generation:
+                return
+            generation = self._generation
+        no_overlap = db.fetchone(
+            "SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap')"
+        )[0]
+        rooms = db.fetchall("SELECT id, number, status FROM rooms ORDER BY number")
+        # пустые интервалы (date_from = date_to) ни с чем не пересекаются
+        bookings = db.fetchall(
+            """
+            SELECT room_id, date_from, date_to, id
+            FROM bookings
+            WHERE status='active' AND date_from < date_to
+            ORDER BY room_id, date_from
+            """
+        )
+        starts, stays = {}, {}
+        for room_id, d_from, d_to, bid in bookings:
+            starts.setdefault(room_id, []).append(d_from)
+            stays.setdefault(room_id, []).append((d_from, d_to, bid))
+        with self._lock:
+            self._rooms, self._starts, self._stays = rooms, starts, stays
+            self._no_overlap = no_overlap
+            # если пока читали, кто-то записал — при следующем обращении перечитаем
+            self._loaded = generation
+
+    def _is_free(self, room_id, d_from, d_to, exclude_booking=None):
+        if d_from >= d_to:
+            return True
+        starts = self._starts.get(room_id)
+        if not starts:
+            return True
+        stays = self._stays[room_id]
+        if not self._no_overlap:
+            # брони номера могут пересекаться — бинарный поиск не годится
+            return not any(
+                s_from < d_to and s_to > d_from and bid != exclude_booking
+                for s_from, s_to, bid in stays
+            )
+        # последняя бронь, начавшаяся раньше d_to; с остальными пересечься
+        # не может, раз брони номера не пересекаются между собой
+        i = bisect_left(starts, d_to) - 1
+        while i >= 0 and stays[i][2] == exclude_booking:
+            i -= 1
+        return i < 0 or stays[i][1] <= d_from
+
+    def is_free(self, room_id, d_from, d_to, exclude_booking=None):
+        """Свободен ли номер на [d_from, d_to) без учёта брони exclude_booking."""
+        self.load()
+        with self._lock:
+            return self._is_free(room_id, d_from, d_to, exclude_booking)
+
+    def free_rooms(self, d_from, d_to, exclude_booking=None, include_room=None):
+        """Номера (id, number, status), свободные на [d_from, d_to).
+
+        include_room попадает в список в любом случае — это текущий номер
+        редактируемой брони.
+        """
+        self.load()
+        with self._lock:
+            return [
+                room
+                for room in self._rooms
+                if room[0] == include_room
+                or self._is_free(room[0], d_from, d_to, exclude_booking)
+            ]
+
+
+availability = Availability()
@@ -0,0 +1,171 @@
+"""Задержка горячих запросов по броням до и после INDEXES_DDL (миграция 0001).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_booking_indexes [--bookings 300000] [--dsn ...]
+
+Данные создаются во временной схеме bench_idx и удаляются после замера,
+рабочие таблицы не трогаются.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+import migrate
+from config import GOST_DSN
+
+SCHEMA = "bench_idx"
+ROOMS = 500
+BASE_DATE = date(2015, 1, 1)
+SLOT_DAYS = 8  # брони одного номера не пересекаются: слот 8 дней, проживание 1..7
+
+QUERIES = {
+    "пересечение по номеру": (
+        """
+        SELECT 1 FROM bookings
+        WHERE room_id=%s AND status='active' AND (%s < date_to) AND (%s > date_from)
+        """,
+        lambda ctx: (random.randint(1, ROOMS), *ctx["stay"]()),
+    ),
+    "активная бронь гостя": (
+        """
+        SELECT id, room_id FROM bookings
+        WHERE guest_id=%s AND status='active' ORDER BY id DESC LIMIT 1
+        """,
+        lambda ctx: (random.randint(1, ctx["guests"]),),
+    ),
+    "свободные номера на период": (
+        """
+        SELECT count(*) FROM rooms r
+        WHERE NOT EXISTS (
+            SELECT 1 FROM bookings b
+            WHERE b.room_id = r.id AND b.status='active'
+              AND b.stay && daterange(%s, %s)
+        )
+        """,
+        lambda ctx: ctx["stay"](),
+    ),
+    "гость по имени": (
+        "SELECT id FROM guests WHERE first_name=%s AND last_name=%s ORDER BY id DESC LIMIT 1",
+        lambda ctx: ("Имя%d" % random.randint(0, 999), "Фамилия%d" % random.randint(1, ctx["guests"])),
+    ),
+    "страница активных броней": (
+        """
+        SELECT b.id, r.number, b.date_from, b.date_to, b.status
+        FROM bookings b LEFT JOIN rooms r ON r.id=b.room_id
+        WHERE b.status = 'active'
+        ORDER BY b.date_from DESC, b.id DESC
+        LIMIT 200
+        """,
+        lambda ctx: (),
+    ),
+}
+
+
+def seed(cur, bookings, guests):
+    cur.execute(
+        "INSERT INTO rooms(number, floor) SELECT 'B-' || i, i / 100 FROM generate_series(1, %s) i",
+        (ROOMS,),
+    )
+    cur.execute(
+        """
+        INSERT INTO guests(first_name, last_name)
+        SELECT 'Имя' || (i %% 1000), 'Фамилия' || i FROM generate_series(1, %s) i
+        """,
+        (guests,),
+    )
+    # i-я бронь: номер i % ROOMS, слот i / ROOMS; последние 5% слотов — активные
+    cur.execute(
+        """
+        INSERT INTO bookings(room_id, guest_id, date_from, date_to, status, total_price)
+        SELECT 1 + i %% %(rooms)s,
+               1 + i %% %(guests)s,
+               %(base)s::date + (i / %(rooms)s) * %(slot)s,
+               %(base)s::date + (i / %(rooms)s) * %(slot)s + 1 + i %% 7,
+               CASE
+                   WHEN i >= %(active_from)s THEN 'active'
+                   WHEN i %% 10 = 0 THEN 'cancelled'
+                   ELSE 'completed'
+               END,
+               100
+        FROM generate_series(0, %(n)s - 1) i
+        """,
+        {
+            "rooms": ROOMS,
+            "guests": guests,
+            "base": BASE_DATE,
+            "slot": SLOT_DAYS,
+            "active_from": int(bookings * 0.95),
+            "n": bookings,
+        },
+    )
+    cur.execute("ANALYZE")
+
+
+def measure(cur, ctx, repeats):
+    result = {}
+    for name, (sql, make_params) in QUERIES.items():
+        timings = []
+        for _ in range(repeats):
+            params = make_params(ctx)
+            t0 = time.perf_counter()
+            cur.execute(sql, params)
+            cur.fetchall()
+            timings.append((time.perf_counter() - t0) * 1000)
+        result[name] = statistics.median(timings)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=GOST_DSN)
+    parser.add_argument("--bookings", type=int, default=300_000)
+    parser.add_argument("--guests", type=int, default=100_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    days = (args.bookings // ROOMS + 1) * SLOT_DAYS
+
+    def stay():
+        start = BASE_DATE + timedelta(days=random.randint(int(days * 0.9), days))
+        return start, start + timedelta(days=random.randint(1, 7))
+
+    ctx = {"guests": args.guests, "stay": stay}
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # расширение ставим в public, иначе оно уйдёт вместе со схемой бенчмарка
+            cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"SET search_path = {SCHEMA}, public")
+            initial = migrate.module(1)
+            cur.execute(initial.SCHEMA_DDL)
+
+            t0 = time.perf_counter()
+            seed(cur, args.bookings, args.guests)
+            print(f"seed: {args.bookings} броней за {time.perf_counter() - t0:.1f} c")
+
+            before = measure(cur, ctx, args.repeats)
+            t0 = time.perf_counter()
+            cur.execute(initial.INDEXES_DDL)
+            cur.execute("ANALYZE")
+            print(f"индексы построены за {time.perf_counter() - t0:.1f} c")
+            after = measure(cur, ctx, args.repeats)
+
+            print(f"\n{'запрос':<30}{'до, мс':>12}{'после, мс':>12}")
+            for name in QUERIES:
+                print(f"{name:<30}{before[name]:>12.2f}{after[name]:>12.2f}")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
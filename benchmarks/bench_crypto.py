@@ -0,0 +1,76 @@
+"""Шифрование паспортов: поштучно с новым AESGCM на вызов против encrypt_many/decrypt_many.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_crypto [--count 100000] [--workers 4]
+
+БД не нужна, ключ берётся так же, как в приложении (GOST_KEY или enc_key.bin).
+"""
+import argparse
+import os
+import random
+import time
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from crypto_utils import CURRENT_KEY_ID, KEYRING, decrypt_many, encrypt_many
+
+
+def passports(count):
+    # серия и номер паспорта РФ: "1234 567890"
+    return [
+        f"{random.randint(1000, 9999)} {random.randint(0, 999999):06d}".encode("utf-8")
+        for _ in range(count)
+    ]
+
+
+def old_encrypt(plaintexts):
+    """Как было: новый объект шифра на каждое значение."""
+    result = []
+    for p in plaintexts:
+        nonce = os.urandom(12)
+        result.append((CURRENT_KEY_ID, nonce, AESGCM(KEYRING[CURRENT_KEY_ID]).encrypt(nonce, p, None)))
+    return result
+
+
+def old_decrypt(items):
+    return [AESGCM(KEYRING[key_id]).decrypt(nonce, ct, None) for key_id, nonce, ct in items]
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    data = passports(args.count)
+    rows = []
+
+    items, t = timed(old_encrypt, data)
+    rows.append(("шифрование, AESGCM на вызов", t))
+    _, t = timed(encrypt_many, data, 1)
+    rows.append(("шифрование, encrypt_many 1 поток", t))
+    items, t = timed(encrypt_many, data, args.workers)
+    rows.append(("шифрование, encrypt_many пул", t))
+
+    _, t = timed(old_decrypt, items)
+    rows.append(("расшифровка, AESGCM на вызов", t))
+    _, t = timed(decrypt_many, items, 1)
+    rows.append(("расшифровка, decrypt_many 1 поток", t))
+    plain, t = timed(decrypt_many, items, args.workers)
+    rows.append(("расшифровка, decrypt_many пул", t))
+    assert plain == data
+
+    print(f"{args.count} паспортов\n")
+    print(f"{'вариант':<36}{'всего, с':>10}{'мкс/шт':>10}")
+    for name, t in rows:
+        print(f"{name:<36}{t:>10.3f}{t / args.count * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
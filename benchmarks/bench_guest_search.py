@@ -0,0 +1,126 @@
+"""Время ответа поиска гостя по мере ввода (guest_picker.search_guests).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_guest_search [--guests 200000] [--dsn ...]
+
+Гости создаются во временной схеме bench_guest_search, индекс строит та же
+миграция, что и в рабочей базе; после замера схема удаляется. Запросы —
+куски настоящих фамилий, «фамилия имя» и цифры телефонов, как их набирают.
+Цель — медиана и p95 меньше 50 мс на запрос; итог замера печатается как есть.
+"""
+import argparse
+import random
+import statistics
+import time
+
+import psycopg2
+
+import migrate
+from config import GOST_DSN
+from db import db
+from guest_picker import search_guests
+
+SCHEMA = "bench_guest_search"
+TARGET_MS = 50
+
+FIRST_NAMES = [
+    "Александр", "Алексей", "Анна", "Андрей", "Дарья", "Дмитрий", "Екатерина", "Елена",
+    "Иван", "Ирина", "Кирилл", "Мария", "Михаил", "Наталья", "Никита", "Ольга",
+    "Павел", "Полина", "Сергей", "Татьяна", "Юлия", "Ярослав",
+]
+ROOTS = [
+    "Иван", "Смирн", "Кузнец", "Попов", "Васил", "Петр", "Соколов", "Михайл", "Новик",
+    "Фёдор", "Морозов", "Волков", "Алексе", "Лебед", "Семён", "Егор", "Павлов", "Козлов",
+    "Степан", "Николае", "Орлов", "Андрее", "Макаров", "Никит", "Захар", "Зайцев",
+    "Соловьёв", "Борисов", "Яковлев", "Григорьев", "Романов", "Воробьёв", "Сергее",
+]
+SUFFIXES = ["ов", "ев", "ин", "ский", "енко", "ых", ""]
+
+
+def seed_guests(cur, guests):
+    cur.execute(
+        """
+        INSERT INTO guests(first_name, last_name, phone)
+        SELECT f[1 + (i * 7) %% array_length(f, 1)],
+               r[1 + i %% array_length(r, 1)] || s[1 + (i / 97) %% array_length(s, 1)],
+               '+79' || lpad(((i * 7919) %% 1000000000)::text, 9, '0')
+        FROM generate_series(1, %s) i,
+             (SELECT %s::text[] AS f, %s::text[] AS r, %s::text[] AS s) names
+        """,
+        (guests, FIRST_NAMES, ROOTS, SUFFIXES),
+    )
+    cur.execute("ANALYZE guests")
+
+
+def sample_queries(n):
+    rows = db.fetchall(
+        "SELECT first_name, last_name, phone FROM guests ORDER BY random() LIMIT %s", (n,)
+    )
+    queries = []
+    for first_name, last_name, phone in rows:
+        kind = random.randrange(3)
+        if kind == 0:
+            queries.append(last_name[: random.randint(3, len(last_name))])
+        elif kind == 1:
+            queries.append(f"{last_name} {first_name[: random.randint(1, 4)]}")
+        else:
+            digits = phone.lstrip("+")
+            start = random.randrange(len(digits) - 5)
+            queries.append(digits[start:start + random.randint(4, 6)])
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=GOST_DSN)
+    parser.add_argument("--guests", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # расширения ставим в public, иначе они уйдут вместе со схемой бенчмарка
+            cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"SET search_path = {SCHEMA}, public")
+            cur.execute(migrate.module(1).SCHEMA_DDL)
+            t0 = time.perf_counter()
+            seed_guests(cur, args.guests)
+            print(f"seed: {args.guests} гостей за {time.perf_counter() - t0:.1f} c")
+            t0 = time.perf_counter()
+            migrate.module(3).up(cur)
+            print(f"индекс: {time.perf_counter() - t0:.1f} c")
+
+        db.dsn = f"{args.dsn} options='-c search_path={SCHEMA},public'"
+        db.connect()
+        try:
+            queries = sample_queries(args.repeats)
+            timings, sizes = [], []
+            for text in queries:
+                t0 = time.perf_counter()
+                found = search_guests(text)
+                timings.append((time.perf_counter() - t0) * 1000)
+                sizes.append(len(found))
+        finally:
+            db.close()
+
+        med = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"найдено гостей на запрос: в среднем {statistics.mean(sizes):.1f}")
+        print(f"поиск: медиана {med:.1f} мс, p95 {p95:.1f} мс (цель < {TARGET_MS} мс)")
+        if p95 < TARGET_MS:
+            print("цель достигнута")
+        else:
+            print(f"цель НЕ достигнута: p95 больше {TARGET_MS} мс")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Время ответа подбора номера (pricing.quote_free_rooms) на большом отеле.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_quote [--rooms 1000] [--bookings 200000] [--dsn ...]
+
+Данные и правила цены создаются во временной схеме bench_quote и удаляются
+после замера, рабочие таблицы не трогаются. Цель — меньше 100 мс на запрос.
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import psycopg2
+
+import migrate
+from config import GOST_DSN
+from db import db
+from pricing import pricing, quote_free_rooms
+
+SCHEMA = "bench_quote"
+BASE_DATE = date(2024, 1, 1)
+TARGET_MS = 100
+
+
+def seed_bookings(cur, rooms, bookings):
+    cur.execute(
+        """
+        INSERT INTO room_types(name, base_price)
+        SELECT 'Категория ' || i, 2000 + i * 750 FROM generate_series(1, 8) i
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO rooms(number, type_id, floor, max_guests)
+        SELECT 'Q-' || i, 1 + i %% 8, i / 50, 1 + i %% 4 FROM generate_series(1, %s) i
+        """,
+        (rooms,),
+    )
+    # брони одного номера идут подряд по 1..7 ночей с зазором в день
+    cur.execute(
+        """
+        INSERT INTO bookings(room_id, date_from, date_to, status, total_price)
+        SELECT room_id,
+               %(base)s::date + k * 8,
+               %(base)s::date + k * 8 + 1 + (room_id + k) %% 7,
+               CASE WHEN k %% 10 = 0 THEN 'cancelled' ELSE 'active' END,
+               5000
+        FROM (
+            SELECT 1 + i %% %(rooms)s AS room_id, i / %(rooms)s AS k
+            FROM generate_series(0, %(n)s - 1) i
+        ) t
+        """,
+        {"base": BASE_DATE, "rooms": rooms, "n": bookings},
+    )
+
+
+def seed_rules(cur):
+    cur.execute(
+        """
+        INSERT INTO price_seasons(name, date_from, date_to, multiplier)
+        SELECT 'Лето ' || y, make_date(y, 6, 1), make_date(y, 9, 1), 1.3
+        FROM generate_series(2024, 2030) y
+        """
+    )
+    cur.execute("INSERT INTO price_weekdays VALUES (4, 1.15), (5, 1.2)")
+    cur.execute("INSERT INTO price_stay_discounts VALUES (3, 5), (7, 10)")
+    cur.execute("INSERT INTO price_occupancy_surcharges VALUES (70, 10), (90, 25)")
+    cur.execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=GOST_DSN)
+    parser.add_argument("--rooms", type=int, default=1000)
+    parser.add_argument("--bookings", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    days = args.bookings // args.rooms * 8
+
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            # расширение ставим в public, иначе оно уйдёт вместе со схемой бенчмарка
+            cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cur.execute(f"CREATE SCHEMA {SCHEMA}")
+            cur.execute(f"SET search_path = {SCHEMA}, public")
+            initial = migrate.module(1)
+            cur.execute(initial.SCHEMA_DDL)
+            t0 = time.perf_counter()
+            seed_bookings(cur, args.rooms, args.bookings)
+            # свёртка занятости заполнится одним пересчётом, а не триггером на каждую бронь
+            for ddl in (initial.INDEXES_DDL, initial.OCCUPANCY_DDL, initial.PRICING_DDL):
+                cur.execute(ddl)
+            seed_rules(cur)
+            print(f"seed: {args.rooms} номеров, {args.bookings} броней за {time.perf_counter() - t0:.1f} c")
+
+        db.dsn = f"{args.dsn} options='-c search_path={SCHEMA},public'"
+        db.connect()
+        try:
+            pricing.invalidate()
+            timings, sizes = [], []
+            for _ in range(args.repeats):
+                start = BASE_DATE + timedelta(days=random.randint(0, days))
+                end = start + timedelta(days=random.randint(1, 10))
+                t0 = time.perf_counter()
+                quotes = quote_free_rooms(start, end, random.randint(1, 3))
+                timings.append((time.perf_counter() - t0) * 1000)
+                sizes.append(len(quotes))
+        finally:
+            db.close()
+
+        med = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"свободных номеров в ответе: в среднем {statistics.mean(sizes):.0f}")
+        print(f"подбор: медиана {med:.1f} мс, p95 {p95:.1f} мс (цель < {TARGET_MS} мс)")
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Время запуска приложения: импорты, подключение к БД, первая отрисовка.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup [--runs 5] [--dsn ...] [--max-ms 1000]
+
+Каждый замер — отдельный процесс, чтобы импорты были холодными. Окно
+рисуется без экрана (QT_QPA_PLATFORM=offscreen, если не задано иное).
+С --max-ms бенчмарк завершается с ошибкой, если медиана времени до первой
+отрисовки главного окна больше порога, — так его можно ставить в проверку.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from config import GOST_DSN
+
+PHASES = (
+    ("qt", "QApplication"),
+    ("login_imports", "импорт окна входа"),
+    ("main_imports", "импорт главного окна"),
+    ("connect", "подключение к БД"),
+    ("schema", "проверка схемы"),
+    ("window", "создание главного окна"),
+    ("first_paint", "первая отрисовка"),
+    ("data", "плитки главной загружены"),
+)
+DATA_TIMEOUT = 10.0
+
+
+def child(dsn):
+    """Один запуск: печатаем JSON с отметками времени (мс от начала)."""
+    marks = {}
+    t0 = time.perf_counter()
+
+    def mark(name):
+        marks[name] = (time.perf_counter() - t0) * 1000
+
+    from PyQt6.QtCore import QEvent, QObject
+    from PyQt6.QtWidgets import QApplication
+
+    app = QApplication(sys.argv[:1])
+    mark("qt")
+    import migrate
+    from db import db
+    import login_window  # noqa: F401
+
+    mark("login_imports")
+    import main_window
+
+    mark("main_imports")
+    db.dsn = dsn
+    db.connect()
+    mark("connect")
+    migrate.ensure_current()
+    mark("schema")
+    row = db.fetchone("SELECT id, username, first_name, last_name FROM admins ORDER BY id LIMIT 1")
+    admin = dict(zip(("id", "username", "first_name", "last_name"), row or (None,) * 4))
+
+    class PaintWatch(QObject):
+        painted = False
+
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint:
+                self.painted = True
+            return False
+
+    win = main_window.MainWindow(admin)
+    mark("window")
+    watch = PaintWatch()
+    win.installEventFilter(watch)
+    win.show()
+    while not watch.painted:
+        app.processEvents()
+    mark("first_paint")
+    deadline = time.perf_counter() + DATA_TIMEOUT
+    while not win.room_grid.rooms and time.perf_counter() < deadline:
+        app.processEvents()
+    mark("data")
+    win.close()
+    db.close()
+    print(json.dumps(marks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=GOST_DSN)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="порог для первой отрисовки")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.dsn)
+        return
+
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--child", "--dsn", args.dsn],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{'этап':<30}{'медиана, мс':>14}{'нарастающим, мс':>18}")
+    previous = 0.0
+    for name, title in PHASES:
+        total = statistics.median(r[name] for r in runs)
+        print(f"{title:<30}{total - previous:>14.1f}{total:>18.1f}")
+        previous = total
+
+    first_paint = statistics.median(r["first_paint"] for r in runs)
+    if args.max_ms is not None and first_paint > args.max_ms:
+        raise SystemExit(f"первая отрисовка {first_paint:.0f} мс — больше порога {args.max_ms:.0f} мс")
+
+
+if __name__ == "__main__":
+    main()
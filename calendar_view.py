@@ -0,0 +1,285 @@
+from datetime import date, timedelta
+from itertools import groupby
+
+from PyQt6.QtCore import Qt, QEvent, QRect, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QPainter
+from PyQt6.QtWidgets import QAbstractScrollArea, QToolTip
+
+from config import COLOR_OCCUPIED, COLOR_BOOKED, SIDEBAR_COLOR, ROOM_FONT
+from db import db
+from refdata import refdata
+
+# Размеры ячеек шахматки, px
+DAY_W = 28
+ROW_H = 22
+HEADER_W = 90  # колонка с номерами
+HEADER_H = 36  # строка с датами
+
+COLOR_GRID = QColor("#e2dcdc")
+COLOR_WEEKEND = QColor("#f6f2f2")
+COLOR_TODAY = QColor("#fff7b8")
+COLOR_HEADER = QColor("#efeaea")
+# цвет полосы брони по статусу; отменённые не показываем
+BAR_COLORS = {"active": QColor(COLOR_OCCUPIED), "completed": QColor(COLOR_BOOKED)}
+
+MONTHS = ["янв", "фев", "мар", "апр", "май", "июн", "июл", "авг", "сен", "окт", "ноя", "дек"]
+
+
+def fetch_calendar_rooms():
+    return [(rid, number) for rid, number, _, _, _ in refdata.rooms()]
+
+
+def fetch_calendar_window(room_ids, d_from, d_to):
+    """Брони номеров room_ids, пересекающие [d_from, d_to), — одним запросом."""
+    return db.fetchall(
+        """
+        SELECT b.room_id, b.date_from, b.date_to, b.status,
+               g.last_name || ' ' || g.first_name, b.id
+        FROM bookings b
+        LEFT JOIN guests g ON g.id = b.guest_id
+        WHERE b.room_id = ANY(%s)
+          AND b.status <> 'cancelled'
+          AND b.stay && daterange(%s, %s)
+        ORDER BY b.room_id, b.date_from
+        """,
+        (list(room_ids), d_from, d_to),
+    )
+
+
+class OccupancyCalendar(QAbstractScrollArea):
+    """Шахматка занятости: строки — номера, колонки — дни, брони — полосы.
+
+    Рисуется только то, что попадает во viewport, а брони подгружаются
+    для видимого окна (с запасом в экран по краям) одним запросом в фоне.
+    """
+
+    failed = pyqtSignal(object)
+    booking_activated = pyqtSignal(int)
+
+    def __init__(self, worker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self.start = date.today()
+        self.days = 365
+        self.rooms = []  # (id, number)
+        self.bookings = {}  # room_id -> [(date_from, date_to, status, guest, id), ...]
+        self.loaded = None  # (row0, row1, day0, day1) загруженного окна
+        self.viewport().setFont(ROOM_FONT)
+
+        # при прокрутке запрос уходит, когда пользователь остановился
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(80)
+        self._timer.timeout.connect(self.load_window)
+        self.horizontalScrollBar().valueChanged.connect(self._timer.start)
+        self.verticalScrollBar().valueChanged.connect(self._timer.start)
+
+    def set_range(self, start, days):
+        """Новый диапазон дат: прежнее окно броней больше не годится."""
+        self.start, self.days = start, days
+        self.loaded = None
+        self.bookings = {}
+        self._update_scrollbars()
+        self.viewport().update()
+        self._timer.start()
+
+    def reload(self):
+        """Перечитываем список номеров и брони видимого окна."""
+        self.worker.submit(
+            "calendar_rooms",
+            fetch_calendar_rooms,
+            on_done=self._set_rooms,
+            on_error=self.failed.emit,
+        )
+
+    def _set_rooms(self, rooms):
+        self.rooms = rooms
+        self.loaded = None
+        self._update_scrollbars()
+        self.viewport().update()
+        self.load_window()
+
+    # -------- окно данных --------
+
+    def visible(self):
+        """Видимые строки и дни: (row0, row1, day0, day1), правые границы не входят."""
+        vp = self.viewport()
+        x = self.horizontalScrollBar().value()
+        y = self.verticalScrollBar().value()
+        day0 = x // DAY_W
+        day1 = min(self.days, (x + vp.width() - HEADER_W) // DAY_W + 1)
+        row0 = y // ROW_H
+        row1 = min(len(self.rooms), (y + vp.height() - HEADER_H) // ROW_H + 1)
+        return row0, row1, day0, day1
+
+    def load_window(self):
+        if not self.rooms:
+            return
+        row0, row1, day0, day1 = self.visible()
+        if self.loaded is not None:
+            l_row0, l_row1, l_day0, l_day1 = self.loaded
+            if l_row0 <= row0 and row1 <= l_row1 and l_day0 <= day0 and day1 <= l_day1:
+                return
+        # запас в один экран с каждой стороны
+        rows, days = row1 - row0, day1 - day0
+        window = (
+            max(0, row0 - rows),
+            min(len(self.rooms), row1 + rows),
+            max(0, day0 - days),
+            min(self.days, day1 + days),
+        )
+        room_ids = [r[0] for r in self.rooms[window[0]:window[1]]]
+        # окно задано в строках и днях от self.start — запоминаем, от чего
+        # оно отсчитано, чтобы не принять ответ для прежнего диапазона
+        start, rooms = self.start, self.rooms
+        self.worker.submit(
+            "calendar",
+            fetch_calendar_window,
+            room_ids,
+            start + timedelta(days=window[2]),
+            start + timedelta(days=window[3]),
+            on_done=lambda rows: self._set_window(start, rooms, window, rows),
+            on_error=self.failed.emit,
+        )
+
+    def _set_window(self, start, rooms, window, rows):
+        if start != self.start or rooms is not self.rooms:
+            # пока шёл запрос, сменились даты или список номеров
+            return
+        self.bookings = {
+            room_id: [r[1:] for r in group] for room_id, group in groupby(rows, key=lambda r: r[0])
+        }
+        self.loaded = window
+        self.viewport().update()
+
+    def booking_at(self, pos):
+        """Бронь под точкой viewport или None."""
+        if pos.x() < HEADER_W or pos.y() < HEADER_H:
+            return None
+        day = (pos.x() - HEADER_W + self.horizontalScrollBar().value()) // DAY_W
+        row = (pos.y() - HEADER_H + self.verticalScrollBar().value()) // ROW_H
+        if not (0 <= row < len(self.rooms) and 0 <= day < self.days):
+            return None
+        d = self.start + timedelta(days=day)
+        for booking in self.bookings.get(self.rooms[row][0], ()):
+            if booking[0] <= d < booking[1]:
+                return booking
+        return None
+
+    # -------- прокрутка и отрисовка --------
+
+    def _update_scrollbars(self):
+        vp = self.viewport()
+        page_w = max(0, vp.width() - HEADER_W)
+        page_h = max(0, vp.height() - HEADER_H)
+        hbar, vbar = self.horizontalScrollBar(), self.verticalScrollBar()
+        hbar.setRange(0, max(0, self.days * DAY_W - page_w))
+        hbar.setPageStep(page_w)
+        hbar.setSingleStep(DAY_W)
+        vbar.setRange(0, max(0, len(self.rooms) * ROW_H - page_h))
+        vbar.setPageStep(page_h)
+        vbar.setSingleStep(ROW_H)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+        self._timer.start()
+
+    def scrollContentsBy(self, dx, dy):
+        # всё рисуется заново из данных, сдвигать пиксели не нужно
+        self.viewport().update()
+
+    def viewportEvent(self, event):
+        if event.type() == QEvent.Type.ToolTip:
+            booking = self.booking_at(event.pos())
+            if booking is None:
+                QToolTip.hideText()
+            else:
+                d_from, d_to, status, guest, bid = booking
+                QToolTip.showText(
+                    event.globalPos(),
+                    f"Бронь №{bid}: {guest or ''}\n{d_from} — {d_to} ({status})",
+                    self.viewport(),
+                )
+            return True
+        return super().viewportEvent(event)
+
+    def mouseDoubleClickEvent(self, event):
+        booking = self.booking_at(event.position().toPoint())
+        if booking is not None:
+            self.booking_activated.emit(booking[4])
+
+    def paintEvent(self, event):
+        p = QPainter(self.viewport())
+        vp = self.viewport().rect()
+        x0 = self.horizontalScrollBar().value()
+        y0 = self.verticalScrollBar().value()
+        row0, row1, day0, day1 = self.visible()
+        today = date.today()
+        p.fillRect(vp, Qt.GlobalColor.white)
+
+        # Сетка и полосы броней
+        p.save()
+        p.setClipRect(QRect(HEADER_W, HEADER_H, vp.width() - HEADER_W, vp.height() - HEADER_H))
+        for d in range(day0, day1):
+            x = HEADER_W + d * DAY_W - x0
+            day = self.start + timedelta(days=d)
+            if day == today:
+                p.fillRect(x, HEADER_H, DAY_W, vp.height(), COLOR_TODAY)
+            elif day.weekday() >= 5:
+                p.fillRect(x, HEADER_H, DAY_W, vp.height(), COLOR_WEEKEND)
+            p.setPen(COLOR_GRID)
+            p.drawLine(x, HEADER_H, x, vp.height())
+        for r in range(row0, row1):
+            y = HEADER_H + r * ROW_H - y0
+            p.setPen(COLOR_GRID)
+            p.drawLine(HEADER_W, y + ROW_H - 1, vp.width(), y + ROW_H - 1)
+            for d_from, d_to, status, guest, bid in self.bookings.get(self.rooms[r][0], ()):
+                a = max((d_from - self.start).days, day0)
+                b = min((d_to - self.start).days, day1)
+                if a >= b:
+                    continue
+                rect = QRect(HEADER_W + a * DAY_W - x0 + 1, y + 3, (b - a) * DAY_W - 2, ROW_H - 6)
+                p.fillRect(rect, BAR_COLORS.get(status, COLOR_GRID))
+                if guest and rect.width() > 40:
+                    p.setPen(Qt.GlobalColor.black)
+                    p.drawText(
+                        rect.adjusted(4, 0, -2, 0),
+                        Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft,
+                        guest,
+                    )
+        p.restore()
+
+        # Шапка с датами: месяц над первым днём месяца и над первым видимым днём
+        p.save()
+        p.setClipRect(QRect(HEADER_W, 0, vp.width() - HEADER_W, HEADER_H))
+        p.fillRect(HEADER_W, 0, vp.width() - HEADER_W, HEADER_H, COLOR_HEADER)
+        p.setPen(Qt.GlobalColor.black)
+        for d in range(day0, day1):
+            x = HEADER_W + d * DAY_W - x0
+            day = self.start + timedelta(days=d)
+            if day.day == 1 or d == day0:
+                p.drawText(x + 2, 14, f"{MONTHS[day.month - 1]} {day.year}")
+            p.drawText(
+                QRect(x, HEADER_H // 2, DAY_W, HEADER_H // 2),
+                Qt.AlignmentFlag.AlignCenter,
+                str(day.day),
+            )
+        p.restore()
+
+        # Колонка с номерами
+        p.save()
+        p.setClipRect(QRect(0, HEADER_H, HEADER_W, vp.height() - HEADER_H))
+        p.fillRect(0, HEADER_H, HEADER_W, vp.height() - HEADER_H, COLOR_HEADER)
+        p.setPen(Qt.GlobalColor.black)
+        for r in range(row0, row1):
+            y = HEADER_H + r * ROW_H - y0
+            p.drawText(
+                QRect(6, y, HEADER_W - 8, ROW_H),
+                Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft,
+                self.rooms[r][1],
+            )
+        p.restore()
+
+        p.fillRect(0, 0, HEADER_W, HEADER_H, QColor(SIDEBAR_COLOR))
+        p.end()
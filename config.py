@@ -7,6 +7,15 @@ MAIN_IMAGE_PATH = "/mnt/data/36c0ac0b-3e9d-4eaf-90fa-9b01e602c097.png"
 SIDEBAR_COLOR = os.getenv("SIDEBAR_COLOR", "#6d5e5e")
 GOST_DSN = os.getenv("GOST_DSN", "dbname=gostitut user=apple password= host=localhost port=5432")
 GOST_KEY_ENV = os.getenv("GOST_KEY", None)  # ключ AES в base64
+# Дополнительные версии ключа: "2:base64,3:base64" (ключ 1 — GOST_KEY / enc_key.bin)
+GOST_KEYRING_ENV = os.getenv("GOST_KEYRING", None)
+GOST_KEYS_DIR = os.getenv("GOST_KEYS_DIR", "./keys")  # файлы enc_key.<id>.bin
+GOST_KEY_ID = int(os.getenv("GOST_KEY_ID", "0"))  # ключ для новых записей; 0 — самый новый
+
+# Пул соединений с БД
+GOST_POOL_MIN = int(os.getenv("GOST_POOL_MIN", "1"))
+GOST_POOL_MAX = int(os.getenv("GOST_POOL_MAX", "8"))
+GOST_POOL_TIMEOUT = float(os.getenv("GOST_POOL_TIMEOUT", "30"))  # сек. ожидания свободного соединения
 
 # Цвета статусов номера
 COLOR_FREE = "#cfead0"      # свободен
@@ -1,10 +1,15 @@
 import base64
 import os
+import re
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-from config import GOST_KEY_ENV
+from config import GOST_KEY_ENV, GOST_KEYRING_ENV, GOST_KEYS_DIR, GOST_KEY_ID
+
+# Версия ключа у паспортов, зашифрованных до появления версий (passport_key_id IS NULL)
+LEGACY_KEY_ID = 1
 
 
 def sha256_hash(text: str) -> str:
@@ -37,18 +42,94 @@ def load_aes_key() -> bytes:
     return key
 
 
-AES_KEY = load_aes_key()
+def load_keyring() -> dict:
+    """Все версии ключа: id -> ключ.
+
+    Ключ 1 — исходный (GOST_KEY или enc_key.bin), остальные — из файлов
+    GOST_KEYS_DIR/enc_key.<id>.bin и переменной GOST_KEYRING.
+    """
+    keys = {LEGACY_KEY_ID: load_aes_key()}
+    if os.path.isdir(GOST_KEYS_DIR):
+        for name in os.listdir(GOST_KEYS_DIR):
+            m = re.fullmatch(r"enc_key\.(\d+)\.bin", name)
+            if m:
+                with open(os.path.join(GOST_KEYS_DIR, name), "rb") as f:
+                    keys[int(m.group(1))] = f.read()
+    if GOST_KEYRING_ENV:
+        for item in GOST_KEYRING_ENV.split(","):
+            key_id, _, b64 = item.strip().partition(":")
+            keys[int(key_id)] = base64.b64decode(b64)
+    return keys
+
+
+def generate_key_file() -> int:
+    """Создаём следующую версию ключа в GOST_KEYS_DIR, возвращаем её id."""
+    key_id = max(KEYRING) + 1
+    os.makedirs(GOST_KEYS_DIR, exist_ok=True)
+    path = os.path.join(GOST_KEYS_DIR, f"enc_key.{key_id}.bin")
+    with open(path, "wb") as f:
+        f.write(AESGCM.generate_key(bit_length=256))
+    os.chmod(path, 0o600)
+    return key_id
+
+
+KEYRING = load_keyring()
+# Новые значения шифруем этой версией, расшифровать можем любой из KEYRING
+CURRENT_KEY_ID = GOST_KEY_ID or max(KEYRING)
+AES_KEY = KEYRING[CURRENT_KEY_ID]
+# Объекты шифра создаём один раз; они не хранят состояния между вызовами
+# и безопасны для использования из нескольких потоков
+_CIPHERS = {key_id: AESGCM(key) for key_id, key in KEYRING.items()}
+_AES = _CIPHERS[CURRENT_KEY_ID]
+
+# Меньше этого объёма потоки не запускаем — накладные расходы больше выигрыша
+_PARALLEL_MIN = 2000
+_CHUNK = 1000
 
 
 def aes_encrypt(plaintext: bytes):
-    aes = AESGCM(AES_KEY)
+    """Шифруем ключом CURRENT_KEY_ID — его и надо записать в passport_key_id."""
     nonce = os.urandom(12)
-    ct = aes.encrypt(nonce, plaintext, None)
+    ct = _AES.encrypt(nonce, plaintext, None)
     return nonce, ct
 
 
-def aes_decrypt(nonce: bytes, ct: bytes):
-    aes = AESGCM(AES_KEY)
+def aes_decrypt(nonce: bytes, ct: bytes, key_id):
+    """key_id — passport_key_id строки; None (NULL) — значение, зашифрованное
+    до появления версий ключа. Ключ не угадываем: его передаёт вызывающий."""
+    aes = _CIPHERS.get(LEGACY_KEY_ID if key_id is None else key_id)
+    if aes is None:
+        raise ValueError(f"Нет ключа версии {key_id}")
     return aes.decrypt(nonce, ct, None)
 
 
+def _encrypt_chunk(plaintexts):
+    return [(CURRENT_KEY_ID, *aes_encrypt(p)) for p in plaintexts]
+
+
+def _decrypt_chunk(items):
+    return [aes_decrypt(nonce, ct, key_id) for key_id, nonce, ct in items]
+
+
+def _run_chunked(fn, items, workers):
+    items = list(items)
+    if len(items) < _PARALLEL_MIN or workers == 1:
+        return fn(items)
+    chunks = [items[i:i + _CHUNK] for i in range(0, len(items), _CHUNK)]
+    # cryptography отпускает GIL на время шифрования, поэтому потоки работают параллельно
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        return [x for part in pool.map(fn, chunks) for x in part]
+
+
+def encrypt_many(plaintexts, workers=None):
+    """Шифруем пачку значений: список (key_id, nonce, ct) в том же порядке."""
+    return _run_chunked(_encrypt_chunk, plaintexts, workers)
+
+
+def decrypt_many(items, workers=None):
+    """Расшифровываем пачку (key_id, nonce, ct) — как её вернул encrypt_many.
+
+    key_id None — исходный ключ, как в aes_decrypt. При неверных данных —
+    InvalidTag.
+    """
+    return _run_chunked(_decrypt_chunk, items, workers)
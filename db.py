@@ -1,139 +1,164 @@
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.errors
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+from config import GOST_DSN, GOST_POOL_MIN, GOST_POOL_MAX, GOST_POOL_TIMEOUT
+
+
+# Канал уведомлений об изменениях номеров и броней: другие рабочие места
+# получают id изменённых строк и обновляют только их.
+NOTIFY_CHANNEL = "gost_changes"
+
+
+def escape_like(text):
+    """Экранируем \\, % и _, чтобы текст пользователя в LIKE/ILIKE искался как есть."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class PoolTimeout(Exception):
+    """Все соединения пула заняты дольше допустимого."""
+
 
-from config import GOST_DSN
-from crypto_utils import sha256_hash
+class BookingConflict(Exception):
+    """Номер уже занят активной бронью на пересекающиеся даты."""
 
 
 class DB:
-    def __init__(self, dsn: str = GOST_DSN):
+    def __init__(
+        self,
+        dsn: str = GOST_DSN,
+        minconn: int = GOST_POOL_MIN,
+        maxconn: int = GOST_POOL_MAX,
+        timeout: float = GOST_POOL_TIMEOUT,
+    ):
         self.dsn = dsn
-        self.conn = None
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.pool = None
+        # ограничивает число одновременно выданных соединений
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # соединение, закреплённое за текущим потоком (для вложенных вызовов)
+        self._local = threading.local()
 
     def connect(self):
-        self.conn = psycopg2.connect(self.dsn)
-
-    def ensure_schema(self):
-        """Создаём нужные таблицы и минимальные данные, если их ещё нет."""
-        q = """
-        CREATE TABLE IF NOT EXISTS admins (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            first_name TEXT,
-            last_name TEXT,
-            created_at TIMESTAMPTZ DEFAULT now()
-        );
-        CREATE TABLE IF NOT EXISTS room_types (
-            id SERIAL PRIMARY KEY,
-            name TEXT UNIQUE NOT NULL,
-            description TEXT,
-            base_price NUMERIC(10,2) DEFAULT 0
-        );
-        CREATE TABLE IF NOT EXISTS rooms (
-            id SERIAL PRIMARY KEY,
-            number TEXT UNIQUE NOT NULL,
-            type_id INTEGER REFERENCES room_types(id) ON DELETE SET NULL,
-            floor INTEGER,
-            max_guests INTEGER DEFAULT 2,
-            status TEXT NOT NULL DEFAULT 'свободен',
-            created_at TIMESTAMPTZ DEFAULT now()
-        );
-        CREATE TABLE IF NOT EXISTS guests (
-            id SERIAL PRIMARY KEY,
-            first_name TEXT NOT NULL,
-            last_name TEXT NOT NULL,
-            phone TEXT,
-            email TEXT,
-            passport_encrypted BYTEA,
-            passport_iv BYTEA,
-            discount NUMERIC(5,2) DEFAULT 0,
-            created_at TIMESTAMPTZ DEFAULT now()
-        );
-        CREATE TABLE IF NOT EXISTS bookings (
-            id SERIAL PRIMARY KEY,
-            room_id INTEGER REFERENCES rooms(id) ON DELETE CASCADE,
-            guest_id INTEGER REFERENCES guests(id) ON DELETE CASCADE,
-            created_by INTEGER REFERENCES admins(id),
-            date_from DATE NOT NULL,
-            date_to DATE NOT NULL,
-            status TEXT NOT NULL DEFAULT 'active',
-            total_price NUMERIC(12,2) DEFAULT 0,
-            created_at TIMESTAMPTZ DEFAULT now()
-        );
-        CREATE TABLE IF NOT EXISTS room_status_history (
-            id SERIAL PRIMARY KEY,
-            room_id INTEGER REFERENCES rooms(id),
-            old_status TEXT,
-            new_status TEXT,
-            changed_by INTEGER REFERENCES admins(id),
-            changed_at TIMESTAMPTZ DEFAULT now()
-        );
+        self.pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+        # сразу проверяем, что база доступна
+        with self.connection() as conn:
+            self._ping(conn)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+
+    @staticmethod
+    def _ping(conn):
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+
+    @staticmethod
+    def _is_broken(conn) -> bool:
+        return (
+            conn.closed
+            or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN
+        )
+
+    def _checkout(self):
+        """Берём соединение из пула; битые соединения пересоздаём."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout("Нет свободных соединений с БД")
+        try:
+            conn = self.pool.getconn()
+            if self._is_broken(conn):
+                self.pool.putconn(conn, close=True)
+                conn = self.pool.getconn()
+                self._ping(conn)
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn):
+        try:
+            broken = self._is_broken(conn)
+            if not broken and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                # незавершённая транзакция не должна попасть к следующему потоку
+                conn.rollback()
+            self.pool.putconn(conn, close=broken)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Соединение из пула на время блока.
+
+        Внутри одного потока вложенные вызовы получают то же соединение,
+        поэтому fetchone/execute внутри transaction() видят её изменения.
         """
-        with self.conn.cursor() as cur:
-            cur.execute(q)
-            # безопасно добавим недостающий столбец скидки (если база была создана ранее)
-            cur.execute("ALTER TABLE guests ADD COLUMN IF NOT EXISTS discount NUMERIC(5,2) DEFAULT 0;")
-            # Добавим дефолтного админа, если нет пользователей
-            cur.execute("SELECT COUNT(*) FROM admins")
-            cnt = cur.fetchone()[0]
-            if cnt == 0:
-                # дефолтный логин admin/admin (SHA256)
-                cur.execute(
-                    "INSERT INTO admins(username, password_hash, first_name, last_name) VALUES (%s,%s,%s,%s)",
-                    ("admin", sha256_hash("admin"), "Кирилл", "Кириллов")
-                )
-            # Добавим несколько категорий и номеров, если пусто (для начального макета)
-            cur.execute("SELECT COUNT(*) FROM room_types")
-            cnt_rt = cur.fetchone()[0]
-            if cnt_rt == 0:
-                cur.execute(
-                    "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
-                    ("Стандарт", "Базовая категория", 100)
-                )
-                cur.execute(
-                    "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
-                    ("Комфорт+", "С улучшенными условиями", 150)
-                )
-                cur.execute(
-                    "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
-                    ("Люкс", "VIP", 250)
-                )
-            cur.execute("SELECT COUNT(*) FROM rooms")
-            cnt_rooms = cur.fetchone()[0]
-            if cnt_rooms == 0:
-                # добавим примеры
-                cur.execute(
-                    "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
-                    ("2-101", 1, 2, 'свободен')
-                )
-                cur.execute(
-                    "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
-                    ("2-102", 1, 2, 'уборка')
-                )
-                cur.execute(
-                    "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
-                    ("3-101", 2, 3, 'занят')
-                )
-                cur.execute(
-                    "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
-                    ("4-101", 3, 4, 'бронь')
-                )
-            self.conn.commit()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.depth += 1
+            try:
+                yield conn
+            finally:
+                self._local.depth -= 1
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Курсор в транзакции: commit при успехе, rollback при ошибке."""
+        with self.connection() as conn:
+            # вложенность считаем по транзакциям, а не по соединению: фоновая
+            # задача держит соединение, но транзакцию не открывает
+            depth = getattr(self._local, "tx_depth", 0)
+            nested = depth > 0
+            self._local.tx_depth = depth + 1
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                if not nested:
+                    conn.commit()
+            except psycopg2.errors.ExclusionViolation as e:
+                if not nested:
+                    conn.rollback()
+                if e.diag.constraint_name == "bookings_no_overlap":
+                    raise BookingConflict(str(e)) from e
+                raise
+            except Exception:
+                if not nested:
+                    conn.rollback()
+                raise
+            finally:
+                self._local.tx_depth = depth
 
     def fetchall(self, query, params=()):
-        with self.conn.cursor() as cur:
+        with self.transaction() as cur:
             cur.execute(query, params)
             return cur.fetchall()
 
     def fetchone(self, query, params=()):
-        with self.conn.cursor() as cur:
+        with self.transaction() as cur:
             cur.execute(query, params)
             return cur.fetchone()
 
     def execute(self, query, params=()):
-        with self.conn.cursor() as cur:
+        with self.transaction() as cur:
             cur.execute(query, params)
-        self.conn.commit()
 
 
 db = DB()
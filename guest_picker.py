@@ -0,0 +1,102 @@
+from PyQt6.QtCore import QModelIndex, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QStandardItem, QStandardItemModel
+from PyQt6.QtWidgets import QCompleter, QLineEdit
+
+from db import db, escape_like
+
+# Пауза после последнего нажатия, прежде чем спрашивать сервер, мс
+DEBOUNCE_MS = 250
+MIN_CHARS = 2
+LIMIT = 20
+
+
+def _like(word):
+    return "%" + escape_like(word) + "%"
+
+
+def search_guests(text, limit=LIMIT):
+    """limit ближайших к text гостей, у которых в «фамилия имя телефон» есть все слова text.
+
+    Отбор и порядок даёт индекс guests_search_trgm_idx: он отдаёт совпадения
+    по возрастанию расстояния <<->, и LIMIT читает только первые из них.
+    """
+    words = text.split()
+    where = " AND ".join(["gost_guest_search_text(first_name, last_name, phone) ILIKE %s"] * len(words))
+    return db.fetchall(
+        f"""
+        SELECT id, first_name, last_name, phone
+        FROM guests
+        WHERE {where}
+        ORDER BY %s <<-> gost_guest_search_text(first_name, last_name, phone)
+        LIMIT %s
+        """,
+        (*map(_like, words), text, limit),
+    )
+
+
+def guest_label(first_name, last_name, phone):
+    return f"{first_name} {last_name}, {phone}" if phone else f"{first_name} {last_name}"
+
+
+class GuestPicker(QLineEdit):
+    """Выбор гостя по мере ввода: подсказки приходят с сервера.
+
+    Запрос уходит через DEBOUNCE_MS после последнего нажатия и возвращает не
+    больше LIMIT гостей; новый запрос вытесняет незавершённый. Выбранный
+    гость — guest_id(); любая правка текста выбор сбрасывает.
+    """
+
+    failed = pyqtSignal(object)
+
+    def __init__(self, worker, parent=None):
+        super().__init__(parent)
+        self.worker = worker
+        self._guest_id = None
+        self._model = QStandardItemModel(self)
+        self._completer = QCompleter(self._model, self)
+        # список уже отобран сервером — свой фильтр по префиксу не нужен
+        self._completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self._completer.activated[QModelIndex].connect(self._on_activated)
+        self.setCompleter(self._completer)
+        self.setPlaceholderText("Фамилия, имя или телефон")
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self._search)
+        self.textEdited.connect(self._on_edited)
+
+    def guest_id(self):
+        return self._guest_id
+
+    def set_guest(self, guest_id, label):
+        self._guest_id = guest_id
+        self.setText(label)
+
+    def _on_edited(self, _):
+        self._guest_id = None
+        self._timer.start()
+
+    def _search(self):
+        text = self.text().strip()
+        if len(text) < MIN_CHARS:
+            self._model.clear()
+            return
+        self.worker.submit(
+            ("guest_search", id(self)),
+            search_guests,
+            text,
+            on_done=self._show,
+            on_error=self.failed.emit,
+        )
+
+    def _show(self, rows):
+        self._model.clear()
+        for gid, first_name, last_name, phone in rows:
+            item = QStandardItem(guest_label(first_name, last_name, phone))
+            item.setData(gid, Qt.ItemDataRole.UserRole)
+            self._model.appendRow(item)
+        if rows and self.hasFocus():
+            self._completer.complete()
+
+    def _on_activated(self, index):
+        self._guest_id = index.data(Qt.ItemDataRole.UserRole)
@@ -0,0 +1,196 @@
+"""Отчёты по гостям: один по кнопке или пачкой за месяц.
+
+Пачкой из корня проекта:
+    python -m guest_reports [--month 2025-12] [--format docx|pdf|html|csv] [--zip]
+                            [--out путь] [--workers 4]
+
+Гости, выехавшие за месяц (завершённые брони с выездом в этом месяце),
+выбираются одним запросом, паспорта расшифровываются пачкой, а документы
+рисуются параллельно в пуле процессов (report_render).
+"""
+import argparse
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+
+from crypto_utils import aes_decrypt, decrypt_many
+from db import db
+from report_render import FORMATS, render_report
+
+REPORTS_DIR = os.path.join(os.getcwd(), "reports")
+
+
+def month_range(month: date):
+    """[первый день месяца, первый день следующего)."""
+    start = month.replace(day=1)
+    if start.month == 12:
+        return start, start.replace(year=start.year + 1, month=1)
+    return start, start.replace(month=start.month + 1)
+
+
+def _decrypt_passports(rows):
+    """Паспорта пачкой; если какой-то не расшифровался — разбираем поштучно."""
+    items = [(pkey, bytes(piv), bytes(pen)) for pen, piv, pkey in rows if pen and piv]
+    try:
+        plain = iter(decrypt_many(items))
+        return [next(plain).decode("utf-8") if pen and piv else "не доступен" for pen, piv, _ in rows]
+    except Exception:
+        pass
+    result = []
+    for pen, piv, pkey in rows:
+        if not (pen and piv):
+            result.append("не доступен")
+            continue
+        try:
+            result.append(aes_decrypt(bytes(piv), bytes(pen), pkey).decode("utf-8"))
+        except Exception as e:
+            result.append(f"Ошибка расшифровки: {e}")
+    return result
+
+
+def fetch_report_data(where, params):
+    """Данные отчётов для гостей, подходящих под условие where (по g.*)."""
+    guests = db.fetchall(
+        f"""
+        SELECT g.id, g.first_name, g.last_name, g.phone, g.email, g.created_at,
+               g.passport_encrypted, g.passport_iv, g.passport_key_id
+        FROM guests g
+        WHERE {where}
+        ORDER BY g.id
+        """,
+        params,
+    )
+    if not guests:
+        return []
+    bookings = {}
+    for gid, *booking in db.fetchall(
+        """
+        SELECT b.guest_id, r.number, b.date_from, b.date_to, b.status, b.total_price
+        FROM bookings b
+        LEFT JOIN rooms r ON r.id=b.room_id
+        WHERE b.guest_id = ANY(%s)
+        ORDER BY b.guest_id, b.created_at DESC
+        """,
+        ([g[0] for g in guests],),
+    ):
+        bookings.setdefault(gid, []).append(tuple(booking))
+    passports = _decrypt_passports([g[6:9] for g in guests])
+    return [
+        {
+            "id": g[0],
+            "first_name": g[1],
+            "last_name": g[2],
+            "phone": g[3],
+            "email": g[4],
+            "created_at": g[5],
+            "passport": passport,
+            "bookings": bookings.get(g[0], []),
+        }
+        for g, passport in zip(guests, passports)
+    ]
+
+
+def fetch_checked_out(month: date):
+    start, end = month_range(month)
+    return fetch_report_data(
+        """
+        g.id IN (
+            SELECT guest_id FROM bookings
+            WHERE status='completed' AND date_to >= %s AND date_to < %s
+        )
+        """,
+        (start, end),
+    )
+
+
+def build_guest_report(gid, fmt="docx"):
+    """Отчёт по одному гостю в reports/; возвращаем путь или None, если гостя нет."""
+    data = fetch_report_data("g.id = %s", (gid,))
+    if not data:
+        return None
+    filename, content = render_report(data[0], fmt=fmt)
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    path = os.path.join(REPORTS_DIR, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    return path
+
+
+def render_many(data, out_path, as_zip=False, workers=None, progress=None, fmt="docx"):
+    """Рисуем отчёты в пуле процессов и пишем в папку или zip.
+
+    progress(готово, всего) вызывается по мере готовности документов.
+    """
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    total = len(data)
+    if progress:
+        progress(0, total)
+    if as_zip:
+        os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+        sink = zipfile.ZipFile(out_path, "w", zipfile.ZIP_DEFLATED)
+        write = sink.writestr
+    else:
+        os.makedirs(out_path, exist_ok=True)
+        sink = None
+
+        def write(filename, content):
+            with open(os.path.join(out_path, filename), "wb") as f:
+                f.write(content)
+
+    # spawn: GUI-процесс многопоточный, fork в нём небезопасен
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = [pool.submit(render_report, d, stamp, fmt) for d in data]
+        for done, future in enumerate(as_completed(futures), start=1):
+            write(*future.result())
+            if progress:
+                progress(done, total)
+    finally:
+        # при отмене или ошибке не ждём оставшиеся документы
+        pool.shutdown(cancel_futures=True)
+        if sink is not None:
+            sink.close()
+    return out_path
+
+
+def build_month_reports(
+    month: date, as_zip=False, out_path=None, workers=None, progress=None, fmt="docx"
+):
+    """Отчёты по всем гостям, выехавшим в месяце; возвращаем (путь, число отчётов)."""
+    data = fetch_checked_out(month)
+    if out_path is None:
+        out_path = os.path.join(REPORTS_DIR, f"month_{month:%Y_%m}" + (".zip" if as_zip else ""))
+    if not data:
+        return out_path, 0
+    render_many(data, out_path, as_zip, workers, progress, fmt)
+    return out_path, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--month", help="ГГГГ-ММ, по умолчанию текущий")
+    parser.add_argument("--format", choices=FORMATS, default="docx")
+    parser.add_argument("--zip", action="store_true", help="сложить отчёты в один zip")
+    parser.add_argument("--out", help="папка или zip-файл (по умолчанию reports/month_ГГГГ_ММ)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    month = datetime.strptime(args.month, "%Y-%m").date() if args.month else date.today()
+
+    def progress(done, total):
+        print(f"\rотчёты: {done}/{total}", end="", flush=True)
+
+    db.connect()
+    try:
+        path, count = build_month_reports(
+            month, args.zip, args.out, args.workers, progress, args.format
+        )
+    finally:
+        db.close()
+    print(f"\nготово: {count} отчётов -> {path}" if count else "за этот месяц выселенных гостей нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""Массовая загрузка гостей и броней из CSV/XLSX.
+
+Запуск из корня проекта:
+    python -m importer guests.csv [--errors ошибки.csv] [--admin-id 1]
+    python -m importer export.xlsx --sheet Лист1
+
+Колонки (первая строка — заголовок): first_name, last_name, phone, email,
+passport, discount, room, date_from, date_to, status, total_price.
+Обязательны ФИО и паспорт; без room строка создаёт только гостя. Даты —
+ГГГГ-ММ-ДД или ДД.ММ.ГГГГ, status — active (по умолчанию), completed, cancelled.
+Пустой total_price считается как в окнах приложения — модулем pricing.
+
+Файл читается потоком: строки проверяются, паспорта шифруются пачками и
+через COPY попадают во временную таблицу import_staging. Затем одним набором
+запросов строки сливаются в guests и bookings. Активные брони не должны
+пересекаться ни с уже существующими, ни друг с другом (выигрывает строка выше).
+Гость, встретившийся в файле несколько раз (ФИО + паспорт), создаётся один раз,
+а гость, который с теми же ФИО и паспортом уже есть в базе, не создаётся вовсе —
+брони из файла привязываются к нему. Повторная загрузка файла гостей не дублирует.
+Все ошибки пишутся в CSV с номером строки исходного файла.
+"""
+import argparse
+import csv
+import io
+import os
+from bisect import bisect_left, insort
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from psycopg2.extras import execute_values
+
+from crypto_utils import decrypt_many, encrypt_many
+from db import db
+import migrate
+from pricing import pricing
+
+BATCH = 5000
+COLUMNS = (
+    "first_name",
+    "last_name",
+    "phone",
+    "email",
+    "passport",
+    "discount",
+    "room",
+    "date_from",
+    "date_to",
+    "status",
+    "total_price",
+)
+STATUSES = ("active", "completed", "cancelled")
+
+STAGING_DDL = """
+CREATE TEMP TABLE import_staging (
+    line INTEGER PRIMARY KEY,
+    guest_line INTEGER NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    phone TEXT,
+    email TEXT,
+    passport_encrypted BYTEA,
+    passport_iv BYTEA,
+    passport_key_id INTEGER,
+    discount NUMERIC(5,2),
+    room_number TEXT,
+    date_from DATE,
+    date_to DATE,
+    status TEXT,
+    total_price NUMERIC(12,2),
+    room_id INTEGER,
+    error TEXT
+) ON COMMIT DROP
+"""
+STAGING_COLUMNS = (
+    "line",
+    "guest_line",
+    "first_name",
+    "last_name",
+    "phone",
+    "email",
+    "passport_encrypted",
+    "passport_iv",
+    "passport_key_id",
+    "discount",
+    "room_number",
+    "date_from",
+    "date_to",
+    "status",
+    "total_price",
+)
+
+# Проверка подготовленных строк: номера и пересечения с базой
+RESOLVE_SQL = [
+    "CREATE INDEX ON import_staging (guest_line)",
+    "ANALYZE import_staging",
+    # пока проверяем и вставляем, новые брони с рабочих мест подождут
+    "LOCK TABLE bookings IN SHARE ROW EXCLUSIVE MODE",
+    """
+    UPDATE import_staging s SET room_id = r.id
+    FROM rooms r WHERE r.number = s.room_number
+    """,
+    """
+    UPDATE import_staging SET error = 'нет номера ' || room_number
+    WHERE room_number IS NOT NULL AND room_id IS NULL AND error IS NULL
+    """,
+    """
+    UPDATE import_staging s
+    SET error = 'номер ' || s.room_number || ' занят в эти даты (бронь ' || b.id || ')'
+    FROM bookings b
+    WHERE s.error IS NULL
+      AND s.status = 'active'
+      AND b.room_id = s.room_id
+      AND b.status = 'active'
+      AND b.stay && daterange(s.date_from, s.date_to)
+    """,
+]
+
+# Слияние проверенных строк: гости, брони
+MERGE_SQL = [
+    # id гостей выдаём заранее, чтобы связать брони со строками файла
+    """
+    CREATE TEMP TABLE import_guest_ids ON COMMIT DROP AS
+    SELECT t.line,
+           COALESCE(e.guest_id, nextval(pg_get_serial_sequence('guests', 'id'))) AS guest_id,
+           e.guest_id IS NULL AS is_new
+    FROM (SELECT DISTINCT guest_line AS line FROM import_staging WHERE error IS NULL) t
+    LEFT JOIN import_existing_guests e ON e.line = t.line
+    """,
+    """
+    INSERT INTO guests(id, first_name, last_name, phone, email,
+                       passport_encrypted, passport_iv, passport_key_id, discount)
+    SELECT gi.guest_id, s.first_name, s.last_name, s.phone, s.email,
+           s.passport_encrypted, s.passport_iv, s.passport_key_id, s.discount
+    FROM import_guest_ids gi JOIN import_staging s ON s.line = gi.line
+    WHERE gi.is_new
+    """,
+    """
+    INSERT INTO bookings(room_id, guest_id, created_by, date_from, date_to, status, total_price)
+    SELECT s.room_id, gi.guest_id, %(admin_id)s, s.date_from, s.date_to, s.status, s.total_price
+    FROM import_staging s
+    JOIN import_guest_ids gi ON gi.line = s.guest_line
+    WHERE s.error IS NULL AND s.room_id IS NOT NULL
+    ORDER BY s.line
+    """,
+    # как в диалоге: номер с новой активной бронью помечаем «бронь»
+    """
+    UPDATE rooms SET status = 'бронь'
+    WHERE status = 'свободен'
+      AND id IN (SELECT room_id FROM import_staging WHERE error IS NULL AND status = 'active')
+    """,
+]
+
+
+class RowError(Exception):
+    pass
+
+
+def read_csv(path, delimiter):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line, row in enumerate(csv.DictReader(f, delimiter=delimiter), start=2):
+            yield line, row
+
+
+def read_xlsx(path, sheet=None):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise SystemExit("Для XLSX установите пакет openpyxl: pip install openpyxl")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.active
+        rows = ws.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        for line, values in enumerate(rows, start=2):
+            if any(v is not None for v in values):
+                yield line, dict(zip(header, values))
+    finally:
+        wb.close()
+
+
+def _text(value):
+    if value is None:
+        return ""
+    return str(value).strip()
+
+
+def _date(value, name):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = _text(value)
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise RowError(f"{name}: неверная дата «{text}»")
+
+
+def _decimal(value, name):
+    text = _text(value).replace(",", ".")
+    if not text:
+        return None
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        raise RowError(f"{name}: не число «{text}»")
+
+
+def parse_row(row):
+    """Проверяем строку файла; возвращаем словарь значений или RowError."""
+    r = {c: _text(row.get(c)) for c in COLUMNS}
+    if not r["first_name"] or not r["last_name"]:
+        raise RowError("не указаны имя или фамилия")
+    if not r["passport"]:
+        raise RowError("не указан паспорт")
+    discount = _decimal(row.get("discount"), "discount") or Decimal(0)
+    if not 0 <= discount <= 100:
+        raise RowError("discount: скидка должна быть от 0 до 100")
+    r["discount"] = discount
+    r["total_price"] = _decimal(row.get("total_price"), "total_price")
+    r["status"] = r["status"] or "active"
+    if r["status"] not in STATUSES:
+        raise RowError(f"status: неизвестный статус «{r['status']}»")
+    if r["room"]:
+        r["date_from"] = _date(row.get("date_from"), "date_from")
+        r["date_to"] = _date(row.get("date_to"), "date_to")
+        if r["date_to"] <= r["date_from"]:
+            raise RowError("выезд должен быть позже заезда")
+    else:
+        r["date_from"] = r["date_to"] = None
+    return r
+
+
+class FileOverlaps:
+    """Активные брони из файла по номерам — чтобы строки не пересекались между собой."""
+
+    def __init__(self):
+        self._rooms = {}  # номер -> ([date_from, ...], [(date_from, date_to, line), ...])
+
+    def check_and_add(self, room, d_from, d_to, line):
+        starts, stays = self._rooms.setdefault(room, ([], []))
+        i = bisect_left(starts, d_from)
+        for j in (i - 1, i):
+            if 0 <= j < len(stays) and stays[j][0] < d_to and d_from < stays[j][1]:
+                raise RowError(f"пересекается с бронью из строки {stays[j][2]}")
+        starts.insert(i, d_from)
+        insort(stays, (d_from, d_to, line))
+
+
+def _copy_value(value):
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bytes):
+        return "\\\\x" + value.hex()
+    text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_batch(cur, batch):
+    """Шифруем паспорта пачки и отправляем её в import_staging через COPY."""
+    to_encrypt = [r["passport"].encode("utf-8") for line, guest_line, r in batch if line == guest_line]
+    encrypted = iter(encrypt_many(to_encrypt))
+    buf = io.StringIO()
+    for line, guest_line, r in batch:
+        key_id, nonce, ct = None, None, None
+        if line == guest_line:
+            key_id, nonce, ct = next(encrypted)
+        values = (
+            line,
+            guest_line,
+            r["first_name"],
+            r["last_name"],
+            r["phone"] or None,
+            r["email"] or None,
+            ct,
+            nonce,
+            key_id,
+            r["discount"],
+            r["room"] or None,
+            r["date_from"],
+            r["date_to"],
+            r["status"],
+            r["total_price"],
+        )
+        buf.write("\t".join(_copy_value(v) for v in values) + "\n")
+    buf.seek(0)
+    cur.copy_expert(
+        f"COPY import_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN", buf
+    )
+
+
+def _price_staged(cur):
+    """Строкам без total_price считаем сумму одним вызовом pricing на весь файл."""
+    cur.execute(
+        """
+        SELECT line, room_id, date_from, date_to, discount
+        FROM import_staging
+        WHERE error IS NULL AND room_id IS NOT NULL AND total_price IS NULL
+        """
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return
+    totals = pricing.price_stays([row[1:] for row in rows])
+    execute_values(
+        cur,
+        """
+        UPDATE import_staging s SET total_price = v.total
+        FROM (VALUES %s) AS v(line, total)
+        WHERE s.line = v.line
+        """,
+        [(row[0], total) for row, total in zip(rows, totals)],
+        page_size=1000,
+    )
+
+
+def _match_existing_guests(cur, guests):
+    """Находим в базе гостей из файла по тому же ключу ФИО + паспорт.
+
+    Паспорта в базе зашифрованы со случайным nonce, поэтому сравнить их в SQL
+    нельзя: читаем гостей с теми же ФИО, что в файле, и расшифровываем пачкой.
+    Совпавшие записываем в import_existing_guests (строка файла -> id гостя).
+    """
+    cur.execute(
+        """
+        CREATE TEMP TABLE import_existing_guests (
+            line INTEGER PRIMARY KEY,
+            guest_id INTEGER NOT NULL
+        ) ON COMMIT DROP
+        """
+    )
+    cur.execute(
+        """
+        SELECT g.id, g.first_name, g.last_name, g.passport_key_id, g.passport_iv,
+               g.passport_encrypted
+        FROM guests g
+        JOIN (SELECT DISTINCT first_name, last_name FROM import_staging) s
+          ON s.first_name = g.first_name AND s.last_name = g.last_name
+        WHERE g.passport_encrypted IS NOT NULL AND g.passport_iv IS NOT NULL
+        ORDER BY g.id
+        """
+    )
+    rows = cur.fetchall()
+    if not rows:
+        return
+    passports = decrypt_many([(r[3], bytes(r[4]), bytes(r[5])) for r in rows])
+    matches = {}
+    for (gid, first_name, last_name, *_), passport in zip(rows, passports):
+        line = guests.get((first_name, last_name, passport.decode("utf-8")))
+        if line is not None:
+            # дубли, заведённые раньше, — берём самого старого гостя
+            matches.setdefault(line, gid)
+    if matches:
+        execute_values(
+            cur,
+            "INSERT INTO import_existing_guests(line, guest_id) VALUES %s",
+            list(matches.items()),
+            page_size=1000,
+        )
+
+
+def import_rows(rows, admin_id=None, batch_size=BATCH, log=print):
+    """Загружаем строки (line, dict); возвращаем (загружено, [(line, ошибка), ...])."""
+    errors = []
+    overlaps = FileOverlaps()
+    guests = {}  # (имя, фамилия, паспорт) -> строка, где гость встретился впервые
+    staged = 0
+    with db.transaction() as cur:
+        cur.execute(STAGING_DDL)
+        batch = []
+        for line, row in rows:
+            try:
+                r = parse_row(row)
+                if r["room"] and r["status"] == "active":
+                    overlaps.check_and_add(r["room"], r["date_from"], r["date_to"], line)
+            except RowError as e:
+                errors.append((line, str(e)))
+                continue
+            guest_line = guests.setdefault((r["first_name"], r["last_name"], r["passport"]), line)
+            batch.append((line, guest_line, r))
+            if len(batch) >= batch_size:
+                _copy_batch(cur, batch)
+                staged += len(batch)
+                batch = []
+                log(f"подготовлено {staged} строк")
+        if batch:
+            _copy_batch(cur, batch)
+            staged += len(batch)
+
+        for sql in RESOLVE_SQL:
+            cur.execute(sql)
+        _price_staged(cur)
+        _match_existing_guests(cur, guests)
+        for sql in MERGE_SQL:
+            cur.execute(sql, {"admin_id": admin_id})
+        cur.execute("SELECT line, error FROM import_staging WHERE error IS NOT NULL")
+        merge_errors = cur.fetchall()
+    errors.extend(merge_errors)
+    errors.sort()
+    return staged - len(merge_errors), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--errors", help="куда записать ошибки (по умолчанию <файл>.errors.csv)")
+    parser.add_argument("--delimiter", default=",", help="разделитель CSV")
+    parser.add_argument("--sheet", help="лист XLSX (по умолчанию активный)")
+    parser.add_argument("--admin-id", type=int, help="кто создал брони (bookings.created_by)")
+    parser.add_argument("--batch", type=int, default=BATCH)
+    args = parser.parse_args()
+
+    if args.path.lower().endswith((".xlsx", ".xlsm")):
+        rows = read_xlsx(args.path, args.sheet)
+    else:
+        rows = read_csv(args.path, args.delimiter)
+
+    db.connect()
+    try:
+        migrate.ensure_current()
+        loaded, errors = import_rows(rows, args.admin_id, args.batch)
+    finally:
+        db.close()
+
+    print(f"загружено строк: {loaded}, с ошибками: {len(errors)}")
+    if errors:
+        path = args.errors or os.path.splitext(args.path)[0] + ".errors.csv"
+        with open(path, "w", newline="", encoding="utf-8-sig") as f:
+            w = csv.writer(f)
+            w.writerow(["line", "error"])
+            w.writerows(errors)
+        print(f"ошибки записаны в {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import json
+
+import psycopg2
+from psycopg2 import extensions
+from PyQt6.QtCore import QObject, QSocketNotifier, QTimer, pyqtSignal
+
+from db import NOTIFY_CHANNEL, db
+
+# Пауза перед повторным подключением после обрыва, мс
+RECONNECT_MS = 5000
+# Сколько ждём подключения и LISTEN, прежде чем бросить попытку, мс
+CONNECT_TIMEOUT_MS = 10000
+# Сколько копим уведомления, чтобы отдать их одной пачкой, мс
+BATCH_MS = 50
+
+
+class ChangeListener(QObject):
+    """Получает NOTIFY об изменениях номеров и броней с других рабочих мест.
+
+    Отдельное соединение вне пула висит на LISTEN, а его сокет слушает цикл
+    событий Qt (QSocketNotifier) — БД не опрашивается. Подключение тоже
+    асинхронное и идёт через тот же цикл событий: недоступный сервер не
+    замораживает окно ни при запуске, ни при повторных попытках (имя хоста
+    libpq всё же разрешает синхронно). Уведомления за BATCH_MS собираются в
+    changed(rooms, bookings, guests) — множества затронутых id; смена
+    справочников (категории, номера) — отдельный сигнал refdata_changed.
+    """
+
+    changed = pyqtSignal(object, object, object)
+    refdata_changed = pyqtSignal()
+    # соединение восстановлено: пока его не было, уведомления терялись
+    resynced = pyqtSignal()
+
+    def __init__(self, dsn=None, parent=None):
+        super().__init__(parent)
+        # None — та же база, что и у пула (db.dsn на момент подключения)
+        self.dsn = dsn
+        self.conn = None
+        self._notifier = None
+        self._listen_cur = None
+        self._resync = False
+        self._stopped = False
+        self._rooms, self._bookings, self._guests = set(), set(), set()
+        self._refdata = False
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(BATCH_MS)
+        self._flush_timer.timeout.connect(self._flush)
+        self._connect_timer = QTimer(self)
+        self._connect_timer.setSingleShot(True)
+        self._connect_timer.setInterval(CONNECT_TIMEOUT_MS)
+        self._connect_timer.timeout.connect(self._fail)
+
+    def start(self):
+        self._stopped = False
+        self._resync = False
+        self._connect()
+
+    def stop(self):
+        self._stopped = True
+        self._drop()
+
+    def _connect(self):
+        try:
+            # keepalive, чтобы обрыв сети заметить, а не ждать уведомлений вечно
+            self.conn = psycopg2.connect(
+                self.dsn or db.dsn,
+                async_=1,
+                keepalives=1,
+                keepalives_idle=30,
+                keepalives_interval=10,
+                keepalives_count=3,
+            )
+        except psycopg2.Error:
+            self._fail()
+            return
+        self._connect_timer.start()
+        self._step()
+
+    def _step(self):
+        """Очередной шаг подключения и LISTEN; ждём сокет, пока libpq просит."""
+        try:
+            state = self.conn.poll()
+        except psycopg2.Error:
+            self._fail()
+            return
+        if state == extensions.POLL_READ:
+            self._watch(QSocketNotifier.Type.Read, self._step)
+        elif state == extensions.POLL_WRITE:
+            self._watch(QSocketNotifier.Type.Write, self._step)
+        elif self._listen_cur is None:
+            # подключились; асинхронное соединение всегда в autocommit
+            try:
+                self._listen_cur = self.conn.cursor()
+                self._listen_cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            except psycopg2.Error:
+                self._fail()
+                return
+            self._step()
+        else:
+            self._listen_cur.close()
+            self._listen_cur = None
+            self._connect_timer.stop()
+            self._watch(QSocketNotifier.Type.Read, self._on_ready)
+            if self._resync:
+                self.resynced.emit()
+
+    def _watch(self, kind, slot):
+        # сокет libpq может смениться между попытками — уведомитель каждый раз новый
+        self._drop_notifier()
+        self._notifier = QSocketNotifier(self.conn.fileno(), kind, self)
+        self._notifier.activated.connect(slot)
+
+    def _fail(self):
+        self._drop()
+        if not self._stopped:
+            QTimer.singleShot(RECONNECT_MS, self._reconnect)
+
+    def _drop_notifier(self):
+        if self._notifier is not None:
+            self._notifier.setEnabled(False)
+            self._notifier.deleteLater()
+            self._notifier = None
+
+    def _drop(self):
+        self._connect_timer.stop()
+        self._drop_notifier()
+        self._listen_cur = None
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+            self.conn = None
+
+    def _reconnect(self):
+        if self._stopped or self.conn is not None:
+            return
+        # пока соединения не было, уведомления терялись
+        self._resync = True
+        self._connect()
+
+    def _on_ready(self):
+        try:
+            self.conn.poll()
+        except psycopg2.Error:
+            self._fail()
+            return
+        while self.conn.notifies:
+            self._add(json.loads(self.conn.notifies.pop(0).payload))
+        if (self._rooms or self._bookings or self._refdata) and not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def _add(self, payload):
+        if payload["t"] == "refdata":
+            self._refdata = True
+            return
+        if payload["t"] == "rooms":
+            self._rooms.add(payload["id"])
+            return
+        self._bookings.add(payload["id"])
+        self._rooms.update(rid for rid in payload["rooms"] if rid is not None)
+        self._guests.update(gid for gid in payload["guests"] if gid is not None)
+
+    def _flush(self):
+        rooms, bookings, guests = self._rooms, self._bookings, self._guests
+        self._rooms, self._bookings, self._guests = set(), set(), set()
+        # справочник — первым: обработчики changed уже увидят свежие категории
+        if self._refdata:
+            self._refdata = False
+            self.refdata_changed.emit()
+        if rooms or bookings or guests:
+            self.changed.emit(rooms, bookings, guests)
@@ -10,10 +10,9 @@ from PyQt6.QtWidgets import (
     QGridLayout,
     QMessageBox,
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QTimer
 
 from db import db
-from main_window import MainWindow
 
 
 class LoginWindow(QWidget):
@@ -108,6 +107,14 @@ class LoginWindow(QWidget):
         grid.addWidget(center_widget, 1, 0, alignment=Qt.AlignmentFlag.AlignCenter)
         self.setLayout(grid)
 
+        # главное окно со всеми зависимостями импортируем, когда окно входа
+        # уже нарисовано, — пока вводят пароль
+        QTimer.singleShot(0, self.preload_main)
+
+    @staticmethod
+    def preload_main():
+        import main_window  # noqa: F401
+
     def check_login(self):
         """Проверяем логин и пароль в базе."""
         username = self.login_input.text().strip()
@@ -147,6 +154,8 @@ class LoginWindow(QWidget):
 
     def open_main(self):
         """Открываем основное окно после входа."""
+        from main_window import MainWindow
+
         self.main = MainWindow(self.admin)
         self.main.show()
         self.close()
@@ -1,5 +1,6 @@
 import os
-from datetime import date, datetime
+from datetime import date
+from functools import partial
 
 from PyQt6.QtWidgets import (
     QMainWindow,
@@ -12,8 +13,8 @@ from PyQt6.QtWidgets import (
     QStackedWidget,
     QLineEdit,
     QDialog,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
+    QAbstractItemView,
     QHeaderView,
     QMessageBox,
     QComboBox,
@@ -27,64 +28,30 @@ from PyQt6.QtWidgets import (
     QInputDialog,
     QDoubleSpinBox,
     QCheckBox,
+    QProgressDialog,
 )
 from PyQt6.QtGui import QPixmap
-from PyQt6.QtCore import Qt, QDate, pyqtSignal
+from PyQt6.QtCore import Qt, QDate, QTimer
 
 from config import (
     MAIN_IMAGE_PATH,
     SIDEBAR_COLOR,
-    COLOR_FREE,
-    COLOR_CLEANING,
-    COLOR_OCCUPIED,
-    COLOR_BOOKED,
     TITLE_FONT,
     SECTION_FONT,
-    ROOM_FONT,
 )
-from crypto_utils import aes_encrypt, aes_decrypt
-from db import db
-
-
-class RoomTile(QLabel):
-    """Плитка номера на главной странице."""
-
-    clicked = pyqtSignal(object)
-
-    def __init__(self, text, status, room_id, parent=None):
-        super().__init__(text, parent)
-        self.room_id = room_id
-        self.status = status
-        self.selected = False
-        self.setFont(ROOM_FONT)
-        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.setFixedHeight(48)
-        self.apply_style()
-
-    def mousePressEvent(self, event):
-        self.clicked.emit(self)
-        super().mousePressEvent(event)
-
-    def set_status(self, status):
-        self.status = status
-        self.apply_style()
-
-    def set_selected(self, selected: bool):
-        self.selected = selected
-        self.apply_style()
-
-    def apply_style(self):
-        color = COLOR_FREE
-        if self.status == "уборка":
-            color = COLOR_CLEANING
-        elif self.status == "занят":
-            color = COLOR_OCCUPIED
-        elif self.status == "бронь":
-            color = COLOR_BOOKED
-        border = "2px solid #333" if self.selected else "none"
-        self.setStyleSheet(
-            f"background-color: {color}; border-radius: 8px; padding:6px; border:{border};"
-        )
+from crypto_utils import aes_encrypt, aes_decrypt, CURRENT_KEY_ID
+from availability import availability
+from calendar_view import OccupancyCalendar
+from room_grid import RoomGrid
+from db import db, BookingConflict, escape_like
+from guest_picker import GuestPicker, guest_label
+from listener import ChangeListener
+from pricing import pricing, quote_free_rooms
+from refdata import refdata
+from table_models import LazyTableModel, RowsTableModel
+from workers import DbWorker
+import guest_reports
+import stats
 
 
 class MainWindow(QMainWindow):
@@ -93,7 +60,10 @@ class MainWindow(QMainWindow):
     def __init__(self, admin):
         super().__init__()
         self.admin = admin
-        self.selected_tile = None
+        # фоновые запросы к БД, чтобы окно не замирало
+        self.worker = DbWorker(self)
+        # изменения с других рабочих мест приходят через LISTEN/NOTIFY
+        self.listener = ChangeListener(parent=self)
 
         self.setWindowTitle("ГостиТут — Администратор")
         self.resize(1100, 700)
@@ -123,7 +93,18 @@ class MainWindow(QMainWindow):
         self.btn_rooms.setStyleSheet(btn_style)
         self.btn_bookings = QPushButton("Брони")
         self.btn_bookings.setStyleSheet(btn_style)
-        for b in (self.btn_main, self.btn_guests, self.btn_rooms, self.btn_bookings):
+        self.btn_calendar = QPushButton("Календарь")
+        self.btn_calendar.setStyleSheet(btn_style)
+        self.btn_stats = QPushButton("Статистика")
+        self.btn_stats.setStyleSheet(btn_style)
+        for b in (
+            self.btn_main,
+            self.btn_guests,
+            self.btn_rooms,
+            self.btn_bookings,
+            self.btn_calendar,
+            self.btn_stats,
+        ):
             b.setFixedHeight(36)
             sbv.addWidget(b)
         sbv.addStretch()
@@ -141,30 +122,160 @@ class MainWindow(QMainWindow):
         sbv.addWidget(logout)
         sidebar.setLayout(sbv)
 
-        # Правая часть — вкладки
+        # Правая часть — вкладки. Сразу строим только главную, остальные
+        # страницы — при первом переходе (см. page()); до этого их модели None
+        self.guests_model = None
+        self.rooms_model = None
+        self.bookings_model = None
+        self.calendar = None
+        self.pages = {}
         self.stack = QStackedWidget()
         self.page_main = self.build_main_page()
-        self.page_guests = self.build_guests_page()
-        self.page_rooms = self.build_rooms_page()
-        self.page_bookings = self.build_bookings_page()
-        for p in (self.page_main, self.page_guests, self.page_rooms, self.page_bookings):
-            self.stack.addWidget(p)
+        self.stack.addWidget(self.page_main)
 
         # Навигация
         self.btn_main.clicked.connect(self.go_main)
-        self.btn_guests.clicked.connect(
-            lambda: self.stack.setCurrentWidget(self.page_guests)
-        )
-        self.btn_rooms.clicked.connect(
-            lambda: self.stack.setCurrentWidget(self.page_rooms)
-        )
-        self.btn_bookings.clicked.connect(
-            lambda: self.stack.setCurrentWidget(self.page_bookings)
-        )
+        self.btn_guests.clicked.connect(lambda: self.show_page("guests"))
+        self.btn_rooms.clicked.connect(lambda: self.show_page("rooms"))
+        self.btn_bookings.clicked.connect(lambda: self.show_page("bookings"))
+        self.btn_calendar.clicked.connect(self.go_calendar)
+        self.btn_stats.clicked.connect(self.go_stats)
 
         h.addWidget(sidebar)
         h.addWidget(self.stack, 1)
 
+        self.listener.changed.connect(self.on_db_changes)
+        self.listener.refdata_changed.connect(self.on_refdata_changed)
+        self.listener.resynced.connect(self.reload_all)
+        # запросы уходят после первой отрисовки: окно появляется сразу
+        QTimer.singleShot(0, self.start_loading)
+
+    def start_loading(self):
+        self.refresh_tiles()
+        self.listener.start()
+
+    def page(self, name):
+        """Страница по имени; строится при первом обращении."""
+        page = self.pages.get(name)
+        if page is None:
+            page = getattr(self, f"build_{name}_page")()
+            self.pages[name] = page
+            self.stack.addWidget(page)
+        return page
+
+    def show_page(self, name):
+        self.stack.setCurrentWidget(self.page(name))
+
+    def closeEvent(self, event):
+        self.listener.stop()
+        self.worker.shutdown()
+        super().closeEvent(event)
+
+    def on_db_changes(self, rooms, bookings, guests):
+        """Точечно обновляем то, что изменили другие рабочие места."""
+        availability.invalidate()
+        # непостроенные страницы загрузят свежие данные при открытии
+        if rooms:
+            self.patch_tiles(rooms)
+            if self.rooms_model is not None:
+                self.rooms_model.update_rows(rooms)
+        if bookings and self.bookings_model is not None:
+            self.bookings_model.update_rows(bookings)
+        if guests and self.guests_model is not None:
+            self.guests_model.update_rows(guests)
+        if rooms or bookings:
+            self.reload_calendar()
+
+    def on_refdata_changed(self):
+        """Другое рабочее место поменяло категории или номера."""
+        refdata.invalidate()
+        self.reload_rooms()
+        self.reload_calendar()
+
+    def reload_all(self):
+        """Полная перезагрузка — только после восстановления связи с БД."""
+        availability.invalidate()
+        refdata.invalidate()
+        self.refresh_tiles()
+        self.reload_guests()
+        if self.rooms_model is not None:
+            self.rooms_model.reload()
+        self.reload_bookings()
+        self.reload_calendar()
+
+    def show_db_error(self, e):
+        QMessageBox.critical(self, "Ошибка БД", str(e))
+
+    def make_table_view(self, model):
+        view = QTableView()
+        view.setModel(model)
+        view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        view.verticalHeader().setVisible(False)
+        view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        return view
+
+    def make_guest_picker(self):
+        picker = GuestPicker(self.worker)
+        picker.failed.connect(self.show_db_error)
+        return picker
+
+    @staticmethod
+    def current_row(view):
+        """Строка запроса под курсором таблицы или None."""
+        return view.model().row_at(view.currentIndex().row())
+
+    def fill_room_combo(
+        self, combo, d_from, d_to, exclude_booking=None, keep_room=None, with_status=False,
+        prefer_room=None,
+    ):
+        """Заполняем список номерами, свободными на [d_from, d_to).
+
+        Кэш занятости после записи перечитывается в фоне, список заполнится
+        по ответу; prefer_room выберем, если он свободен.
+        """
+
+        def fill(rooms):
+            selected = combo.currentData()
+            if selected is None:
+                selected = keep_room if keep_room is not None else prefer_room
+            combo.clear()
+            for rid, number, status in rooms:
+                combo.addItem(f"{number} ({status})" if with_status else number, rid)
+                if rid == selected:
+                    combo.setCurrentIndex(combo.count() - 1)
+
+        # свой ключ у каждого списка: при смене дат старый ответ отбрасывается
+        self.worker.submit(
+            ("rooms", id(combo)),
+            availability.free_rooms,
+            d_from,
+            d_to,
+            exclude_booking,
+            keep_room,
+            on_done=fill,
+            on_error=self.show_db_error,
+        )
+
+    def submit_write(self, btn, fn, *args, on_done, on_error=None):
+        """Выполняем запись в БД в фоне; кнопка заблокирована до ответа."""
+        if btn is not None:
+            btn.setEnabled(False)
+
+        def finish(callback, value):
+            # любая запись могла изменить брони или номера
+            availability.invalidate()
+            if btn is not None:
+                btn.setEnabled(True)
+            callback(value)
+
+        self.worker.submit(
+            None,
+            fn,
+            *args,
+            on_done=lambda result: finish(on_done, result),
+            on_error=lambda e: finish(on_error or self.show_db_error, e),
+        )
+
     # -------- Главная --------
 
     def build_main_page(self):
@@ -210,84 +321,72 @@ class MainWindow(QMainWindow):
             legend_col.addWidget(imw, alignment=Qt.AlignmentFlag.AlignTop)
         legend_col.addStretch()
 
-        # Колонки с категориями номеров
-        self.room_tiles = []
-        cats = db.fetchall("SELECT id, name FROM room_types ORDER BY id")
-        columns_h = QHBoxLayout()
-        columns_h.setSpacing(18)
-        for cat in cats:
-            cat_id, cat_name = cat
-            box = QVBoxLayout()
-            hdr = QLabel(cat_name)
-            hdr.setFont(SECTION_FONT)
-            hdr.setAlignment(Qt.AlignmentFlag.AlignHCenter)
-            box.addWidget(hdr)
-            card = QVBoxLayout()
-            rooms = db.fetchall(
-                "SELECT number, status, id FROM rooms WHERE type_id=%s ORDER BY number",
-                (cat_id,),
-            )
-            if not rooms:
-                continue
-            for r in rooms:
-                number, status, rid = r
-                tile = RoomTile(str(number) + "\n", status, rid)
-                tile.clicked.connect(self.on_tile_clicked)
-                self.room_tiles.append(tile)
-                card.addWidget(tile)
-            card.addStretch()
-            container = QWidget()
-            container.setLayout(card)
-            container.setMinimumHeight(320)
-            container.setStyleSheet(
-                "background:white; border-radius:8px; padding:8px;"
-            )
-            box.addWidget(container)
-            columns_h.addLayout(box)
+        # Колонки с категориями номеров — один рисуемый виджет
+        self.room_grid = RoomGrid()
 
         # Основная часть: слева номера, справа подсказка по цветам
         body_h = QHBoxLayout()
-        body_h.addLayout(columns_h, 1)
+        body_h.addWidget(self.room_grid, 1)
         body_h.addSpacing(12)
         body_h.addLayout(legend_col)
         v.addLayout(body_h)
         w.setLayout(v)
         return w
 
+    def refresh_tiles(self):
+        """Перечитываем номера для плиток одним запросом."""
+        self.worker.submit(
+            "tiles",
+            db.fetchall,
+            """
+            SELECT rt.id, rt.name, r.number, r.status, r.id
+            FROM room_types rt JOIN rooms r ON r.type_id = rt.id
+            ORDER BY rt.id, r.number
+            """,
+            on_done=self.room_grid.set_rooms,
+            on_error=self.show_db_error,
+        )
+
+    def patch_tiles(self, room_ids):
+        """Перечитываем только плитки номеров room_ids."""
+        self.worker.submit(
+            None,
+            db.fetchall,
+            """
+            SELECT rt.id, rt.name, r.number, r.status, r.id
+            FROM room_types rt JOIN rooms r ON r.type_id = rt.id
+            WHERE r.id = ANY(%s)
+            """,
+            (list(room_ids),),
+            on_done=lambda rows: self.apply_tile_patch(room_ids, rows),
+            on_error=self.show_db_error,
+        )
+
+    def apply_tile_patch(self, room_ids, rows):
+        if not self.room_grid.patch(room_ids, rows):
+            # номер добавлен, удалён или сменил категорию — пересобираем колонки
+            self.refresh_tiles()
+
+    def set_tile_status(self, room_id, status):
+        """Меняем цвет одной плитки, не перечитывая главную."""
+        self.room_grid.set_status(room_id, status)
+
     def go_main(self):
-        """Обновляем главную вкладку, чтобы перечитать номера."""
-        self.selected_tile = None
-        if self.page_main:
-            self.stack.removeWidget(self.page_main)
-            self.page_main.deleteLater()
-        self.page_main = self.build_main_page()
-        self.stack.insertWidget(0, self.page_main)
+        """Открываем главную и подтягиваем изменения по номерам."""
         self.stack.setCurrentWidget(self.page_main)
-
-    def on_tile_clicked(self, tile: RoomTile):
-        """Выделяем выбранную карточку номера."""
-        if self.selected_tile and self.selected_tile is not tile:
-            try:
-                self.selected_tile.set_selected(False)
-            except RuntimeError:
-                # старый виджет уже уничтожен при перестроении интерфейса
-                pass
-        self.selected_tile = tile
-        tile.set_selected(True)
+        self.refresh_tiles()
 
     def on_change_status(self):
         """Меняем статус выбранного номера."""
-        if not self.selected_tile:
+        selected = self.room_grid.selected_room()
+        if selected is None:
             QMessageBox.information(
                 self, "Статус", "Сначала выберите номер (клик по карточке)."
             )
             return
+        room_id, status = selected
         statuses = ["свободен", "уборка", "занят", "бронь"]
-        current_index = (
-            statuses.index(self.selected_tile.status)
-            if self.selected_tile.status in statuses
-            else 0
-        )
+        current_index = statuses.index(status) if status in statuses else 0
         new_status, ok = QInputDialog.getItem(
             self,
             "Изменить статус",
@@ -298,17 +397,19 @@ class MainWindow(QMainWindow):
         )
         if not ok or not new_status:
             return
-        try:
-            db.execute(
-                "UPDATE rooms SET status=%s WHERE id=%s",
-                (new_status, self.selected_tile.room_id),
+
+        def done(_):
+            self.set_tile_status(room_id, new_status)
+            QMessageBox.information(
+                self, "Статус", f"Статус обновлен на «{new_status}»."
             )
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка БД", str(e))
-            return
-        self.selected_tile.set_status(new_status)
-        QMessageBox.information(
-            self, "Статус", f"Статус обновлен на «{new_status}»."
+
+        self.submit_write(
+            None,
+            db.execute,
+            "UPDATE rooms SET status=%s WHERE id=%s",
+            (new_status, room_id),
+            on_done=done,
         )
 
     # -------- Гости --------
@@ -324,72 +425,96 @@ class MainWindow(QMainWindow):
 
         btn_h = QHBoxLayout()
         btn_add = QPushButton("Добавить гостя")
+        btn_quote = QPushButton("Подбор номера")
         btn_checkout = QPushButton("Выселить гостя")
         btn_report = QPushButton("Отчет по гостю")
+        btn_month = QPushButton("Отчёты за месяц")
         btn_h.addWidget(btn_add)
+        btn_h.addWidget(btn_quote)
         btn_h.addWidget(btn_checkout)
         btn_h.addWidget(btn_report)
+        btn_h.addWidget(btn_month)
         btn_h.addStretch()
         v.addLayout(btn_h)
 
-        self.guests_table = QTableWidget(0, 6)
-        self.guests_table.setHorizontalHeaderLabels(
-            ["ФИО", "Паспорт", "Номер", "Дата заезда", "Дата выезда", "Оплата"]
-        )
-        self.guests_table.horizontalHeader().setSectionResizeMode(
-            QHeaderView.ResizeMode.Stretch
+        self.guests_model = LazyTableModel(
+            self.worker,
+            "guests",
+            ["ФИО", "Паспорт", "Номер", "Дата заезда", "Дата выезда", "Оплата"],
+            self.fetch_guests_page,
+            self.render_guest_row,
+            fetch_rows=self.fetch_guests_rows,
+            parent=self,
         )
+        self.guests_model.failed.connect(self.show_db_error)
+        self.guests_table = self.make_table_view(self.guests_model)
         v.addWidget(self.guests_table)
 
-        self.guests_table.itemDoubleClicked.connect(self.dialog_edit_guest)
-        btn_add.clicked.connect(self.dialog_add_guest)
+        self.guests_table.doubleClicked.connect(self.dialog_edit_guest)
+        btn_add.clicked.connect(lambda: self.dialog_add_guest())
+        btn_quote.clicked.connect(self.dialog_quote)
         btn_checkout.clicked.connect(self.action_checkout_guest)
         btn_report.clicked.connect(self.action_guest_report)
+        btn_month.clicked.connect(self.action_month_reports)
 
         self.reload_guests()
         w.setLayout(v)
         return w
 
     def reload_guests(self):
-        self.guests_table.setRowCount(0)
-        rows = db.fetchall(
-            """
+        if self.guests_model is not None:
+            self.guests_model.reload()
+
+    @staticmethod
+    def fetch_guests_page(after, limit):
+        # keyset-пагинация по (id гостя, id брони): страница не зависит от OFFSET
+        where = ""
+        params = ()
+        if after is not None:
+            where = "WHERE (g.id, COALESCE(b.id, 0)) < (%s, %s)"
+            params = (after[0], after[10])
+        return MainWindow.select_guest_rows(where, params, limit)
+
+    @staticmethod
+    def fetch_guests_rows(guest_ids):
+        return MainWindow.select_guest_rows("WHERE g.id = ANY(%s)", (guest_ids,))
+
+    @staticmethod
+    def select_guest_rows(where, params, limit=None):
+        return db.fetchall(
+            f"""
             SELECT g.id, g.first_name, g.last_name, g.passport_encrypted IS NOT NULL AS has_pass,
                    COALESCE(g.discount,0) AS discount,
-                   b.room_id, b.date_from, b.date_to, b.total_price, b.status
+                   b.room_id, b.date_from, b.date_to, b.total_price, b.status,
+                   COALESCE(b.id, 0) AS booking_id
             FROM guests g
             LEFT JOIN bookings b ON b.guest_id = g.id AND b.status IN ('active','completed')
-            ORDER BY g.created_at DESC
-            """
+            {where}
+            ORDER BY g.id DESC, COALESCE(b.id, 0) DESC
+            LIMIT %s
+            """,
+            params + (limit,),
         )
-        for r in rows:
-            gid, fn, ln, has_pass, discount, room_id, dfrom, dto, price, bstatus = r
-            row = self.guests_table.rowCount()
-            self.guests_table.insertRow(row)
-            fio_item = QTableWidgetItem(f"{fn} {ln}")
-            fio_item.setData(Qt.ItemDataRole.UserRole, gid)
-            self.guests_table.setItem(row, 0, fio_item)
-            self.guests_table.setItem(
-                row, 1, QTableWidgetItem("зашифровано" if has_pass else "")
-            )
-            self.guests_table.setItem(
-                row, 2, QTableWidgetItem(str(room_id) if room_id else "")
-            )
-            self.guests_table.setItem(
-                row, 3, QTableWidgetItem(str(dfrom) if dfrom else "")
-            )
-            self.guests_table.setItem(
-                row, 4, QTableWidgetItem(str(dto) if dto else "")
-            )
-            pay_text = ""
-            if price is not None:
-                pay_text = str(price)
-                if discount:
-                    pay_text += f" (скидка {discount}%)"
-            self.guests_table.setItem(row, 5, QTableWidgetItem(pay_text))
-
-    def dialog_add_guest(self):
-        """Окно добавления гостя и создания брони."""
+
+    @staticmethod
+    def render_guest_row(r):
+        gid, fn, ln, has_pass, discount, room_id, dfrom, dto, price, bstatus, _ = r
+        pay_text = ""
+        if price is not None:
+            pay_text = str(price)
+            if discount:
+                pay_text += f" (скидка {discount}%)"
+        return (
+            f"{fn} {ln}",
+            "зашифровано" if has_pass else "",
+            str(room_id) if room_id else "",
+            str(dfrom) if dfrom else "",
+            str(dto) if dto else "",
+            pay_text,
+        )
+
+    def dialog_add_guest(self, room_id=None, d_from=None, d_to=None):
+        """Окно добавления гостя и создания брони (номер и даты можно подставить)."""
         dlg = QDialog(self)
         dlg.setWindowTitle("Добавить гостя и создать бронь")
         form = QFormLayout()
@@ -405,14 +530,24 @@ class MainWindow(QMainWindow):
         date_from.setDate(QDate.currentDate())
         date_to = QDateEdit()
         date_to.setDate(QDate.currentDate().addDays(1))
+        if d_from is not None and d_to is not None:
+            date_from.setDate(QDate(d_from.year, d_from.month, d_from.day))
+            date_to.setDate(QDate(d_to.year, d_to.month, d_to.day))
 
-        # Выбор только свободных номеров
+        # Выбор только свободных на эти даты номеров
         room_sel = QComboBox()
-        rooms = db.fetchall(
-            "SELECT id, number FROM rooms WHERE status='свободен' ORDER BY number"
-        )
-        for r in rooms:
-            room_sel.addItem(r[1], r[0])
+
+        def refill_rooms():
+            self.fill_room_combo(
+                room_sel,
+                date_from.date().toPyDate(),
+                date_to.date().toPyDate(),
+                prefer_room=room_id,
+            )
+
+        refill_rooms()
+        date_from.dateChanged.connect(refill_rooms)
+        date_to.dateChanged.connect(refill_rooms)
 
         form.addRow("Имя:", first)
         form.addRow("Фамилия:", last)
@@ -433,56 +568,31 @@ class MainWindow(QMainWindow):
 
             # Шифруем паспорт
             nonce, ct = aes_encrypt(pass_txt.encode("utf-8"))
-            try:
-                with db.conn.cursor() as cur:
+            ph = phone.text().strip()
+            disc_val = discount.value()
+            room_id = room_sel.currentData()
+            if room_id is None:
+                QMessageBox.warning(dlg, "Ошибка", "Выберите номер")
+                return
+            dfrom = date_from.date().toPyDate()
+            dto = date_to.date().toPyDate()
+
+            def write():
+                # пересечение дат отклонит сама БД (bookings_no_overlap) —
+                # тогда откатится и гость, и бронь
+                with db.transaction() as cur:
                     cur.execute(
                         """
-                        INSERT INTO guests(first_name, last_name, phone, passport_encrypted, passport_iv, discount)
-                        VALUES (%s,%s,%s,%s,%s,%s) RETURNING id
+                        INSERT INTO guests(first_name, last_name, phone, passport_encrypted, passport_iv,
+                                           passport_key_id, discount)
+                        VALUES (%s,%s,%s,%s,%s,%s,%s) RETURNING id
                         """,
-                        (fn, ln, phone.text().strip(), ct, nonce, discount.value()),
+                        (fn, ln, ph, ct, nonce, CURRENT_KEY_ID, disc_val),
                     )
                     gid = cur.fetchone()[0]
 
-                    # Создаём бронь
-                    room_id = room_sel.currentData()
-                    dfrom = date_from.date().toPyDate()
-                    dto = date_to.date().toPyDate()
-
-                    # Проверяем, нет ли пересечений по датам
-                    overlap = db.fetchone(
-                        """
-                        SELECT 1 FROM bookings
-                        WHERE room_id=%s AND status='active' AND (%s < date_to) AND (%s > date_from)
-                        """,
-                        (room_id, dfrom, dto),
-                    )
-                    if overlap:
-                        QMessageBox.warning(
-                            dlg,
-                            "Ошибка",
-                            "Номер уже забронирован в указанный период",
-                        )
-                        db.conn.rollback()
-                        return
-
-                    # Считаем итоговую цену с учётом скидки
-                    cur.execute(
-                        """
-                        SELECT rt.base_price
-                        FROM rooms r JOIN room_types rt ON r.type_id=rt.id
-                        WHERE r.id=%s
-                        """,
-                        (room_id,),
-                    )
-                    row_bp = cur.fetchone()
-                    base_price = (
-                        float(row_bp[0]) if row_bp and row_bp[0] is not None else 0.0
-                    )
-                    nights = (dto - dfrom).days
-                    if nights < 1:
-                        nights = 1
-                    total = base_price * nights * (1 - discount.value() / 100.0)
+                    # Создаём бронь; итоговую цену с учётом скидки считает pricing
+                    total = pricing.quote(room_id, dfrom, dto, disc_val)
                     cur.execute(
                         """
                         INSERT INTO bookings(room_id, guest_id, created_by, date_from, date_to, total_price)
@@ -494,48 +604,164 @@ class MainWindow(QMainWindow):
 
                     # Ставим номер в статус «бронь»
                     cur.execute("UPDATE rooms SET status='бронь' WHERE id=%s", (room_id,))
-                    db.conn.commit()
-                    QMessageBox.information(
-                        dlg, "Готово", f"Гость добавлен, бронь id={bid}"
+                return bid
+
+            def done(bid):
+                QMessageBox.information(
+                    dlg, "Готово", f"Гость добавлен, бронь id={bid}"
+                )
+                finish()
+
+            def failed(e):
+                if isinstance(e, BookingConflict):
+                    QMessageBox.warning(
+                        dlg,
+                        "Ошибка",
+                        "Номер уже забронирован в указанный период",
                     )
-            except Exception as e:
-                db.conn.rollback()
-                QMessageBox.critical(self, "Ошибка БД", str(e))
-            dlg.accept()
-            self.reload_guests()
-            self.reload_rooms()
+                    return
+                self.show_db_error(e)
+                finish()
+
+            def finish():
+                dlg.accept()
+                self.reload_guests()
+                self.reload_rooms()
+
+            self.submit_write(btn, write, on_done=done, on_error=failed)
 
         btn.clicked.connect(save)
         form.addRow(btn)
         dlg.setLayout(form)
         dlg.exec()
 
+    def dialog_quote(self):
+        """Подбор номера: все свободные на даты номера с суммой за проживание."""
+        dlg = QDialog(self)
+        dlg.setWindowTitle("Подбор номера")
+        dlg.resize(640, 480)
+        v = QVBoxLayout()
+
+        ctrl_h = QHBoxLayout()
+        date_from = QDateEdit()
+        date_from.setDate(QDate.currentDate())
+        date_to = QDateEdit()
+        date_to.setDate(QDate.currentDate().addDays(1))
+        guests = QSpinBox()
+        guests.setRange(1, 20)
+        for wdg in (QLabel("Заезд:"), date_from, QLabel("Выезд:"), date_to, QLabel("Гостей:"), guests):
+            ctrl_h.addWidget(wdg)
+        ctrl_h.addStretch()
+        v.addLayout(ctrl_h)
+
+        # строка: (id, номер, категория, мест, сумма, ночей)
+        model = RowsTableModel(
+            ["Номер", "Категория", "Мест", "За ночь", "Сумма"],
+            lambda q: (q[1], q[2] or "", str(q[3]), f"{q[4] / q[5]:.2f}", str(q[4])),
+            parent=dlg,
+        )
+        table = self.make_table_view(model)
+        v.addWidget(table)
+        summary = QLabel()
+        v.addWidget(summary)
+        btn = QPushButton("Оформить гостя")
+        v.addWidget(btn)
+
+        def period():
+            return date_from.date().toPyDate(), date_to.date().toPyDate()
+
+        def apply(rows, nights):
+            model.set_rows([q + (nights,) for q in rows])
+            summary.setText(f"Свободно номеров: {len(rows)}")
+
+        def reload():
+            d_from, d_to = period()
+            if d_to <= d_from:
+                model.set_rows([])
+                summary.setText("Дата выезда должна быть позже даты заезда")
+                return
+            nights = (d_to - d_from).days
+            # ключ "quote": при быстрой смене дат старые ответы отбрасываются
+            self.worker.submit(
+                "quote",
+                quote_free_rooms,
+                d_from,
+                d_to,
+                guests.value(),
+                on_done=lambda rows: apply(rows, nights),
+                on_error=self.show_db_error,
+            )
+
+        def book():
+            row = self.current_row(table)
+            if row is None:
+                QMessageBox.warning(dlg, "Выбор", "Выберите номер")
+                return
+            d_from, d_to = period()
+            dlg.accept()
+            self.dialog_add_guest(row[0], d_from, d_to)
+
+        date_from.dateChanged.connect(reload)
+        date_to.dateChanged.connect(reload)
+        guests.valueChanged.connect(reload)
+        table.doubleClicked.connect(lambda _: book())
+        btn.clicked.connect(book)
+        reload()
+        dlg.setLayout(v)
+        dlg.exec()
+
     def dialog_edit_guest(self):
         """Редактирование данных гостя и его активной брони."""
-        row = self.guests_table.currentRow()
-        if row < 0:
+        row = self.current_row(self.guests_table)
+        if row is None:
             QMessageBox.warning(self, "Выбор", "Выберите гостя для редактирования")
             return
-        fio_item = self.guests_table.item(row, 0)
-        gid = fio_item.data(Qt.ItemDataRole.UserRole)
+        gid = row[0]
         if not gid:
             QMessageBox.warning(self, "Ошибка", "Не удалось определить гостя")
             return
+        # гостя и его бронь читаем в фоне, диалог откроем по ответу
+        self.worker.submit(
+            "edit_dialog",
+            self.fetch_guest_for_edit,
+            gid,
+            on_done=lambda loaded: self.open_edit_guest(gid, loaded),
+            on_error=self.show_db_error,
+        )
+
+    @staticmethod
+    def fetch_guest_for_edit(gid):
         g = db.fetchone(
             """
-            SELECT first_name, last_name, phone, email, passport_encrypted, passport_iv, COALESCE(discount,0)
+            SELECT first_name, last_name, phone, email, passport_encrypted, passport_iv,
+                   COALESCE(discount,0), passport_key_id
             FROM guests WHERE id=%s
             """,
             (gid,),
         )
         if not g:
+            return None
+        active_booking = db.fetchone(
+            """
+            SELECT id, room_id, date_from, date_to
+            FROM bookings
+            WHERE guest_id=%s AND status='active'
+            ORDER BY id DESC LIMIT 1
+            """,
+            (gid,),
+        )
+        return g, active_booking
+
+    def open_edit_guest(self, gid, loaded):
+        if loaded is None:
             QMessageBox.warning(self, "Ошибка", "Гость не найден")
             return
-        fn_cur, ln_cur, phone_cur, email_cur, pen, piv, discount_cur = g
+        g, active_booking = loaded
+        fn_cur, ln_cur, phone_cur, email_cur, pen, piv, discount_cur, pkey = g
         passport_plain = ""
         try:
             if pen and piv:
-                passport_plain = aes_decrypt(piv.tobytes(), pen.tobytes()).decode(
+                passport_plain = aes_decrypt(piv.tobytes(), pen.tobytes(), pkey).decode(
                     "utf-8"
                 )
         except Exception:
@@ -561,15 +787,6 @@ class MainWindow(QMainWindow):
         form.addRow("Скидка, %", discount)
 
         # Если есть активная бронь — даём выбрать другой номер
-        active_booking = db.fetchone(
-            """
-            SELECT id, room_id, date_from, date_to
-            FROM bookings
-            WHERE guest_id=%s AND status='active'
-            ORDER BY id DESC LIMIT 1
-            """,
-            (gid,),
-        )
         room_combo = None
         old_room_id = None
         booking_dates = None
@@ -578,26 +795,9 @@ class MainWindow(QMainWindow):
             booking_dates = (d_from, d_to)
             room_combo = QComboBox()
             # Подбираем доступные номера с учётом дат
-            rooms = db.fetchall(
-                """
-                SELECT r.id, r.number
-                FROM rooms r
-                WHERE r.id=%s
-                   OR NOT EXISTS (
-                        SELECT 1 FROM bookings b2
-                        WHERE b2.room_id = r.id
-                          AND b2.status='active'
-                          AND b2.id<>%s
-                          AND (%s < b2.date_to) AND (%s > b2.date_from)
-                   )
-                ORDER BY r.number
-                """,
-                (old_room_id, bid, d_from, d_to),
+            self.fill_room_combo(
+                room_combo, d_from, d_to, exclude_booking=bid, keep_room=old_room_id
             )
-            for rid, num in rooms:
-                room_combo.addItem(num, rid)
-                if rid == old_room_id:
-                    room_combo.setCurrentIndex(room_combo.count() - 1)
             form.addRow("Номер (активная бронь)", room_combo)
 
         btn = QPushButton("Сохранить")
@@ -613,62 +813,44 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Ошибка", "Имя и фамилия обязательны")
                 return
             new_room_id = room_combo.currentData() if room_combo else None
-            try:
-                pass_ct = None
-                pass_iv = None
-                if pass_txt:
-                    pass_iv, pass_ct = aes_encrypt(pass_txt.encode("utf-8"))
-                db.execute(
-                    """
-                    UPDATE guests
-                    SET first_name=%s, last_name=%s, phone=%s, email=%s,
-                        passport_encrypted=%s, passport_iv=%s, discount=%s
-                    WHERE id=%s
-                    """,
-                    (fn, ln, ph, em, pass_ct, pass_iv, disc_val, gid),
-                )
+            # Если меняем номер или скидку — пересчитываем бронь и цену
+            recalc = active_booking and (
+                (new_room_id and new_room_id != old_room_id)
+                or disc_val != float(discount_cur or 0)
+            )
+            pass_ct = None
+            pass_iv = None
+            if pass_txt:
+                pass_iv, pass_ct = aes_encrypt(pass_txt.encode("utf-8"))
 
-                # Если меняем номер или скидку — пересчитываем бронь и цену
-                if active_booking and (
-                    (new_room_id and new_room_id != old_room_id)
-                    or disc_val != float(discount_cur or 0)
-                ):
-                    d_from, d_to = booking_dates
-                    overlap = db.fetchone(
+            def write():
+                with db.transaction() as cur:
+                    cur.execute(
                         """
-                        SELECT 1 FROM bookings
-                        WHERE room_id=%s AND id<>%s AND status='active'
-                          AND (%s < date_to) AND (%s > date_from)
+                        UPDATE guests
+                        SET first_name=%s, last_name=%s, phone=%s, email=%s,
+                            passport_encrypted=%s, passport_iv=%s, passport_key_id=%s, discount=%s
+                        WHERE id=%s
                         """,
-                        (new_room_id, bid, d_from, d_to),
+                        (
+                            fn,
+                            ln,
+                            ph,
+                            em,
+                            pass_ct,
+                            pass_iv,
+                            CURRENT_KEY_ID if pass_ct else None,
+                            disc_val,
+                            gid,
+                        ),
                     )
-                    if overlap:
-                        QMessageBox.warning(
-                            dlg, "Ошибка", "Номер занят/забронирован в эти даты"
-                        )
-                        db.conn.rollback()
-                        return
-                    room_for_price = new_room_id or old_room_id
-                    with db.conn.cursor() as cur:
+                    if recalc:
+                        d_from, d_to = booking_dates
+                        room_for_price = new_room_id or old_room_id
                         # Пересчитываем итоговую сумму
-                        cur.execute(
-                            """
-                            SELECT rt.base_price
-                            FROM rooms r JOIN room_types rt ON r.type_id=rt.id
-                            WHERE r.id=%s
-                            """,
-                            (room_for_price,),
-                        )
-                        row_bp = cur.fetchone()
-                        base_price = (
-                            float(row_bp[0])
-                            if row_bp and row_bp[0] is not None
-                            else 0.0
+                        total = pricing.quote(
+                            room_for_price, d_from, d_to, disc_val, exclude_booking=bid
                         )
-                        nights = (d_to - d_from).days
-                        if nights < 1:
-                            nights = 1
-                        total = base_price * nights * (1 - disc_val / 100.0)
                         if new_room_id and new_room_id != old_room_id:
                             cur.execute(
                                 "UPDATE bookings SET room_id=%s, total_price=%s WHERE id=%s",
@@ -688,13 +870,22 @@ class MainWindow(QMainWindow):
                                 "UPDATE bookings SET total_price=%s WHERE id=%s",
                                 (total, bid),
                             )
-                    db.conn.commit()
+
+            def done(_):
                 QMessageBox.information(self, "Сохранено", "Данные гостя обновлены")
                 dlg.accept()
                 self.reload_guests()
                 self.reload_rooms()
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка БД", str(e))
+
+            def failed(e):
+                if isinstance(e, BookingConflict):
+                    QMessageBox.warning(
+                        dlg, "Ошибка", "Номер занят/забронирован в эти даты"
+                    )
+                    return
+                self.show_db_error(e)
+
+            self.submit_write(btn, write, on_done=done, on_error=failed)
 
         btn.clicked.connect(save)
         form.addRow(btn)
@@ -703,34 +894,22 @@ class MainWindow(QMainWindow):
 
     def action_checkout_guest(self):
         """Выселяем гостя и ставим номер в статус «уборка»."""
-        row = self.guests_table.currentRow()
-        if row < 0:
+        row = self.current_row(self.guests_table)
+        if row is None:
             QMessageBox.warning(self, "Выбор", "Выберите гостя в таблице")
             return
-        fio = self.guests_table.item(row, 0).text()
-        parts = fio.split()
-        if len(parts) < 2:
-            QMessageBox.warning(self, "Ошибка", "Невозможно определить гостя")
-            return
-        first, last = parts[0], parts[1]
-        g = db.fetchone(
-            "SELECT id FROM guests WHERE first_name=%s AND last_name=%s ORDER BY id DESC LIMIT 1",
-            (first, last),
-        )
-        if not g:
-            QMessageBox.warning(self, "Ошибка", "Гость не найден")
-            return
-        gid = g[0]
-        b = db.fetchone(
-            "SELECT id, room_id FROM bookings WHERE guest_id=%s AND status='active' ORDER BY id DESC LIMIT 1",
-            (gid,),
-        )
-        if not b:
-            QMessageBox.information(self, "Инфо", "У гостя нет активной брони")
-            return
-        bid, room_id = b
-        try:
-            with db.conn.cursor() as cur:
+        gid = row[0]
+        admin_id = self.admin.get("id")
+
+        def write():
+            b = db.fetchone(
+                "SELECT id, room_id FROM bookings WHERE guest_id=%s AND status='active' ORDER BY id DESC LIMIT 1",
+                (gid,),
+            )
+            if not b:
+                return "no_booking", None
+            bid, room_id = b
+            with db.transaction() as cur:
                 cur.execute(
                     "UPDATE bookings SET status='completed' WHERE id=%s", (bid,)
                 )
@@ -742,124 +921,124 @@ class MainWindow(QMainWindow):
                     INSERT INTO room_status_history(room_id, old_status, new_status, changed_by)
                     VALUES (%s,%s,%s,%s)
                     """,
-                    (room_id, "занят", "уборка", self.admin.get("id")),
+                    (room_id, "занят", "уборка", admin_id),
                 )
-                db.conn.commit()
+            return "ok", room_id
+
+        def done(reply):
+            result, room_id = reply
+            if result == "no_booking":
+                QMessageBox.information(self, "Инфо", "У гостя нет активной брони")
+                return
+            self.set_tile_status(room_id, "уборка")
             QMessageBox.information(
                 self, "Готово", "Гость выселён, номер помечен как 'уборка'"
             )
-        except Exception as e:
-            db.conn.rollback()
-            QMessageBox.critical(self, "Ошибка БД", str(e))
-        self.reload_guests()
-        self.reload_rooms()
+            finish()
+
+        def failed(e):
+            self.show_db_error(e)
+            finish()
+
+        def finish():
+            self.reload_guests()
+            self.reload_rooms()
+
+        self.submit_write(None, write, on_done=done, on_error=failed)
 
     def action_guest_report(self):
         """Формируем docx‑отчёт по выбранному гостю."""
-        row = self.guests_table.currentRow()
-        if row < 0:
+        row = self.current_row(self.guests_table)
+        if row is None:
             QMessageBox.warning(self, "Выбор", "Выберите гостя в таблице")
             return
-        fio = self.guests_table.item(row, 0).text()
-        parts = fio.split()
-        first, last = parts[0], (parts[1] if len(parts) > 1 else "")
-
-        g = db.fetchone(
-            """
-            SELECT id, first_name, last_name, phone, email, passport_encrypted, passport_iv, created_at
-            FROM guests
-            WHERE first_name=%s AND last_name=%s
-            ORDER BY id DESC LIMIT 1
-            """,
-            (first, last),
-        )
-        if not g:
-            QMessageBox.warning(self, "Ошибка", "Гость не найден")
-            return
-        gid, g_first, g_last, phone, email, pen, piv, created_at = g
 
-        passport_plain = "не доступен"
-        try:
-            if pen and piv:
-                passport_plain = aes_decrypt(piv.tobytes(), pen.tobytes()).decode(
-                    "utf-8"
-                )
-        except Exception as e:
-            passport_plain = f"Ошибка расшифровки: {e}"
+        def done(filepath):
+            if filepath is None:
+                QMessageBox.warning(self, "Ошибка", "Гость не найден")
+                return
+            QMessageBox.information(
+                self, "Отчёт сформирован", f"Файл сохранён: {filepath}"
+            )
 
-        bookings = db.fetchall(
-            """
-            SELECT b.id, b.date_from, b.date_to, b.status, b.total_price, r.number
-            FROM bookings b
-            LEFT JOIN rooms r ON r.id=b.room_id
-            WHERE b.guest_id=%s
-            ORDER BY b.created_at DESC
-            """,
-            (gid,),
+        self.worker.submit(
+            None,
+            guest_reports.build_guest_report,
+            row[0],
+            on_done=done,
+            on_error=self.report_failed,
         )
 
-        # Пытаемся создать docx; если нет библиотеки, предупредим
-        try:
-            from docx import Document
-            from docx.shared import Pt
-        except ImportError:
+    def report_failed(self, e):
+        # Если нет библиотеки, предупредим
+        if isinstance(e, ImportError):
             QMessageBox.warning(
                 self,
                 "Нет зависимости",
                 "Установите пакет python-docx: pip install python-docx",
             )
             return
+        QMessageBox.critical(self, "Ошибка", f"Не удалось сформировать отчёт: {e}")
 
-        doc = Document()
-        doc.add_heading("Отчёт о проживании гостя", level=1)
-        doc.add_paragraph(f"ФИО: {g_first} {g_last}")
-        doc.add_paragraph(f"Паспорт: {passport_plain}")
-        if phone:
-            doc.add_paragraph(f"Телефон: {phone}")
-        if email:
-            doc.add_paragraph(f"E-mail: {email}")
-        if created_at:
-            doc.add_paragraph(f"Заведён в системе: {created_at}")
-
-        doc.add_paragraph("")
-        doc.add_heading("Бронирования", level=2)
-        if not bookings:
-            doc.add_paragraph("Нет данных о бронированиях.")
-        else:
-            table = doc.add_table(rows=1, cols=5)
-            hdr = table.rows[0].cells
-            hdr[0].text = "Номер"
-            hdr[1].text = "Заезд"
-            hdr[2].text = "Выезд"
-            hdr[3].text = "Статус"
-            hdr[4].text = "Сумма"
-            for _, d_from, d_to, b_status, price, room_num in bookings:
-                row_cells = table.add_row().cells
-                row_cells[0].text = str(room_num or "")
-                row_cells[1].text = str(d_from or "")
-                row_cells[2].text = str(d_to or "")
-                row_cells[3].text = b_status or ""
-                row_cells[4].text = f"{price}" if price is not None else ""
-
-        doc.add_paragraph("")
-        footer = doc.add_paragraph('ООО "ГостиТут"')
-        footer.runs[0].font.size = Pt(10)
-
-        reports_dir = os.path.join(os.getcwd(), "reports")
-        os.makedirs(reports_dir, exist_ok=True)
-        filename = (
-            f"guest_report_{gid}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-        )
-        filepath = os.path.join(reports_dir, filename)
-        try:
-            doc.save(filepath)
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить отчёт: {e}")
+    def action_month_reports(self):
+        """Отчёты по всем гостям, выехавшим за месяц, — в фоне с прогрессом."""
+        dlg = QDialog(self)
+        dlg.setWindowTitle("Отчёты за месяц")
+        form = QFormLayout()
+        month = QDateEdit()
+        month.setDisplayFormat("MM.yyyy")
+        month.setDate(QDate.currentDate())
+        fmt = QComboBox()
+        for f in ("docx", "pdf", "html", "csv"):
+            fmt.addItem(f.upper(), f)
+        as_zip = QCheckBox("Упаковать в zip")
+        as_zip.setChecked(True)
+        form.addRow("Месяц:", month)
+        form.addRow("Формат:", fmt)
+        form.addRow(as_zip)
+        btn = QPushButton("Сформировать")
+        btn.clicked.connect(dlg.accept)
+        form.addRow(btn)
+        dlg.setLayout(form)
+        if not dlg.exec():
             return
 
-        QMessageBox.information(
-            self, "Отчёт сформирован", f"Файл сохранён: {filepath}"
+        progress = QProgressDialog("Готовим данные…", "Отмена", 0, 0, self)
+        progress.setWindowTitle("Отчёты за месяц")
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def on_progress(done, total):
+            progress.setMaximum(total)
+            progress.setValue(done)
+            progress.setLabelText(f"Отчёты: {done} из {total}")
+
+        def done(result):
+            progress.close()
+            path, count = result
+            if not count:
+                QMessageBox.information(self, "Отчёты", "За этот месяц выселенных гостей нет")
+                return
+            QMessageBox.information(
+                self, "Отчёты сформированы", f"{count} отчётов сохранено: {path}"
+            )
+
+        def failed(e):
+            progress.close()
+            self.report_failed(e)
+
+        job = self.worker.start_job(
+            partial(
+                guest_reports.build_month_reports,
+                month.date().toPyDate(),
+                as_zip.isChecked(),
+                fmt=fmt.currentData(),
+            ),
+            on_progress=on_progress,
+            on_done=done,
+            on_error=failed,
         )
+        progress.canceled.connect(job.cancel)
 
     # -------- Номера --------
 
@@ -883,16 +1062,20 @@ class MainWindow(QMainWindow):
         v.addLayout(btn_h)
 
         # Таблица с номерами
-        self.rooms_table = QTableWidget(0, 4)
-        self.rooms_table.setHorizontalHeaderLabels(
-            ["Номер", "Этаж", "Категория", "Статус"]
-        )
-        self.rooms_table.horizontalHeader().setSectionResizeMode(
-            QHeaderView.ResizeMode.Stretch
+        self.rooms_model = LazyTableModel(
+            self.worker,
+            "rooms",
+            ["Номер", "Этаж", "Категория", "Статус"],
+            self.fetch_rooms_page,
+            self.render_room_row,
+            fetch_rows=self.fetch_rooms_rows,
+            parent=self,
         )
+        self.rooms_model.failed.connect(self.show_db_error)
+        self.rooms_table = self.make_table_view(self.rooms_model)
         v.addWidget(self.rooms_table)
 
-        self.rooms_table.itemDoubleClicked.connect(self.dialog_edit_room)
+        self.rooms_table.doubleClicked.connect(self.dialog_edit_room)
         btn_add_cat.clicked.connect(self.dialog_add_category)
         btn_add_room.clicked.connect(self.dialog_add_room)
         btn_del_room.clicked.connect(self.action_delete_room)
@@ -902,61 +1085,69 @@ class MainWindow(QMainWindow):
         return w
 
     def reload_rooms(self):
-        """Обновляем таблицу номеров и главную страницу, если она открыта."""
-        self.selected_tile = None
-        self.rooms_table.setRowCount(0)
-        rows = db.fetchall(
-            """
+        """Обновляем таблицу номеров и плитки на главной."""
+        if self.rooms_model is not None:
+            self.rooms_model.reload()
+        self.refresh_tiles()
+
+    @staticmethod
+    def fetch_rooms_page(after, limit):
+        # номер комнаты уникален — по нему и листаем
+        where = ""
+        params = ()
+        if after is not None:
+            where = "WHERE r.number > %s"
+            params = (after[1],)
+        return MainWindow.select_room_rows(where, params, limit)
+
+    @staticmethod
+    def fetch_rooms_rows(room_ids):
+        return MainWindow.select_room_rows("WHERE r.id = ANY(%s)", (room_ids,))
+
+    @staticmethod
+    def select_room_rows(where, params, limit=None):
+        return db.fetchall(
+            f"""
             SELECT r.id, r.number, r.floor, rt.name, r.status, rt.id AS type_id, rt.base_price
             FROM rooms r LEFT JOIN room_types rt ON r.type_id=rt.id
+            {where}
             ORDER BY r.number
-            """
+            LIMIT %s
+            """,
+            params + (limit,),
         )
-        for r in rows:
-            rid, number, floor, cat, status, type_id, base_price = r
-            row = self.rooms_table.rowCount()
-            self.rooms_table.insertRow(row)
-            num_item = QTableWidgetItem(str(number))
-            num_item.setData(
-                Qt.ItemDataRole.UserRole,
-                {
-                    "id": rid,
-                    "type_id": type_id,
-                    "price": float(base_price) if base_price is not None else None,
-                },
-            )
-            self.rooms_table.setItem(row, 0, num_item)
-            self.rooms_table.setItem(
-                row, 1, QTableWidgetItem(str(floor) if floor else "")
-            )
-            self.rooms_table.setItem(
-                row, 2, QTableWidgetItem(cat if cat else "")
-            )
-            self.rooms_table.setItem(row, 3, QTableWidgetItem(status))
 
-        # Если открыта «Главная» — обновляем плитки с номерами
-        if self.stack.currentWidget() == self.page_main:
-            self.stack.removeWidget(self.page_main)
-            self.page_main = self.build_main_page()
-            self.stack.insertWidget(0, self.page_main)
-            self.stack.setCurrentWidget(self.page_main)
+    @staticmethod
+    def render_room_row(r):
+        rid, number, floor, cat, status, type_id, base_price = r
+        return (
+            str(number),
+            str(floor) if floor else "",
+            cat if cat else "",
+            status,
+        )
 
     def dialog_edit_room(self):
         """Редактирование одного номера."""
-        row = self.rooms_table.currentRow()
-        if row < 0:
+        row = self.current_row(self.rooms_table)
+        if row is None:
             QMessageBox.warning(self, "Выбор", "Выберите номер для редактирования")
             return
-        num_item = self.rooms_table.item(row, 0)
-        meta = num_item.data(Qt.ItemDataRole.UserRole) or {}
-        rid = meta.get("id")
-        type_id = meta.get("type_id")
-        base_price = meta.get("price")
-        if not rid:
+        if not row[0]:
             QMessageBox.warning(self, "Ошибка", "Не удалось определить номер")
             return
-        number_cur = num_item.text()
-        floor_cur = self.rooms_table.item(row, 1).text()
+        # справочник после записи перечитывается — в фоне, диалог откроем по ответу
+        self.worker.submit(
+            "edit_dialog",
+            refdata.types,
+            on_done=lambda types: self.open_edit_room(row, types),
+            on_error=self.show_db_error,
+        )
+
+    def open_edit_room(self, row, types):
+        rid, number, floor, _, _, type_id, base_price = row
+        number_cur = str(number)
+        floor_cur = str(floor) if floor else ""
 
         dlg = QDialog(self)
         dlg.setWindowTitle(f"Редактировать номер {number_cur}")
@@ -969,9 +1160,8 @@ class MainWindow(QMainWindow):
         except Exception:
             floor_spin.setValue(0)
         cat_combo = QComboBox()
-        types = db.fetchall("SELECT id, name, base_price FROM room_types ORDER BY id")
         current_price = base_price
-        for t_id, t_name, t_price in types:
+        for t_id, t_name, _, t_price in types:
             cat_combo.addItem(t_name, t_id)
             if t_id == type_id:
                 current_price = t_price
@@ -993,25 +1183,29 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(dlg, "Ошибка", "Номер обязателен")
                 return
             new_type_id = cat_combo.currentData()
-            try:
-                with db.conn.cursor() as cur:
+            floor_new = floor_spin.value()
+            price_new = price_spin.value()
+
+            def write():
+                with db.transaction() as cur:
                     cur.execute(
                         "UPDATE rooms SET number=%s, floor=%s, type_id=%s WHERE id=%s",
-                        (num_new, floor_spin.value(), new_type_id, rid),
+                        (num_new, floor_new, new_type_id, rid),
                     )
                     if new_type_id:
                         cur.execute(
                             "UPDATE room_types SET base_price=%s WHERE id=%s",
-                            (price_spin.value(), new_type_id),
+                            (price_new, new_type_id),
                         )
-                db.conn.commit()
+
+            def done(_):
+                refdata.invalidate()
                 QMessageBox.information(dlg, "Сохранено", "Номер обновлён")
                 dlg.accept()
                 self.reload_rooms()
                 self.reload_guests()
-            except Exception as e:
-                db.conn.rollback()
-                QMessageBox.critical(self, "Ошибка БД", str(e))
+
+            self.submit_write(btn, write, on_done=done)
 
         btn.clicked.connect(save)
         form.addRow(btn)
@@ -1037,15 +1231,32 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(dlg, "Ошибка", "Введите название")
                 return
             try:
-                db.execute(
-                    "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
-                    (n, desc.text().strip(), float(price.text() or 0)),
-                )
+                base_price = float(price.text() or 0)
+            except ValueError as e:
+                QMessageBox.critical(dlg, "Ошибка", str(e))
+                return
+
+            def done(_):
                 QMessageBox.information(dlg, "Готово", "Категория добавлена")
-            except Exception as e:
+                finish()
+
+            def failed(e):
                 QMessageBox.critical(dlg, "Ошибка", str(e))
-            dlg.accept()
-            self.reload_rooms()
+                finish()
+
+            def finish():
+                refdata.invalidate()
+                dlg.accept()
+                self.reload_rooms()
+
+            self.submit_write(
+                btn,
+                db.execute,
+                "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
+                (n, desc.text().strip(), base_price),
+                on_done=done,
+                on_error=failed,
+            )
 
         btn.clicked.connect(save)
         form.addRow(btn)
@@ -1054,6 +1265,11 @@ class MainWindow(QMainWindow):
 
     def dialog_add_room(self):
         """Добавление нового номера."""
+        self.worker.submit(
+            "edit_dialog", refdata.types, on_done=self.open_add_room, on_error=self.show_db_error
+        )
+
+    def open_add_room(self, types):
         dlg = QDialog(self)
         dlg.setWindowTitle("Добавить номер")
         form = QFormLayout()
@@ -1063,9 +1279,8 @@ class MainWindow(QMainWindow):
 
         # Выбор категории номера
         cat = QComboBox()
-        cats = db.fetchall("SELECT id, name FROM room_types ORDER BY id")
-        for c in cats:
-            cat.addItem(c[1], c[0])
+        for type_id, type_name, _, _ in types:
+            cat.addItem(type_name, type_id)
         form.addRow("Номер:", number)
         form.addRow("Этаж:", floor)
         form.addRow("Категория:", cat)
@@ -1075,16 +1290,28 @@ class MainWindow(QMainWindow):
             if not number.text().strip():
                 QMessageBox.warning(dlg, "Ошибка", "Введите номер")
                 return
-            try:
-                db.execute(
-                    "INSERT INTO rooms(number, floor, type_id) VALUES (%s,%s,%s)",
-                    (number.text().strip(), floor.value(), cat.currentData()),
-                )
+
+            def done(_):
                 QMessageBox.information(dlg, "Готово", "Номер добавлен")
-            except Exception as e:
+                finish()
+
+            def failed(e):
                 QMessageBox.critical(dlg, "Ошибка", str(e))
-            dlg.accept()
-            self.reload_rooms()
+                finish()
+
+            def finish():
+                refdata.invalidate()
+                dlg.accept()
+                self.reload_rooms()
+
+            self.submit_write(
+                btn,
+                db.execute,
+                "INSERT INTO rooms(number, floor, type_id) VALUES (%s,%s,%s)",
+                (number.text().strip(), floor.value(), cat.currentData()),
+                on_done=done,
+                on_error=failed,
+            )
 
         btn.clicked.connect(save)
         form.addRow(btn)
@@ -1093,15 +1320,11 @@ class MainWindow(QMainWindow):
 
     def action_delete_room(self):
         """Удаляем номер, при желании удаляем и категорию."""
-        row = self.rooms_table.currentRow()
-        if row < 0:
+        row = self.current_row(self.rooms_table)
+        if row is None:
             QMessageBox.warning(self, "Выбор", "Выберите строку")
             return
-        num_item = self.rooms_table.item(row, 0)
-        number = num_item.text()
-        meta = num_item.data(Qt.ItemDataRole.UserRole) or {}
-        room_id = meta.get("id")
-        type_id = meta.get("type_id")
+        room_id, number, _, _, _, type_id, _ = row
 
         # Окно подтверждения удаления с галочкой «удалить категорию»
         dlg = QDialog(self)
@@ -1124,10 +1347,12 @@ class MainWindow(QMainWindow):
             if not room_id:
                 QMessageBox.critical(self, "Ошибка", "Не удалось определить ID номера")
                 return
-            try:
-                with db.conn.cursor() as cur:
+            drop_type = chk.isChecked()
+
+            def write():
+                with db.transaction() as cur:
                     cur.execute("DELETE FROM rooms WHERE id=%s", (room_id,))
-                    if chk.isChecked() and type_id:
+                    if drop_type and type_id:
                         # проверим, остались ли ещё номера этой категории
                         cur.execute(
                             "SELECT COUNT(*) FROM rooms WHERE type_id=%s", (type_id,)
@@ -1137,12 +1362,18 @@ class MainWindow(QMainWindow):
                             cur.execute(
                                 "DELETE FROM room_types WHERE id=%s", (type_id,)
                             )
-                db.conn.commit()
+
+            def done(_):
+                refdata.invalidate()
                 QMessageBox.information(self, "Готово", "Номер удалён")
                 self.reload_rooms()
-            except Exception as e:
-                db.conn.rollback()
-                QMessageBox.critical(self, "Ошибка", str(e))
+
+            self.submit_write(
+                None,
+                write,
+                on_done=done,
+                on_error=lambda e: QMessageBox.critical(self, "Ошибка", str(e)),
+            )
 
         btn_ok.clicked.connect(do_delete)
         btn_cancel.clicked.connect(dlg.reject)
@@ -1166,78 +1397,178 @@ class MainWindow(QMainWindow):
         btn_h.addStretch()
         v.addLayout(btn_h)
 
-        self.bookings_table = QTableWidget(0, 6)
-        self.bookings_table.setHorizontalHeaderLabels(
-            ["ID", "Номер", "Гость", "Заезд", "Выезд", "Статус"]
-        )
-        self.bookings_table.horizontalHeader().setSectionResizeMode(
-            QHeaderView.ResizeMode.Stretch
+        # Поиск и фильтры — выполняются на стороне БД
+        filter_h = QHBoxLayout()
+        self.bk_room = QLineEdit()
+        self.bk_room.setPlaceholderText("Номер")
+        self.bk_guest = QLineEdit()
+        self.bk_guest.setPlaceholderText("Гость")
+        self.bk_status = QComboBox()
+        self.bk_status.addItem("Все статусы", None)
+        for st in ("active", "cancelled", "completed"):
+            self.bk_status.addItem(st, st)
+        self.bk_period = QCheckBox("Период")
+        self.bk_from = QDateEdit()
+        self.bk_from.setDate(QDate.currentDate().addDays(-30))
+        self.bk_to = QDateEdit()
+        self.bk_to.setDate(QDate.currentDate().addDays(30))
+        btn_find = QPushButton("Найти")
+        btn_reset = QPushButton("Сбросить")
+        for wdg in (
+            self.bk_room,
+            self.bk_guest,
+            self.bk_status,
+            self.bk_period,
+            self.bk_from,
+            self.bk_to,
+            btn_find,
+            btn_reset,
+        ):
+            filter_h.addWidget(wdg)
+        v.addLayout(filter_h)
+
+        self.bookings_model = LazyTableModel(
+            self.worker,
+            "bookings",
+            ["ID", "Номер", "Гость", "Заезд", "Выезд", "Статус"],
+            self.fetch_bookings_page,
+            lambda r: tuple(str(v) for v in r),
+            fetch_rows=self.fetch_bookings_rows,
+            parent=self,
         )
+        self.bookings_model.failed.connect(self.show_db_error)
+        self.bookings_table = self.make_table_view(self.bookings_model)
         v.addWidget(self.bookings_table)
 
-        self.bookings_table.itemDoubleClicked.connect(self.dialog_edit_booking)
+        self.bookings_table.doubleClicked.connect(lambda _: self.dialog_edit_booking())
         btn_create.clicked.connect(self.dialog_create_booking)
         btn_cancel.clicked.connect(self.action_cancel_booking)
+        btn_find.clicked.connect(self.apply_bookings_filter)
+        btn_reset.clicked.connect(self.reset_bookings_filter)
+        self.bk_room.returnPressed.connect(self.apply_bookings_filter)
+        self.bk_guest.returnPressed.connect(self.apply_bookings_filter)
+        self.bk_status.currentIndexChanged.connect(self.apply_bookings_filter)
 
         self.reload_bookings()
         w.setLayout(v)
         return w
 
     def reload_bookings(self):
-        self.bookings_table.setRowCount(0)
-        rows = db.fetchall(
-            """
+        if self.bookings_model is not None:
+            self.bookings_model.set_query_args(self.bookings_filter())
+
+    def bookings_filter(self):
+        """Текущие значения панели поиска броней."""
+        return {
+            "room": self.bk_room.text().strip(),
+            "guest": self.bk_guest.text().strip(),
+            "status": self.bk_status.currentData(),
+            "date_from": self.bk_from.date().toPyDate() if self.bk_period.isChecked() else None,
+            "date_to": self.bk_to.date().toPyDate() if self.bk_period.isChecked() else None,
+        }
+
+    def apply_bookings_filter(self):
+        self.bookings_model.set_query_args(self.bookings_filter())
+
+    def reset_bookings_filter(self):
+        self.bk_room.clear()
+        self.bk_guest.clear()
+        self.bk_period.setChecked(False)
+        # смена статуса сама перечитает таблицу
+        if self.bk_status.currentIndex() != 0:
+            self.bk_status.setCurrentIndex(0)
+        else:
+            self.apply_bookings_filter()
+
+    @staticmethod
+    def fetch_bookings_rows(booking_ids, filters=None):
+        # те же фильтры: изменённая бронь может перестать им подходить
+        return MainWindow.fetch_bookings_page(None, None, filters, booking_ids)
+
+    @staticmethod
+    def fetch_bookings_page(after, limit, filters=None, booking_ids=None):
+        # новые заезды сверху; id брони разрешает одинаковые даты
+        filters = filters or {}
+        where = []
+        params = []
+        if booking_ids is not None:
+            where.append("b.id = ANY(%s)")
+            params.append(booking_ids)
+        if filters.get("room"):
+            where.append("r.number ILIKE %s")
+            params.append(f"%{escape_like(filters['room'])}%")
+        # каждое слово — начало имени или фамилии (индексы по lower(...) text_pattern_ops)
+        for word in (filters.get("guest") or "").lower().split():
+            where.append("(lower(g.first_name) LIKE %s OR lower(g.last_name) LIKE %s)")
+            prefix = escape_like(word) + "%"
+            params += [prefix, prefix]
+        if filters.get("status"):
+            where.append("b.status = %s")
+            params.append(filters["status"])
+        if filters.get("date_from") and filters.get("date_to"):
+            # брони, пересекающиеся с выбранным периодом
+            where.append("b.date_from <= %s AND b.date_to >= %s")
+            params += [filters["date_to"], filters["date_from"]]
+        if after is not None:
+            where.append("(b.date_from, b.id) < (%s, %s)")
+            params += [after[3], after[0]]
+        where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+        return db.fetchall(
+            f"""
             SELECT b.id, r.number, g.first_name||' '||g.last_name, b.date_from, b.date_to, b.status
             FROM bookings b
             LEFT JOIN rooms r ON r.id=b.room_id
             LEFT JOIN guests g ON g.id=b.guest_id
-            ORDER BY b.date_from DESC
-            """
+            {where_sql}
+            ORDER BY b.date_from DESC, b.id DESC
+            LIMIT %s
+            """,
+            tuple(params) + (limit,),
         )
-        for r in rows:
-            row = self.bookings_table.rowCount()
-            self.bookings_table.insertRow(row)
-            for i, v in enumerate(r):
-                self.bookings_table.setItem(row, i, QTableWidgetItem(str(v)))
-
-    def dialog_edit_booking(self):
-        """Редактирование выбранной брони."""
-        row = self.bookings_table.currentRow()
-        if row < 0:
-            QMessageBox.warning(self, "Выбор", "Выберите бронь для редактирования")
-            return
-        bid = int(self.bookings_table.item(row, 0).text())
-        b = db.fetchone(
+
+    def dialog_edit_booking(self, bid=None):
+        """Редактирование брони bid или выбранной в таблице."""
+        if bid is None:
+            row = self.current_row(self.bookings_table)
+            if row is None:
+                QMessageBox.warning(self, "Выбор", "Выберите бронь для редактирования")
+                return
+            bid = row[0]
+        self.worker.submit(
+            "edit_dialog",
+            self.fetch_booking_for_edit,
+            bid,
+            on_done=lambda b: self.open_edit_booking(bid, b),
+            on_error=self.show_db_error,
+        )
+
+    @staticmethod
+    def fetch_booking_for_edit(bid):
+        return db.fetchone(
             """
-            SELECT room_id, guest_id, date_from, date_to, status, total_price
-            FROM bookings WHERE id=%s
+            SELECT b.room_id, b.guest_id, b.date_from, b.date_to, b.status, b.total_price,
+                   g.first_name, g.last_name, g.phone
+            FROM bookings b LEFT JOIN guests g ON g.id = b.guest_id
+            WHERE b.id=%s
             """,
             (bid,),
         )
+
+    def open_edit_booking(self, bid, b):
         if not b:
             QMessageBox.warning(self, "Ошибка", "Бронь не найдена")
             return
-        room_id, guest_id, d_from, d_to, status_cur, total_price = b
+        room_id, guest_id, d_from, d_to, status_cur, total_price = b[:6]
 
         dlg = QDialog(self)
         dlg.setWindowTitle(f"Редактировать бронь {bid}")
         form = QFormLayout()
 
         room_cb = QComboBox()
-        rooms = db.fetchall("SELECT id, number, status FROM rooms ORDER BY number")
-        for r in rooms:
-            room_cb.addItem(f"{r[1]} ({r[2]})", r[0])
-            if r[0] == room_id:
-                room_cb.setCurrentIndex(room_cb.count() - 1)
-
-        guest_cb = QComboBox()
-        guests = db.fetchall(
-            "SELECT id, first_name, last_name FROM guests ORDER BY id DESC"
-        )
-        for g in guests:
-            guest_cb.addItem(f"{g[1]} {g[2]}", g[0])
-            if g[0] == guest_id:
-                guest_cb.setCurrentIndex(guest_cb.count() - 1)
+
+        guest_pick = self.make_guest_picker()
+        if guest_id is not None:
+            guest_pick.set_guest(guest_id, guest_label(*b[6:]))
 
         date_from = QDateEdit()
         date_to = QDateEdit()
@@ -1246,6 +1577,21 @@ class MainWindow(QMainWindow):
         if isinstance(d_to, date):
             date_to.setDate(QDate(d_to.year, d_to.month, d_to.day))
 
+        # Номера, свободные на даты брони (текущий номер — всегда)
+        def refill_rooms():
+            self.fill_room_combo(
+                room_cb,
+                date_from.date().toPyDate(),
+                date_to.date().toPyDate(),
+                exclude_booking=bid,
+                keep_room=room_id,
+                with_status=True,
+            )
+
+        refill_rooms()
+        date_from.dateChanged.connect(refill_rooms)
+        date_to.dateChanged.connect(refill_rooms)
+
         status_combo = QComboBox()
         statuses = ["active", "cancelled", "completed"]
         status_combo.addItems(statuses)
@@ -1259,7 +1605,7 @@ class MainWindow(QMainWindow):
             price_spin.setValue(float(total_price))
 
         form.addRow("Номер", room_cb)
-        form.addRow("Гость", guest_cb)
+        form.addRow("Гость", guest_pick)
         form.addRow("Заезд", date_from)
         form.addRow("Выезд", date_to)
         form.addRow("Статус", status_combo)
@@ -1268,31 +1614,25 @@ class MainWindow(QMainWindow):
 
         def save():
             room_new = room_cb.currentData()
-            guest_new = guest_cb.currentData()
+            if room_new is None:
+                # список номеров ещё не пришёл из фона
+                QMessageBox.warning(dlg, "Ошибка", "Выберите номер")
+                return
+            guest_new = guest_pick.guest_id()
+            if guest_new is None:
+                QMessageBox.warning(dlg, "Ошибка", "Выберите гостя из списка")
+                return
             dfrom = date_from.date().toPyDate()
             dto = date_to.date().toPyDate()
             if dto < dfrom:
                 QMessageBox.warning(dlg, "Ошибка", "Дата выезда раньше заезда")
                 return
 
-            # Проверяем пересечения только для активных броней
-            if status_combo.currentText() == "active":
-                overlap = db.fetchone(
-                    """
-                    SELECT 1 FROM bookings
-                    WHERE room_id=%s AND id<>%s AND status='active'
-                      AND (%s < date_to) AND (%s > date_from)
-                    """,
-                    (room_new, bid, dfrom, dto),
-                )
-                if overlap:
-                    QMessageBox.warning(
-                        dlg, "Ошибка", "Номер занят/забронирован в выбранные даты"
-                    )
-                    return
+            status_new = status_combo.currentText()
 
-            try:
-                with db.conn.cursor() as cur:
+            def write():
+                # пересечения активных броней проверяет ограничение в БД
+                with db.transaction() as cur:
                     # пересчёт стоимости по текущей скидке гостя
                     cur.execute(
                         "SELECT COALESCE(discount,0) FROM guests WHERE id=%s",
@@ -1304,22 +1644,7 @@ class MainWindow(QMainWindow):
                         if disc_row and disc_row[0] is not None
                         else 0.0
                     )
-                    cur.execute(
-                        """
-                        SELECT rt.base_price
-                        FROM rooms r JOIN room_types rt ON r.type_id=rt.id
-                        WHERE r.id=%s
-                        """,
-                        (room_new,),
-                    )
-                    row_bp = cur.fetchone()
-                    base_price = (
-                        float(row_bp[0]) if row_bp and row_bp[0] is not None else 0.0
-                    )
-                    nights = (dto - dfrom).days
-                    if nights < 1:
-                        nights = 1
-                    total = base_price * nights * (1 - disc_val / 100.0)
+                    total = pricing.quote(room_new, dfrom, dto, disc_val, exclude_booking=bid)
                     cur.execute(
                         """
                         UPDATE bookings
@@ -1332,31 +1657,40 @@ class MainWindow(QMainWindow):
                             guest_new,
                             dfrom,
                             dto,
-                            status_combo.currentText(),
+                            status_new,
                             total,
                             bid,
                         ),
                     )
 
                     # Обновим статус комнаты в зависимости от статуса брони
-                    if status_combo.currentText() == "active":
+                    if status_new == "active":
                         cur.execute(
                             "UPDATE rooms SET status='бронь' WHERE id=%s", (room_new,)
                         )
-                    elif status_combo.currentText() in ("cancelled", "completed"):
+                    elif status_new in ("cancelled", "completed"):
                         cur.execute(
                             "UPDATE rooms SET status='свободен' WHERE id=%s",
                             (room_new,),
                         )
-                db.conn.commit()
+
+            def done(_):
                 QMessageBox.information(dlg, "Сохранено", "Бронь обновлена")
                 dlg.accept()
                 self.reload_bookings()
                 self.reload_guests()
                 self.reload_rooms()
-            except Exception as e:
-                db.conn.rollback()
-                QMessageBox.critical(self, "Ошибка БД", str(e))
+                self.reload_calendar()
+
+            def failed(e):
+                if isinstance(e, BookingConflict):
+                    QMessageBox.warning(
+                        dlg, "Ошибка", "Номер занят/забронирован в выбранные даты"
+                    )
+                    return
+                self.show_db_error(e)
+
+            self.submit_write(btn, write, on_done=done, on_error=failed)
 
         btn.clicked.connect(save)
         form.addRow(btn)
@@ -1369,40 +1703,43 @@ class MainWindow(QMainWindow):
         dlg.setWindowTitle("Создать бронь")
         form = QFormLayout()
 
-        # Выбор номера, который сейчас свободен
+        # Выбор номера, свободного на выбранные даты
         room_cb = QComboBox()
-        rooms = db.fetchall(
-            """
-            SELECT id, number, status
-            FROM rooms
-            WHERE status NOT IN ('занят','бронь')
-            ORDER BY number
-            """
-        )
-        for r in rooms:
-            room_cb.addItem(f"{r[1]} ({r[2]})", r[0])
 
-        # Выбор гостя из уже заведённых
-        guest_cb = QComboBox()
-        guests = db.fetchall(
-            "SELECT id, first_name, last_name FROM guests ORDER BY id DESC"
-        )
-        for g in guests:
-            guest_cb.addItem(f"{g[1]} {g[2]}", g[0])
+        # Выбор гостя из уже заведённых — поиском по мере ввода
+        guest_pick = self.make_guest_picker()
 
         date_from = QDateEdit()
         date_from.setDate(QDate.currentDate())
         date_to = QDateEdit()
         date_to.setDate(QDate.currentDate().addDays(1))
+
+        def refill_rooms():
+            self.fill_room_combo(
+                room_cb,
+                date_from.date().toPyDate(),
+                date_to.date().toPyDate(),
+                with_status=True,
+            )
+
+        refill_rooms()
+        date_from.dateChanged.connect(refill_rooms)
+        date_to.dateChanged.connect(refill_rooms)
         form.addRow("Номер:", room_cb)
-        form.addRow("Гость:", guest_cb)
+        form.addRow("Гость:", guest_pick)
         form.addRow("Заезд:", date_from)
         form.addRow("Выезд:", date_to)
         btn = QPushButton("Создать")
 
         def create():
             room_id = room_cb.currentData()
-            guest_id = guest_cb.currentData()
+            if room_id is None:
+                QMessageBox.warning(dlg, "Ошибка", "Выберите номер")
+                return
+            guest_id = guest_pick.guest_id()
+            if guest_id is None:
+                QMessageBox.warning(dlg, "Ошибка", "Выберите гостя из списка")
+                return
             dfrom = date_from.date().toPyDate()
             dto = date_to.date().toPyDate()
             if dfrom >= dto:
@@ -1411,41 +1748,48 @@ class MainWindow(QMainWindow):
                 )
                 return
 
-            # Проверяем, нет ли пересечений по датам
-            overlap = db.fetchone(
-                """
-                SELECT 1 FROM bookings
-                WHERE room_id=%s AND status='active' AND (%s < date_to) AND (%s > date_from)
-                """,
-                (room_id, dfrom, dto),
-            )
-            if overlap:
-                QMessageBox.warning(
-                    dlg, "Ошибка", "Номер занят/забронирован в выбранные даты"
-                )
-                return
+            admin_id = self.admin.get("id")
 
-            try:
-                with db.conn.cursor() as cur:
+            def write():
+                # пересечение дат отклонит ограничение bookings_no_overlap
+                with db.transaction() as cur:
+                    cur.execute(
+                        "SELECT COALESCE(discount,0) FROM guests WHERE id=%s", (guest_id,)
+                    )
+                    disc_row = cur.fetchone()
+                    total = pricing.quote(room_id, dfrom, dto, disc_row[0] if disc_row else 0)
                     cur.execute(
                         """
                         INSERT INTO bookings(room_id, guest_id, created_by, date_from, date_to, total_price)
                         VALUES (%s,%s,%s,%s,%s,%s) RETURNING id
                         """,
-                        (room_id, guest_id, self.admin.get("id"), dfrom, dto, 0.0),
+                        (room_id, guest_id, admin_id, dfrom, dto, total),
                     )
                     bid = cur.fetchone()[0]
                     cur.execute(
                         "UPDATE rooms SET status='бронь' WHERE id=%s", (room_id,)
                     )
-                    db.conn.commit()
+                return bid
+
+            def done(bid):
                 QMessageBox.information(dlg, "Готово", f"Бронь создана id={bid}")
-            except Exception as e:
-                db.conn.rollback()
-                QMessageBox.critical(self, "Ошибка БД", str(e))
-            dlg.accept()
-            self.reload_bookings()
-            self.reload_rooms()
+                finish()
+
+            def failed(e):
+                if isinstance(e, BookingConflict):
+                    QMessageBox.warning(
+                        dlg, "Ошибка", "Номер занят/забронирован в выбранные даты"
+                    )
+                    return
+                self.show_db_error(e)
+                finish()
+
+            def finish():
+                dlg.accept()
+                self.reload_bookings()
+                self.reload_rooms()
+
+            self.submit_write(btn, write, on_done=done, on_error=failed)
 
         btn.clicked.connect(create)
         form.addRow(btn)
@@ -1454,13 +1798,14 @@ class MainWindow(QMainWindow):
 
     def action_cancel_booking(self):
         """Отмена выбранной брони и освобождение номера."""
-        row = self.bookings_table.currentRow()
-        if row < 0:
+        row = self.current_row(self.bookings_table)
+        if row is None:
             QMessageBox.warning(self, "Выбор", "Выберите бронь")
             return
-        bid = int(self.bookings_table.item(row, 0).text())
-        try:
-            with db.conn.cursor() as cur:
+        bid = row[0]
+
+        def write():
+            with db.transaction() as cur:
                 # получить room_id
                 cur.execute("SELECT room_id FROM bookings WHERE id=%s", (bid,))
                 row = cur.fetchone()
@@ -1472,12 +1817,151 @@ class MainWindow(QMainWindow):
                     cur.execute(
                         "UPDATE rooms SET status='свободен' WHERE id=%s", (room_id,)
                     )
-                db.conn.commit()
+
+        def done(_):
             QMessageBox.information(self, "Готово", "Бронь отменена")
-        except Exception as e:
-            db.conn.rollback()
-            QMessageBox.critical(self, "Ошибка БД", str(e))
-        self.reload_bookings()
-        self.reload_rooms()
+            finish()
+
+        def failed(e):
+            self.show_db_error(e)
+            finish()
+
+        def finish():
+            self.reload_bookings()
+            self.reload_rooms()
+
+        self.submit_write(None, write, on_done=done, on_error=failed)
+
+    # -------- Календарь --------
+
+    def build_calendar_page(self):
+        """Страница «Календарь» — занятость номеров по дням."""
+        w = QWidget()
+        v = QVBoxLayout()
+        v.setContentsMargins(18, 18, 18, 18)
+        title = QLabel("Календарь")
+        title.setFont(TITLE_FONT)
+        v.addWidget(title)
+
+        range_h = QHBoxLayout()
+        self.cal_from = QDateEdit()
+        self.cal_from.setDate(QDate.currentDate().addDays(-7))
+        self.cal_days = QSpinBox()
+        self.cal_days.setRange(7, 1095)
+        self.cal_days.setValue(365)
+        self.cal_days.setSuffix(" дн.")
+        range_h.addWidget(QLabel("С:"))
+        range_h.addWidget(self.cal_from)
+        range_h.addWidget(QLabel("Период:"))
+        range_h.addWidget(self.cal_days)
+        range_h.addStretch()
+        v.addLayout(range_h)
+
+        self.calendar = OccupancyCalendar(self.worker)
+        self.calendar.failed.connect(self.show_db_error)
+        # двойной клик по полосе — редактирование брони
+        self.calendar.booking_activated.connect(self.dialog_edit_booking)
+        v.addWidget(self.calendar, 1)
+
+        self.cal_from.dateChanged.connect(self.apply_calendar_range)
+        self.cal_days.valueChanged.connect(self.apply_calendar_range)
+        self.apply_calendar_range()
+        w.setLayout(v)
+        return w
 
+    def apply_calendar_range(self):
+        self.calendar.set_range(self.cal_from.date().toPyDate(), self.cal_days.value())
+
+    def go_calendar(self):
+        self.show_page("calendar")
+        self.calendar.reload()
+
+    def reload_calendar(self):
+        # скрытый календарь перечитается при переходе на страницу
+        if self.calendar is not None and self.stack.currentWidget() is self.pages.get("calendar"):
+            self.calendar.reload()
+
+    # -------- Статистика --------
+
+    def build_stats_page(self):
+        """Страница «Статистика» — загрузка, ADR и RevPAR."""
+        w = QWidget()
+        v = QVBoxLayout()
+        v.setContentsMargins(18, 18, 18, 18)
+        title = QLabel("Статистика")
+        title.setFont(TITLE_FONT)
+        v.addWidget(title)
+
+        ctrl_h = QHBoxLayout()
+        self.st_grain = QComboBox()
+        for text, grain in (("По дням", "day"), ("По неделям", "week"), ("По месяцам", "month")):
+            self.st_grain.addItem(text, grain)
+        self.st_grain.setCurrentIndex(2)
+        self.st_from = QDateEdit()
+        self.st_from.setDate(QDate.currentDate().addYears(-1))
+        self.st_to = QDateEdit()
+        self.st_to.setDate(QDate.currentDate())
+        self.st_category = QComboBox()
+        self.st_category.addItem("Все категории", None)
+        btn_show = QPushButton("Показать")
+        for wdg in (self.st_grain, QLabel("С:"), self.st_from, QLabel("По:"), self.st_to, self.st_category, btn_show):
+            ctrl_h.addWidget(wdg)
+        ctrl_h.addStretch()
+        v.addLayout(ctrl_h)
+
+        self.stats_period_model = RowsTableModel(
+            ["Период", "Загрузка, %", "ADR", "RevPAR", "Δ RevPAR", "Выручка"], parent=self
+        )
+        v.addWidget(self.make_table_view(self.stats_period_model), 2)
+        sub = QLabel("По категориям")
+        sub.setFont(SECTION_FONT)
+        v.addWidget(sub)
+        self.stats_category_model = RowsTableModel(
+            ["Категория", "Загрузка, %", "ADR", "RevPAR", "Доля выручки, %", "Выручка"], parent=self
+        )
+        v.addWidget(self.make_table_view(self.stats_category_model), 1)
+
+        btn_show.clicked.connect(self.reload_stats)
+        self.st_grain.currentIndexChanged.connect(self.reload_stats)
+        self.st_category.currentIndexChanged.connect(self.reload_stats)
+        w.setLayout(v)
+        return w
+
+    def go_stats(self):
+        self.show_page("stats")
+        self.worker.submit(
+            "stats_categories",
+            lambda: sorted(((t[0], t[1]) for t in refdata.types()), key=lambda t: t[1]),
+            on_done=self.fill_stats_categories,
+            on_error=self.show_db_error,
+        )
+        self.reload_stats()
+
+    def fill_stats_categories(self, rows):
+        selected = self.st_category.currentData()
+        self.st_category.blockSignals(True)
+        self.st_category.clear()
+        self.st_category.addItem("Все категории", None)
+        for type_id, name in rows:
+            self.st_category.addItem(name, type_id)
+            if type_id == selected:
+                self.st_category.setCurrentIndex(self.st_category.count() - 1)
+        self.st_category.blockSignals(False)
+
+    def reload_stats(self):
+        # дата «По» входит в период
+        self.worker.submit(
+            "stats",
+            stats.load_stats,
+            self.st_grain.currentData(),
+            self.st_from.date().toPyDate(),
+            self.st_to.date().addDays(1).toPyDate(),
+            self.st_category.currentData(),
+            on_done=self.apply_stats,
+            on_error=self.show_db_error,
+        )
 
+    def apply_stats(self, result):
+        by_period, by_category = result
+        self.stats_period_model.set_rows(by_period)
+        self.stats_category_model.set_rows(by_category)
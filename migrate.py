@@ -0,0 +1,241 @@
+"""Миграции схемы БД: файлы migrations/NNNN_название.py, применяются по номерам.
+
+Запуск из корня проекта:
+    python -m migrate status
+    python -m migrate up [--to 3]
+    python -m migrate new add_guest_email     # заготовка следующей миграции
+
+Миграция — модуль с функцией up(cur) и необязательным флагом TRANSACTION.
+По умолчанию up выполняется в одной транзакции вместе с записью номера в
+schema_version. С TRANSACTION = False курсор работает без транзакции (каждая
+команда фиксируется сразу) — так можно CREATE INDEX CONCURRENTLY и долгие
+заполнения пачками (create_index_concurrently, backfill ниже); такая
+миграция должна выдерживать повторный запуск после обрыва.
+
+При запуске приложение читает одну строку — max(version) — и применяет
+миграции, только если база отстала от файлов.
+"""
+import argparse
+import importlib.util
+import os
+import re
+import time
+
+import psycopg2.errors
+
+from db import db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+FILE_RE = re.compile(r"^(\d{4})_(\w+)\.py$")
+# ключ pg_advisory_lock: миграции применяет один процесс, остальные ждут
+LOCK_KEY = 0x67_6F_73_74
+BATCH = 5000
+
+VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMPTZ DEFAULT now()
+);
+"""
+
+TEMPLATE = '''"""{title}"""
+
+# False — без транзакции (CREATE INDEX CONCURRENTLY, заполнение пачками)
+TRANSACTION = True
+
+
+def up(cur):
+    cur.execute("")
+'''
+
+
+def discover():
+    """[(номер, название, путь)] файлов миграций по возрастанию номера."""
+    found = []
+    for fname in os.listdir(MIGRATIONS_DIR):
+        m = FILE_RE.match(fname)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, fname)))
+    found.sort()
+    for prev, cur in zip(found, found[1:]):
+        if prev[0] == cur[0]:
+            raise RuntimeError(f"две миграции с номером {cur[0]:04d}: {prev[1]} и {cur[1]}")
+    return found
+
+
+def latest_version():
+    found = discover()
+    return found[-1][0] if found else 0
+
+
+def current_version():
+    """Номер последней применённой миграции; 0 — база пуста или создана до миграций."""
+    try:
+        row = db.fetchone("SELECT max(version) FROM schema_version")
+    except psycopg2.errors.UndefinedTable:
+        return 0
+    return row[0] or 0
+
+
+def applied():
+    """{номер: время применения}."""
+    try:
+        return dict(db.fetchall("SELECT version, applied_at FROM schema_version"))
+    except psycopg2.errors.UndefinedTable:
+        return {}
+
+
+def load(version, name, path):
+    """Модуль миграции из файла (номер, название, путь — как в discover())."""
+    spec = importlib.util.spec_from_file_location(f"migrations.m{version:04d}_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def module(version):
+    """Модуль миграции по номеру — например, чтобы взять её DDL для бенчмарка."""
+    for found in discover():
+        if found[0] == version:
+            return load(*found)
+    raise LookupError(f"нет миграции {version:04d}")
+
+
+def _apply(conn, version, name, path, log):
+    module = load(version, name, path)
+    t0 = time.perf_counter()
+    record = "INSERT INTO schema_version(version, name) VALUES (%s, %s)"
+    if getattr(module, "TRANSACTION", True):
+        with db.transaction() as cur:
+            module.up(cur)
+            cur.execute(record, (version, name))
+    else:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                module.up(cur)
+                cur.execute(record, (version, name))
+        finally:
+            conn.autocommit = False
+    log(f"{version:04d} {name}: {time.perf_counter() - t0:.1f} c")
+
+
+def upgrade(target=None, log=print):
+    """Применяем недостающие миграции (до target включительно); возвращаем их число."""
+    with db.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+            cur.execute(VERSION_DDL)
+        conn.commit()
+        try:
+            # список берём под блокировкой: другой процесс мог успеть всё применить
+            done = applied()
+            todo = [
+                m for m in discover()
+                if m[0] not in done and (target is None or m[0] <= target)
+            ]
+            for version, name, path in todo:
+                _apply(conn, version, name, path, log)
+            return len(todo)
+        finally:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+            conn.commit()
+
+
+def ensure_current(log=print):
+    """Проверка при запуске: одна строка, миграции — только если база отстала."""
+    if current_version() >= latest_version():
+        return 0
+    return upgrade(log=log)
+
+
+# -------- помощники для миграций с TRANSACTION = False --------
+
+
+def create_index_concurrently(cur, name, definition):
+    """CREATE INDEX CONCURRENTLY name definition, который можно повторять.
+
+    definition — всё после имени: "ON guests USING gin (last_name gin_trgm_ops)".
+    Прерванная сборка оставляет невалидный индекс — его удаляем и строим заново.
+    """
+    cur.execute(
+        """
+        SELECT NOT i.indisvalid
+        FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace
+        """,
+        (name,),
+    )
+    row = cur.fetchone()
+    if row and row[0]:
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}")
+
+
+def backfill(cur, sql, params=None, batch=BATCH, pause=0.0, log=print):
+    """Выполняем sql, пока он меняет строки; возвращаем, сколько изменено всего.
+
+    sql сам выбирает очередную пачку по %(batch)s и не берёт уже обработанные
+    строки, например: UPDATE t SET x = ... WHERE id IN (SELECT id FROM t
+    WHERE x IS NULL LIMIT %(batch)s). Без транзакции каждая пачка фиксируется
+    сразу и держит блокировки недолго.
+    """
+    total = 0
+    while True:
+        cur.execute(sql, {**(params or {}), "batch": batch})
+        if cur.rowcount <= 0:
+            return total
+        total += cur.rowcount
+        log(f"  заполнено {total}")
+        if pause:
+            time.sleep(pause)
+
+
+def new(name):
+    """Создаём файл следующей миграции; возвращаем путь."""
+    if not re.fullmatch(r"\w+", name):
+        raise SystemExit("название — латиница, цифры и _")
+    path = os.path.join(MIGRATIONS_DIR, f"{latest_version() + 1:04d}_{name}.py")
+    with open(path, "x", encoding="utf-8") as f:
+        f.write(TEMPLATE.format(title=name.replace("_", " ")))
+    return path
+
+
+def print_status():
+    done = applied()
+    print(f"версия базы: {max(done, default=0)}, последняя миграция: {latest_version()}")
+    for version, name, _ in discover():
+        at = done.get(version)
+        state = f"применена {at:%d.%m.%Y %H:%M}" if at else "не применена"
+        print(f"  {version:04d} {name}: {state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="какие миграции применены")
+    up = sub.add_parser("up", help="применить недостающие миграции")
+    up.add_argument("--to", type=int, default=None, help="до этого номера включительно")
+    new_cmd = sub.add_parser("new", help="создать файл следующей миграции")
+    new_cmd.add_argument("name")
+    args = parser.parse_args()
+
+    if args.cmd == "new":
+        print(f"создан {new(args.name)}")
+        return
+
+    db.connect()
+    try:
+        if args.cmd == "up":
+            count = upgrade(args.to)
+            print(f"применено миграций: {count}" if count else "база в актуальном состоянии")
+        else:
+            print_status()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
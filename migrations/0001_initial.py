@@ -0,0 +1,400 @@
+"""Исходная схема: то, что раньше при каждом запуске выполнял DB.ensure_schema.
+
+Всё идемпотентно, поэтому на базе, созданной до появления миграций, миграция
+просто ничего не меняет и записывается как применённая.
+"""
+from crypto_utils import sha256_hash
+
+# DDL схемы в том виде, в каком её создавала эта версия. Миграция применена
+# на рабочих базах, поэтому этот файл не правится: изменения — новыми файлами.
+
+SCHEMA_DDL = """
+CREATE TABLE IF NOT EXISTS admins (
+    id SERIAL PRIMARY KEY,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS room_types (
+    id SERIAL PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    description TEXT,
+    base_price NUMERIC(10,2) DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rooms (
+    id SERIAL PRIMARY KEY,
+    number TEXT UNIQUE NOT NULL,
+    type_id INTEGER REFERENCES room_types(id) ON DELETE SET NULL,
+    floor INTEGER,
+    max_guests INTEGER DEFAULT 2,
+    status TEXT NOT NULL DEFAULT 'свободен',
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS guests (
+    id SERIAL PRIMARY KEY,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    phone TEXT,
+    email TEXT,
+    passport_encrypted BYTEA,
+    passport_iv BYTEA,
+    passport_key_id INTEGER,
+    discount NUMERIC(5,2) DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    id SERIAL PRIMARY KEY,
+    room_id INTEGER REFERENCES rooms(id) ON DELETE CASCADE,
+    guest_id INTEGER REFERENCES guests(id) ON DELETE CASCADE,
+    created_by INTEGER REFERENCES admins(id),
+    date_from DATE NOT NULL,
+    date_to DATE NOT NULL,
+    status TEXT NOT NULL DEFAULT 'active',
+    total_price NUMERIC(12,2) DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    stay DATERANGE GENERATED ALWAYS AS (daterange(date_from, date_to)) STORED
+);
+CREATE TABLE IF NOT EXISTS room_status_history (
+    id SERIAL PRIMARY KEY,
+    room_id INTEGER REFERENCES rooms(id),
+    old_status TEXT,
+    new_status TEXT,
+    changed_by INTEGER REFERENCES admins(id),
+    changed_at TIMESTAMPTZ DEFAULT now()
+);
+-- докуда дошла перешифровка паспортов на ключ key_id (см. rekey.py)
+CREATE TABLE IF NOT EXISTS key_rotation (
+    key_id INTEGER PRIMARY KEY,
+    last_guest_id INTEGER NOT NULL DEFAULT 0,
+    rows_done BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMPTZ DEFAULT now(),
+    finished_at TIMESTAMPTZ
+);
+"""
+
+
+# Индексы под горячие запросы и ограничение на пересечение броней
+# (GiST по номеру и интервалу проживания, нужен btree_gist).
+INDEXES_DDL = """
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+-- список броней и поиск по нему
+CREATE INDEX IF NOT EXISTS bookings_date_from_idx
+    ON bookings (date_from DESC, id DESC);
+CREATE INDEX IF NOT EXISTS bookings_status_date_from_idx
+    ON bookings (status, date_from DESC, id DESC);
+CREATE INDEX IF NOT EXISTS bookings_room_id_idx ON bookings (room_id);
+CREATE INDEX IF NOT EXISTS bookings_guest_id_idx ON bookings (guest_id);
+-- проверка пересечения дат для одного номера
+CREATE INDEX IF NOT EXISTS bookings_active_room_idx
+    ON bookings (room_id, date_from, date_to) WHERE status = 'active';
+-- последняя активная бронь гостя
+CREATE INDEX IF NOT EXISTS bookings_active_guest_idx
+    ON bookings (guest_id, id DESC) WHERE status = 'active';
+-- пересечения активных броней запрещает сама БД; индекс ограничения
+-- (GiST по room_id, stay) заодно обслуживает поиск свободных номеров
+DROP INDEX IF EXISTS bookings_active_stay_gist;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap') THEN
+        ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap
+            EXCLUDE USING gist (room_id WITH =, stay WITH &&) WHERE (status = 'active');
+    END IF;
+EXCEPTION WHEN exclusion_violation THEN
+    RAISE WARNING 'bookings_no_overlap не создано: в bookings уже есть пересекающиеся активные брони';
+END
+$$;
+-- гости по имени
+CREATE INDEX IF NOT EXISTS guests_name_idx ON guests (last_name, first_name);
+CREATE INDEX IF NOT EXISTS guests_first_name_lower_idx
+    ON guests (lower(first_name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS guests_last_name_lower_idx
+    ON guests (lower(last_name) text_pattern_ops);
+"""
+
+
+# Уведомления об изменениях номеров и броней в канал gost_changes
+# (db.NOTIFY_CHANNEL): другие рабочие места обновляют только изменённые строки.
+
+NOTIFY_DDL = """
+CREATE OR REPLACE FUNCTION gost_notify_room() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('gost_changes', json_build_object(
+        't', 'rooms',
+        'id', COALESCE(NEW.id, OLD.id)
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- у брони сообщаем и номера/гостей до и после изменения
+CREATE OR REPLACE FUNCTION gost_notify_booking() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('gost_changes', json_build_object(
+        't', 'bookings',
+        'id', COALESCE(NEW.id, OLD.id),
+        'rooms', json_build_array(NEW.room_id, OLD.room_id),
+        'guests', json_build_array(NEW.guest_id, OLD.guest_id)
+    )::text);
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS rooms_notify ON rooms;
+CREATE TRIGGER rooms_notify AFTER INSERT OR UPDATE OR DELETE ON rooms
+    FOR EACH ROW EXECUTE FUNCTION gost_notify_room();
+DROP TRIGGER IF EXISTS bookings_notify ON bookings;
+CREATE TRIGGER bookings_notify AFTER INSERT OR UPDATE OR DELETE ON bookings
+    FOR EACH ROW EXECUTE FUNCTION gost_notify_booking();
+"""
+
+
+# Занятость по номерам и дням: строка на (номер, день), если в этот день
+# номер продан. bookings — сколько броней приходится на день (активная может
+# совпасть с досрочно завершённой), revenue — сумма их цен за ночь. Таблицу
+# ведут триггеры на bookings; occupancy.py сверяет её с исходными бронями.
+OCCUPANCY_DDL = """
+CREATE TABLE IF NOT EXISTS daily_room_occupancy (
+    room_id INTEGER NOT NULL REFERENCES rooms(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    bookings INTEGER NOT NULL,
+    revenue NUMERIC NOT NULL,
+    PRIMARY KEY (room_id, day)
+);
+-- агрегаты по диапазону дат
+CREATE INDEX IF NOT EXISTS daily_room_occupancy_day_idx ON daily_room_occupancy (day);
+
+-- sign = 1: добавить ночи брони, -1: убрать
+CREATE OR REPLACE FUNCTION gost_occupancy_apply(b bookings, sign INTEGER) RETURNS void AS $$
+BEGIN
+    IF b.room_id IS NULL OR b.status NOT IN ('active', 'completed') OR b.date_to <= b.date_from THEN
+        RETURN;
+    END IF;
+    IF sign > 0 THEN
+        INSERT INTO daily_room_occupancy AS o (room_id, day, bookings, revenue)
+        SELECT b.room_id, d::date, 1, COALESCE(b.total_price, 0) / (b.date_to - b.date_from)
+        FROM generate_series(b.date_from, b.date_to - 1, interval '1 day') d
+        ON CONFLICT (room_id, day) DO UPDATE
+            SET bookings = o.bookings + 1, revenue = o.revenue + EXCLUDED.revenue;
+    ELSE
+        UPDATE daily_room_occupancy o
+        SET bookings = o.bookings - 1,
+            revenue = o.revenue - COALESCE(b.total_price, 0) / (b.date_to - b.date_from)
+        WHERE o.room_id = b.room_id AND o.day >= b.date_from AND o.day < b.date_to;
+        DELETE FROM daily_room_occupancy
+        WHERE room_id = b.room_id AND day >= b.date_from AND day < b.date_to AND bookings <= 0;
+    END IF;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION gost_occupancy_sync() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM gost_occupancy_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM gost_occupancy_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- пересчёт с нуля за [d_from, d_to); NULL — без границы
+CREATE OR REPLACE FUNCTION gost_occupancy_rebuild(d_from DATE, d_to DATE) RETURNS void AS $$
+BEGIN
+    DELETE FROM daily_room_occupancy
+    WHERE (d_from IS NULL OR day >= d_from) AND (d_to IS NULL OR day < d_to);
+    INSERT INTO daily_room_occupancy (room_id, day, bookings, revenue)
+    SELECT b.room_id, d::date, count(*), sum(COALESCE(b.total_price, 0) / (b.date_to - b.date_from))
+    FROM bookings b
+    CROSS JOIN LATERAL generate_series(
+        GREATEST(b.date_from, d_from), LEAST(b.date_to, d_to) - 1, interval '1 day'
+    ) d
+    WHERE b.room_id IS NOT NULL
+      AND b.status IN ('active', 'completed')
+      AND b.date_to > b.date_from
+      AND (d_from IS NULL OR b.date_to > d_from)
+      AND (d_to IS NULL OR b.date_from < d_to)
+    GROUP BY b.room_id, d::date;
+END
+$$ LANGUAGE plpgsql;
+
+-- меняются только поля, от которых зависит занятость
+DROP TRIGGER IF EXISTS bookings_occupancy ON bookings;
+CREATE TRIGGER bookings_occupancy
+    AFTER INSERT OR DELETE OR UPDATE OF room_id, date_from, date_to, status, total_price
+    ON bookings FOR EACH ROW EXECUTE FUNCTION gost_occupancy_sync();
+
+-- первое заполнение: триггер уже стоит, новые брони ждут конца транзакции
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM daily_room_occupancy) THEN
+        PERFORM gost_occupancy_rebuild(NULL, NULL);
+    END IF;
+END
+$$;
+"""
+
+
+# Статистика по дням и категориям для страницы «Статистика» (см. stats.py)
+# считается по daily_room_occupancy. Триггеры только помечают витрину
+# устаревшей, а пересчитывается она при открытии страницы, если нужно.
+# Комментарий витрины — версия её запроса: при смене запроса она пересоздаётся.
+STATS_DDL = """
+DO $$
+BEGIN
+    IF to_regclass('stats_daily') IS NULL
+       OR obj_description(to_regclass('stats_daily'), 'pg_class') IS DISTINCT FROM 'occupancy-v1' THEN
+        DROP MATERIALIZED VIEW IF EXISTS stats_daily;
+        CREATE MATERIALIZED VIEW stats_daily AS
+        WITH days AS (
+            SELECT d::date AS day
+            FROM generate_series(
+                (SELECT min(day) FROM daily_room_occupancy),
+                (SELECT max(day) FROM daily_room_occupancy),
+                interval '1 day'
+            ) d
+        ),
+        capacity AS (
+            SELECT type_id, count(*) AS rooms FROM rooms WHERE type_id IS NOT NULL GROUP BY type_id
+        ),
+        sold AS (
+            SELECT o.day, r.type_id, count(*) AS rooms_sold, sum(o.revenue) AS revenue
+            FROM daily_room_occupancy o
+            JOIN rooms r ON r.id = o.room_id
+            GROUP BY o.day, r.type_id
+        )
+        SELECT days.day,
+               c.type_id,
+               c.rooms AS rooms_available,
+               COALESCE(s.rooms_sold, 0) AS rooms_sold,
+               COALESCE(s.revenue, 0) AS revenue
+        FROM days
+        CROSS JOIN capacity c
+        LEFT JOIN sold s ON s.day = days.day AND s.type_id = c.type_id;
+        -- уникальный индекс нужен для REFRESH ... CONCURRENTLY
+        CREATE UNIQUE INDEX stats_daily_day_type_idx ON stats_daily (day, type_id);
+        COMMENT ON MATERIALIZED VIEW stats_daily IS 'occupancy-v1';
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS stats_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    dirty BOOLEAN NOT NULL DEFAULT false,
+    refreshed_at TIMESTAMPTZ
+);
+INSERT INTO stats_state(id) VALUES (true) ON CONFLICT DO NOTHING;
+
+-- WHERE NOT dirty: если витрина уже помечена, запись ничего не блокирует
+CREATE OR REPLACE FUNCTION gost_stats_dirty() RETURNS trigger AS $$
+BEGIN
+    UPDATE stats_state SET dirty = true WHERE NOT dirty;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bookings_stats_dirty ON bookings;
+CREATE TRIGGER bookings_stats_dirty AFTER INSERT OR UPDATE OR DELETE ON bookings
+    FOR EACH STATEMENT EXECUTE FUNCTION gost_stats_dirty();
+DROP TRIGGER IF EXISTS rooms_stats_dirty ON rooms;
+CREATE TRIGGER rooms_stats_dirty AFTER INSERT OR UPDATE OR DELETE ON rooms
+    FOR EACH STATEMENT EXECUTE FUNCTION gost_stats_dirty();
+"""
+
+
+# Правила цены (см. pricing.py). Пустые таблицы — цена как раньше:
+# цена категории × ночи − скидка гостя.
+PRICING_DDL = """
+-- сезон действует на ночи [date_from, date_to); сезон категории важнее общего
+CREATE TABLE IF NOT EXISTS price_seasons (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    date_from DATE NOT NULL,
+    date_to DATE NOT NULL,
+    type_id INTEGER REFERENCES room_types(id) ON DELETE CASCADE,
+    multiplier NUMERIC(6,4) NOT NULL DEFAULT 1 CHECK (multiplier >= 0),
+    CHECK (date_to > date_from)
+);
+-- 0 — понедельник; нет строки — множитель 1
+CREATE TABLE IF NOT EXISTS price_weekdays (
+    weekday SMALLINT PRIMARY KEY CHECK (weekday BETWEEN 0 AND 6),
+    multiplier NUMERIC(6,4) NOT NULL DEFAULT 1 CHECK (multiplier >= 0)
+);
+-- скидка за длительность: берётся ступень с наибольшим min_nights <= ночей
+CREATE TABLE IF NOT EXISTS price_stay_discounts (
+    min_nights INTEGER PRIMARY KEY CHECK (min_nights > 0),
+    percent NUMERIC(5,2) NOT NULL CHECK (percent BETWEEN 0 AND 100)
+);
+-- надбавка за загрузку категории в эту ночь, %
+CREATE TABLE IF NOT EXISTS price_occupancy_surcharges (
+    min_occupancy NUMERIC(5,2) PRIMARY KEY CHECK (min_occupancy BETWEEN 0 AND 100),
+    percent NUMERIC(6,2) NOT NULL CHECK (percent >= 0)
+);
+"""
+
+
+def up(cur):
+    cur.execute(SCHEMA_DDL)
+    # безопасно добавим недостающий столбец скидки (если база была создана ранее)
+    cur.execute("ALTER TABLE guests ADD COLUMN IF NOT EXISTS discount NUMERIC(5,2) DEFAULT 0;")
+    # версия ключа, которым зашифрован паспорт (NULL — исходный ключ)
+    cur.execute("ALTER TABLE guests ADD COLUMN IF NOT EXISTS passport_key_id INTEGER;")
+    # интервал проживания для ограничения на пересечение броней
+    cur.execute(
+        """
+        ALTER TABLE bookings ADD COLUMN IF NOT EXISTS stay DATERANGE
+            GENERATED ALWAYS AS (daterange(date_from, date_to)) STORED;
+        """
+    )
+    cur.execute(INDEXES_DDL)
+    cur.execute(NOTIFY_DDL)
+    cur.execute(OCCUPANCY_DDL)
+    cur.execute(STATS_DDL)
+    cur.execute(PRICING_DDL)
+    # Добавим дефолтного админа, если нет пользователей
+    cur.execute("SELECT COUNT(*) FROM admins")
+    cnt = cur.fetchone()[0]
+    if cnt == 0:
+        # дефолтный логин admin/admin (SHA256)
+        cur.execute(
+            "INSERT INTO admins(username, password_hash, first_name, last_name) VALUES (%s,%s,%s,%s)",
+            ("admin", sha256_hash("admin"), "Кирилл", "Кириллов")
+        )
+    # Добавим несколько категорий и номеров, если пусто (для начального макета)
+    cur.execute("SELECT COUNT(*) FROM room_types")
+    cnt_rt = cur.fetchone()[0]
+    if cnt_rt == 0:
+        cur.execute(
+            "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
+            ("Стандарт", "Базовая категория", 100)
+        )
+        cur.execute(
+            "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
+            ("Комфорт+", "С улучшенными условиями", 150)
+        )
+        cur.execute(
+            "INSERT INTO room_types(name, description, base_price) VALUES (%s,%s,%s)",
+            ("Люкс", "VIP", 250)
+        )
+    cur.execute("SELECT COUNT(*) FROM rooms")
+    cnt_rooms = cur.fetchone()[0]
+    if cnt_rooms == 0:
+        # добавим примеры
+        cur.execute(
+            "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
+            ("2-101", 1, 2, 'свободен')
+        )
+        cur.execute(
+            "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
+            ("2-102", 1, 2, 'уборка')
+        )
+        cur.execute(
+            "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
+            ("3-101", 2, 3, 'занят')
+        )
+        cur.execute(
+            "INSERT INTO rooms(number, type_id, floor, status) VALUES (%s,%s,%s,%s)",
+            ("4-101", 3, 4, 'бронь')
+        )
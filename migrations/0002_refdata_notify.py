@@ -0,0 +1,36 @@
+"""Уведомление refdata: изменились категории или номера (кроме статуса).
+
+По нему рабочие места сбрасывают кэш справочников (refdata.py). Статус номера
+меняется с каждой бронью и в справочник не входит, поэтому его смена
+уведомления refdata не вызывает. Полезная нагрузка одинаковая, так что на
+транзакцию приходит одно уведомление, сколько бы строк она ни изменила.
+"""
+
+
+def up(cur):
+    cur.execute(
+        """
+        CREATE OR REPLACE FUNCTION gost_notify_refdata() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('gost_changes', json_build_object('t', 'refdata')::text);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS room_types_refdata ON room_types;
+        CREATE TRIGGER room_types_refdata AFTER INSERT OR UPDATE OR DELETE ON room_types
+            FOR EACH ROW EXECUTE FUNCTION gost_notify_refdata();
+
+        DROP TRIGGER IF EXISTS rooms_refdata_insert_delete ON rooms;
+        CREATE TRIGGER rooms_refdata_insert_delete AFTER INSERT OR DELETE ON rooms
+            FOR EACH ROW EXECUTE FUNCTION gost_notify_refdata();
+        DROP TRIGGER IF EXISTS rooms_refdata_update ON rooms;
+        CREATE TRIGGER rooms_refdata_update AFTER UPDATE ON rooms
+            FOR EACH ROW
+            WHEN (
+                (OLD.number, OLD.type_id, OLD.floor, OLD.max_guests)
+                IS DISTINCT FROM (NEW.number, NEW.type_id, NEW.floor, NEW.max_guests)
+            )
+            EXECUTE FUNCTION gost_notify_refdata();
+        """
+    )
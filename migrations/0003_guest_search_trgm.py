@@ -0,0 +1,31 @@
+"""Поиск гостей по мере ввода: триграммный индекс на «фамилия имя телефон».
+
+Индекс GiST, а не GIN: он и отбирает строки по ILIKE, и отдаёт их сразу по
+возрастанию расстояния <<->, поэтому LIMIT читает только первые совпадения,
+а не сортирует все. Сигнатура 64 байта (siglen, PostgreSQL 13+) вместо 12 по
+умолчанию: в «фамилия имя телефон» около 30 триграмм, и короткая сигнатура
+почти вся в единицах — обход по расстоянию перебирал бы много ложных страниц.
+Строится CONCURRENTLY — запись в guests не блокируется.
+"""
+from migrate import create_index_concurrently
+
+TRANSACTION = False
+
+
+def up(cur):
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # одно выражение и в индексе, и в запросе (guest_picker.search_guests)
+    cur.execute(
+        """
+        CREATE OR REPLACE FUNCTION gost_guest_search_text(first_name TEXT, last_name TEXT, phone TEXT)
+        RETURNS TEXT LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+            SELECT last_name || ' ' || first_name || ' ' || coalesce(phone, '')
+        $$;
+        """
+    )
+    create_index_concurrently(
+        cur,
+        "guests_search_trgm_idx",
+        "ON guests USING gist "
+        "(gost_guest_search_text(first_name, last_name, phone) gist_trgm_ops(siglen=64))",
+    )
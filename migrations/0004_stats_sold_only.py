@@ -0,0 +1,88 @@
+"""Витрина stats_daily — только проданные номеро-ночи и выручка по дням,
+и досчитывается она по изменённым дням, а не целиком.
+
+Раньше витрина сама строила ряд дней от первой до последней продажи и
+умножала его на число номеров: дни без продаж вне этого ряда не попадали в
+знаменатель, и загрузка с RevPAR за малозагруженный период завышались.
+Доступные номеро-ночи теперь считает stats.py по запрошенному периоду.
+
+Материализованное представление Postgres умеет только полный REFRESH,
+поэтому витрина — обычная таблица (день × категория). Триггеры на
+daily_room_occupancy копят в stats_state диапазон дней, где менялись продажи
+(dirty_from..dirty_to включительно), а stats.refresh_stats пересчитывает
+строки только этих дней. Смена категории номера переносит его продажи между
+категориями — тогда помечаются все дни со свёрткой.
+"""
+
+
+def up(cur):
+    cur.execute(
+        """
+        DROP TRIGGER IF EXISTS bookings_stats_dirty ON bookings;
+        DROP TRIGGER IF EXISTS rooms_stats_dirty ON rooms;
+        DROP FUNCTION IF EXISTS gost_stats_dirty();
+        ALTER TABLE stats_state
+            DROP COLUMN IF EXISTS dirty,
+            ADD COLUMN IF NOT EXISTS dirty_from DATE,
+            ADD COLUMN IF NOT EXISTS dirty_to DATE;
+
+        DROP MATERIALIZED VIEW IF EXISTS stats_daily;
+        CREATE TABLE stats_daily (
+            day DATE NOT NULL,
+            type_id INTEGER NOT NULL,
+            rooms_sold INTEGER NOT NULL,
+            revenue NUMERIC NOT NULL,
+            PRIMARY KEY (day, type_id)
+        );
+        INSERT INTO stats_daily (day, type_id, rooms_sold, revenue)
+        SELECT o.day, r.type_id, count(*), sum(o.revenue)
+        FROM daily_room_occupancy o
+        JOIN rooms r ON r.id = o.room_id
+        WHERE r.type_id IS NOT NULL
+        GROUP BY o.day, r.type_id;
+        UPDATE stats_state SET dirty_from = NULL, dirty_to = NULL, refreshed_at = now();
+
+        -- расширяем диапазон; если он уже покрыт, строку не трогаем и не блокируем
+        CREATE OR REPLACE FUNCTION gost_stats_mark(lo DATE, hi DATE) RETURNS void AS $$
+            UPDATE stats_state
+            SET dirty_from = LEAST(dirty_from, lo), dirty_to = GREATEST(dirty_to, hi)
+            WHERE lo IS NOT NULL AND (dirty_from IS NULL OR lo < dirty_from OR hi > dirty_to);
+        $$ LANGUAGE sql;
+
+        -- день в свёртке — часть ключа и не меняется: UPDATE хватает старых строк
+        CREATE OR REPLACE FUNCTION gost_stats_occupancy_changed() RETURNS trigger AS $$
+        DECLARE
+            lo DATE;
+            hi DATE;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT min(day), max(day) INTO lo, hi FROM new_rows;
+            ELSE
+                SELECT min(day), max(day) INTO lo, hi FROM old_rows;
+            END IF;
+            PERFORM gost_stats_mark(lo, hi);
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION gost_stats_rooms_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM gost_stats_mark(min(day), max(day)) FROM daily_room_occupancy;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        -- таблицы переходов допускают одно событие на триггер
+        CREATE TRIGGER occupancy_stats_insert AFTER INSERT ON daily_room_occupancy
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION gost_stats_occupancy_changed();
+        CREATE TRIGGER occupancy_stats_update AFTER UPDATE ON daily_room_occupancy
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION gost_stats_occupancy_changed();
+        CREATE TRIGGER occupancy_stats_delete AFTER DELETE ON daily_room_occupancy
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION gost_stats_occupancy_changed();
+        CREATE TRIGGER rooms_stats_type AFTER UPDATE OF type_id ON rooms
+            FOR EACH STATEMENT EXECUTE FUNCTION gost_stats_rooms_changed();
+        """
+    )
@@ -0,0 +1,36 @@
+"""Ограничение bookings_no_overlap обязательно.
+
+0001 при пересекающихся активных бронях только предупреждала и шла дальше
+без ограничения, а проверок пересечения в диалогах больше нет — двойную
+бронь тогда ничто не остановит. Здесь такая база не мигрирует: ошибка
+перечисляет пары пересекающихся броней, их нужно исправить (отменить или
+перенести) и запустить миграцию снова.
+"""
+
+
+def up(cur):
+    cur.execute("SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap'")
+    if cur.fetchone():
+        return
+    cur.execute(
+        """
+        SELECT a.room_id, a.id, b.id
+        FROM bookings a
+        JOIN bookings b ON b.room_id = a.room_id AND b.id > a.id AND b.stay && a.stay
+        WHERE a.status = 'active' AND b.status = 'active'
+        ORDER BY a.room_id, a.id, b.id
+        """
+    )
+    conflicts = cur.fetchall()
+    if conflicts:
+        pairs = ", ".join(f"{a} и {b} (номер id {room})" for room, a, b in conflicts)
+        raise RuntimeError(
+            "Нельзя включить запрет пересечения броней: пересекаются активные брони "
+            f"{pairs}. Исправьте их и повторите миграцию."
+        )
+    cur.execute(
+        """
+        ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap
+            EXCLUDE USING gist (room_id WITH =, stay WITH &&) WHERE (status = 'active');
+        """
+    )
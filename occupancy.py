@@ -0,0 +1,140 @@
+"""Свёртка занятости daily_room_occupancy: строка на (номер, день) продажи.
+
+Таблицу ведут триггеры на bookings (migrations/0001_initial.py), поэтому любые
+изменения броней — из окон, импорта или других мест — попадают в неё сразу.
+
+Запуск из корня проекта:
+    python -m occupancy check [--from 2025-01-01] [--to 2026-01-01] [--fix]
+    python -m occupancy rebuild [--from ...] [--to ...]
+    python -m occupancy summary --from 2025-12-01 --to 2026-01-01
+"""
+import argparse
+from datetime import date
+
+from db import db
+import migrate
+
+# одно выражение со свёрткой: заняты ли ночи брони и цена за ночь
+EXPECTED_SQL = """
+    SELECT b.room_id, d::date AS day, count(*) AS bookings,
+           sum(COALESCE(b.total_price, 0) / (b.date_to - b.date_from)) AS revenue
+    FROM bookings b
+    CROSS JOIN LATERAL generate_series(
+        GREATEST(b.date_from, %(d_from)s::date), LEAST(b.date_to, %(d_to)s::date) - 1,
+        interval '1 day'
+    ) d
+    WHERE b.room_id IS NOT NULL
+      AND b.status IN ('active', 'completed')
+      AND b.date_to > b.date_from
+      AND (%(d_from)s::date IS NULL OR b.date_to > %(d_from)s::date)
+      AND (%(d_to)s::date IS NULL OR b.date_from < %(d_to)s::date)
+    GROUP BY b.room_id, d::date
+"""
+
+
+def check(d_from=None, d_to=None, limit=20):
+    """Сверяем свёртку с бронями в [d_from, d_to); возвращаем (число расхождений, примеры).
+
+    Пример — (номер, день, ожидаемо броней, в свёртке, ожидаемая выручка, в свёртке).
+    """
+    params = {"d_from": d_from, "d_to": d_to, "limit": limit}
+    with db.transaction() as cur:
+        # один снимок на обе стороны сравнения
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute(
+            f"""
+            WITH expected AS ({EXPECTED_SQL}),
+            actual AS (
+                SELECT room_id, day, bookings, revenue FROM daily_room_occupancy
+                WHERE (%(d_from)s::date IS NULL OR day >= %(d_from)s::date)
+                  AND (%(d_to)s::date IS NULL OR day < %(d_to)s::date)
+            ),
+            diff AS (
+                SELECT COALESCE(e.room_id, a.room_id) AS room_id,
+                       COALESCE(e.day, a.day) AS day,
+                       e.bookings AS exp_bookings, a.bookings AS act_bookings,
+                       e.revenue AS exp_revenue, a.revenue AS act_revenue
+                FROM expected e
+                FULL JOIN actual a ON a.room_id = e.room_id AND a.day = e.day
+                WHERE e.bookings IS DISTINCT FROM a.bookings
+                   OR e.revenue IS DISTINCT FROM a.revenue
+            )
+            SELECT count(*) OVER (), r.number, diff.day,
+                   diff.exp_bookings, diff.act_bookings, diff.exp_revenue, diff.act_revenue
+            FROM diff LEFT JOIN rooms r ON r.id = diff.room_id
+            ORDER BY diff.day, r.number
+            LIMIT %(limit)s
+            """,
+            params,
+        )
+        rows = cur.fetchall()
+    return (rows[0][0] if rows else 0), [row[1:] for row in rows]
+
+
+def rebuild(d_from=None, d_to=None):
+    """Пересчитываем свёртку за [d_from, d_to) по броням."""
+    with db.transaction() as cur:
+        # на время пересчёта брони не меняются, триггеры не пересекутся с ним
+        cur.execute("LOCK TABLE bookings IN SHARE MODE")
+        # изменённые дни для stats_daily пометят триггеры свёртки
+        cur.execute("SELECT gost_occupancy_rebuild(%s, %s)", (d_from, d_to))
+
+
+def summary(d_from, d_to, room_ids=None):
+    """По дням [d_from, d_to): (день, продано номеров, выручка)."""
+    return db.fetchall(
+        """
+        SELECT day, count(*), round(sum(revenue), 2)
+        FROM daily_room_occupancy
+        WHERE day >= %s AND day < %s
+          AND (%s::int[] IS NULL OR room_id = ANY(%s::int[]))
+        GROUP BY day
+        ORDER BY day
+        """,
+        (d_from, d_to, room_ids, room_ids),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name, help_text in (
+        ("check", "сверить свёртку с бронями"),
+        ("rebuild", "пересчитать свёртку"),
+        ("summary", "занятость и выручка по дням"),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("--from", dest="d_from", type=date.fromisoformat, required=name == "summary")
+        p.add_argument("--to", dest="d_to", type=date.fromisoformat, required=name == "summary")
+        if name == "check":
+            p.add_argument("--fix", action="store_true", help="пересчитать, если есть расхождения")
+    args = parser.parse_args()
+
+    db.connect()
+    try:
+        migrate.ensure_current()
+        if args.cmd == "summary":
+            for day, sold, revenue in summary(args.d_from, args.d_to):
+                print(f"{day:%d.%m.%Y}  продано {sold:4}  выручка {revenue}")
+        elif args.cmd == "rebuild":
+            rebuild(args.d_from, args.d_to)
+            print("свёртка пересчитана")
+        else:
+            count, sample = check(args.d_from, args.d_to)
+            if not count:
+                print("расхождений нет")
+                return
+            print(f"расхождений: {count}")
+            for number, day, exp_b, act_b, exp_r, act_r in sample:
+                print(f"  номер {number}, {day:%d.%m.%Y}: броней {exp_b} / {act_b}, выручка {exp_r} / {act_r}")
+            if args.fix:
+                rebuild(args.d_from, args.d_to)
+                print("свёртка пересчитана")
+            else:
+                raise SystemExit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
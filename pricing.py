@@ -0,0 +1,223 @@
+"""Расчёт стоимости проживания.
+
+Цена ночи = цена категории × сезон × день недели × (1 + надбавка за загрузку),
+сумма за проживание = сумма ночей − скидка за длительность − скидка гостя.
+Правила лежат в таблицах price_* (migrations/0001_initial.py), цены категорий —
+в кэше справочников refdata; пока правила пусты, цена считается как раньше:
+цена категории × ночи − скидка гостя.
+
+Деньги считаются в копейках целыми числами (int64): каждый коэффициент
+применяется с округлением половины вверх до копейки, как Decimal.quantize
+с ROUND_HALF_UP, поэтому результат точный и не зависит от порядка ночей.
+Цены ночей считаются сразу матрицей «ключ цены × дни» одним проходом NumPy,
+а суммы броней — разностью накопленных сумм по этой матрице.
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+from db import db
+from refdata import refdata
+
+# правила меняются редко и правятся прямо в БД — перечитываем раз в минуту
+RULES_TTL = 60.0
+# множители и проценты храним целыми: 1.0 = 10000, 1 % = 100
+ONE = 10000
+
+
+def _fixed(value, scale):
+    return int((Decimal(value or 0) * scale).to_integral_value(ROUND_HALF_UP))
+
+
+def _apply(amounts, factors):
+    """amounts × factors / ONE с округлением половины вверх (всё неотрицательно)."""
+    return (amounts * factors + ONE // 2) // ONE
+
+
+def _tier(thresholds, values, amounts):
+    """Ступень с наибольшим порогом <= value; 0, если ни одна не подошла."""
+    if not len(thresholds):
+        return np.zeros(np.shape(values), dtype=np.int64)
+    idx = np.searchsorted(thresholds, values, side="right") - 1
+    return np.where(idx >= 0, amounts[np.maximum(idx, 0)], 0)
+
+
+class Pricing:
+    """Правила цены с кэшем; invalidate() — перечитать при следующем расчёте."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rules = None
+        self._loaded_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._rules = None
+
+    def _load_rules(self):
+        with self._lock:
+            if self._rules is not None and time.monotonic() - self._loaded_at < RULES_TTL:
+                return self._rules
+        # общие сезоны раньше сезонов категории: при наложении побеждает последний
+        seasons = [
+            (d_from, d_to, type_id, _fixed(m, ONE))
+            for d_from, d_to, type_id, m in db.fetchall(
+                """
+                SELECT date_from, date_to, type_id, multiplier
+                FROM price_seasons ORDER BY type_id IS NOT NULL, id
+                """
+            )
+        ]
+        weekdays = np.full(7, ONE, dtype=np.int64)
+        for weekday, m in db.fetchall("SELECT weekday, multiplier FROM price_weekdays"):
+            weekdays[weekday] = _fixed(m, ONE)
+        stay = db.fetchall("SELECT min_nights, percent FROM price_stay_discounts ORDER BY min_nights")
+        occupancy = db.fetchall(
+            "SELECT min_occupancy, percent FROM price_occupancy_surcharges ORDER BY min_occupancy"
+        )
+        rules = {
+            "seasons": seasons,
+            "weekdays": weekdays,
+            "stay_nights": np.array([n for n, _ in stay], dtype=np.int64),
+            "stay_percent": np.array([_fixed(p, 100) for _, p in stay], dtype=np.int64),
+            "occupancy_min": np.array([_fixed(o, 100) for o, _ in occupancy], dtype=np.int64),
+            "occupancy_percent": np.array([_fixed(p, 100) for _, p in occupancy], dtype=np.int64),
+        }
+        with self._lock:
+            self._rules, self._loaded_at = rules, time.monotonic()
+        return rules
+
+    def _occupancy(self, type_ids, start, days, exclude_booking=None):
+        """Загрузка категорий по ночам, в сотых долях процента: {type_id: массив}."""
+        end = start + timedelta(days=days)
+        capacity = refdata.type_capacity(type_ids)
+        sold = {t: np.zeros(days, dtype=np.int64) for t in type_ids}
+        # бронь, которую пересчитываем, не должна поднимать цену сама себе
+        for type_id, offset, count in db.fetchall(
+            """
+            SELECT r.type_id, o.day - %(start)s, count(*)
+            FROM daily_room_occupancy o
+            JOIN rooms r ON r.id = o.room_id
+            LEFT JOIN bookings ex
+                   ON ex.id = %(exclude)s AND ex.status IN ('active', 'completed')
+                  AND ex.room_id = o.room_id AND o.day >= ex.date_from AND o.day < ex.date_to
+            WHERE o.day >= %(start)s AND o.day < %(end)s
+              AND r.type_id = ANY(%(types)s)
+              AND NOT (ex.id IS NOT NULL AND o.bookings = 1)
+            GROUP BY 1, 2
+            """,
+            {"start": start, "end": end, "types": type_ids, "exclude": exclude_booking},
+        ):
+            sold[type_id][offset] = count
+        return {t: sold[t] * ONE // capacity[t] if capacity.get(t) else sold[t] for t in type_ids}
+
+    def night_prices(self, keys, start, days, exclude_booking=None):
+        """Цены ночей в копейках: матрица len(keys) × days, начиная с ночи start.
+
+        keys — [(type_id, цена категории)]; по строке на ключ.
+        """
+        rules = self._load_rules()
+        base = np.array([_fixed(price, 100) for _, price in keys], dtype=np.int64)[:, None]
+        type_ids = np.array([-1 if t is None else t for t, _ in keys], dtype=np.int64)
+
+        season = np.full((len(keys), days), ONE, dtype=np.int64)
+        for d_from, d_to, type_id, multiplier in rules["seasons"]:
+            lo, hi = max((d_from - start).days, 0), min((d_to - start).days, days)
+            if lo < hi:
+                rows = slice(None) if type_id is None else type_ids == type_id
+                season[rows, lo:hi] = multiplier
+
+        weekday = rules["weekdays"][(np.arange(days) + start.weekday()) % 7]
+
+        night = _apply(base, season)
+        night = _apply(night, weekday[None, :])
+        if len(rules["occupancy_min"]):
+            known = sorted({int(t) for t in type_ids if t >= 0})
+            by_type = self._occupancy(known, start, days, exclude_booking)
+            load = np.zeros((len(keys), days), dtype=np.int64)
+            for i, t in enumerate(type_ids):
+                if t >= 0:
+                    load[i] = by_type[int(t)]
+            surcharge = _tier(rules["occupancy_min"], load, rules["occupancy_percent"])
+            night = _apply(night, ONE + surcharge)
+        return night
+
+    def price_stays(self, stays, exclude_booking=None, rooms=None):
+        """Суммы за проживание (Decimal, рубли) для [(room_id, заезд, выезд, скидка %)].
+
+        rooms — {room_id: (type_id, цена категории)}, если вызывающий их уже
+        прочитал, иначе берутся из справочника refdata. Как и раньше в окнах,
+        бронь короче ночи считается за одну ночь. Номер, которого нет в rooms
+        (удалённый или None), — ValueError.
+        """
+        if not stays:
+            return []
+        if rooms is None:
+            rooms = refdata.room_prices({s[0] for s in stays})
+        keys, key_index, rows = [], {}, []
+        for room_id, d_from, d_to, discount in stays:
+            # номер без категории стоит 0, как раньше; неизвестный — ошибка,
+            # а не бесплатная бронь
+            key = rooms.get(room_id)
+            if key is None:
+                raise ValueError(f"Номер {room_id} не найден")
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            rows.append((key_index[key], d_from, max(d_to, d_from + timedelta(days=1)), discount))
+
+        start = min(r[1] for r in rows)
+        days = (max(r[2] for r in rows) - start).days
+        night = self.night_prices(keys, start, days, exclude_booking)
+        cum = np.zeros((len(keys), days + 1), dtype=np.int64)
+        np.cumsum(night, axis=1, out=cum[:, 1:])
+
+        k = np.array([r[0] for r in rows], dtype=np.int64)
+        lo = np.array([(r[1] - start).days for r in rows], dtype=np.int64)
+        hi = np.array([(r[2] - start).days for r in rows], dtype=np.int64)
+        total = cum[k, hi] - cum[k, lo]
+
+        rules = self._load_rules()
+        total = _apply(total, ONE - _tier(rules["stay_nights"], hi - lo, rules["stay_percent"]))
+        guest = np.array([_fixed(r[3], 100) for r in rows], dtype=np.int64)
+        total = _apply(total, ONE - guest)
+        return [Decimal(int(t)).scaleb(-2) for t in total]
+
+    def quote(self, room_id, d_from, d_to, discount=0, exclude_booking=None):
+        """Сумма за одну бронь."""
+        return self.price_stays([(room_id, d_from, d_to, discount)], exclude_booking)[0]
+
+
+pricing = Pricing()
+
+
+def quote_free_rooms(d_from, d_to, guests=1, discount=0):
+    """Все номера, свободные на [d_from, d_to) и вмещающие guests, с суммой.
+
+    Один запрос за свободными номерами и один расчёт цены на все сразу.
+    Возвращаем [(room_id, номер, категория, мест, сумма)] по возрастанию суммы.
+    """
+    rooms = db.fetchall(
+        """
+        SELECT r.id, r.number, rt.name, r.max_guests, r.type_id, rt.base_price
+        FROM rooms r
+        LEFT JOIN room_types rt ON rt.id = r.type_id
+        WHERE COALESCE(r.max_guests, 0) >= %s
+          AND NOT EXISTS (
+              SELECT 1 FROM bookings b
+              WHERE b.room_id = r.id AND b.status = 'active'
+                AND b.stay && daterange(%s, %s)
+          )
+        """,
+        (guests, d_from, d_to),
+    )
+    totals = pricing.price_stays(
+        [(r[0], d_from, d_to, discount) for r in rooms],
+        rooms={r[0]: (r[4], r[5]) for r in rooms},
+    )
+    quotes = [(r[0], r[1], r[2], r[3], total) for r, total in zip(rooms, totals)]
+    quotes.sort(key=lambda q: (q[4], q[1]))
+    return quotes
@@ -4,6 +4,7 @@ from PyQt6.QtWidgets import QApplication, QMessageBox
 
 from db import db
 from login_window import LoginWindow
+import migrate
 
 
 def main() -> None:
@@ -11,10 +12,12 @@ def main() -> None:
 
     try:
         db.connect()
-        db.ensure_schema()
+        migrate.ensure_current()
     except Exception as e:
         QMessageBox.critical(None, "Ошибка БД", str(e))
         sys.exit(1)
+    # при выходе закрываем все соединения пула
+    app.aboutToQuit.connect(db.close)
 
     login = LoginWindow()
     login.show()
@@ -0,0 +1,80 @@
+import threading
+
+from db import db
+
+
+class RefData:
+    """Кэш справочников: категории номеров и сами номера (без статусов).
+
+    Они меняются редко, а нужны в каждом окне и расчёте цены, поэтому
+    держатся в памяти процесса. Как и в Availability, кэш с поколениями:
+    invalidate() после своей записи и по уведомлению refdata с других мест,
+    перечитывается при следующем обращении. Обращаться — из фоновых задач
+    (DbWorker), а не из GUI-потока: после invalidate() это запрос к БД.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._loaded = None  # номер поколения, для которого загружены данные
+        self._types = []  # (id, name, description, base_price) по id
+        self._rooms = []  # (id, number, type_id, floor, max_guests) по номеру
+        self._room_by_id = {}
+        self._type_by_id = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded == self._generation:
+                return
+            generation = self._generation
+        # может вызываться внутри чужой транзакции (расчёт цены при записи брони)
+        types = db.fetchall("SELECT id, name, description, base_price FROM room_types ORDER BY id")
+        rooms = db.fetchall("SELECT id, number, type_id, floor, max_guests FROM rooms ORDER BY number")
+        with self._lock:
+            self._types, self._rooms = types, rooms
+            self._type_by_id = {t[0]: t for t in types}
+            self._room_by_id = {r[0]: r for r in rooms}
+            # если пока читали, кто-то записал — при следующем обращении перечитаем
+            self._loaded = generation
+
+    def types(self):
+        """[(id, название, описание, цена)] по id."""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._types)
+
+    def rooms(self):
+        """[(id, номер, id категории, этаж, мест)] по номеру."""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._rooms)
+
+    def room_prices(self, room_ids):
+        """{room_id: (id категории, цена категории)}; удалённых номеров нет в ответе."""
+        self._ensure_loaded()
+        with self._lock:
+            prices = {}
+            for rid in room_ids:
+                room = self._room_by_id.get(rid)
+                if room is not None:
+                    t = self._type_by_id.get(room[2])
+                    prices[rid] = (room[2], t[3] if t else None)
+            return prices
+
+    def type_capacity(self, type_ids):
+        """{id категории: число номеров}."""
+        self._ensure_loaded()
+        wanted = set(type_ids)
+        with self._lock:
+            capacity = {}
+            for room in self._rooms:
+                if room[2] in wanted:
+                    capacity[room[2]] = capacity.get(room[2], 0) + 1
+            return capacity
+
+
+refdata = RefData()
@@ -0,0 +1,154 @@
+"""Ротация ключа шифрования паспортов без остановки приложения.
+
+Запуск из корня проекта:
+    python -m rekey new-key                     # создать следующую версию ключа
+    python -m rekey run [--batch 500] [--pause 0.05]
+    python -m rekey status
+
+Порядок ротации: new-key, разложить keys/ (или GOST_KEYRING) по всем рабочим
+местам и перезапустить их — новые паспорта пойдут новым ключом; затем run.
+run идёт по guests пачками в коротких транзакциях и после каждой пачки
+сохраняет позицию в key_rotation, поэтому его можно прервать и запустить снова.
+"""
+import argparse
+import time
+
+from psycopg2.extras import execute_values
+
+from crypto_utils import CURRENT_KEY_ID, LEGACY_KEY_ID, decrypt_many, encrypt_many, generate_key_file
+from db import db
+import migrate
+
+BATCH = 500
+# столько раз проходим таблицу заново ради строк, занятых другими при прошлом проходе
+MAX_PASSES = 3
+
+
+def reencrypt(batch=BATCH, pause=0.0, log=print):
+    """Перешифровываем все паспорта на CURRENT_KEY_ID; возвращаем число оставшихся."""
+    target = CURRENT_KEY_ID
+    db.execute(
+        "INSERT INTO key_rotation(key_id) VALUES (%s) ON CONFLICT (key_id) DO NOTHING",
+        (target,),
+    )
+    for _ in range(MAX_PASSES):
+        while True:
+            with db.transaction() as cur:
+                # блокировка строки прогресса не даст запустить два задания сразу
+                cur.execute(
+                    "SELECT last_guest_id, rows_done FROM key_rotation WHERE key_id=%s FOR UPDATE",
+                    (target,),
+                )
+                last_id, rows_done = cur.fetchone()
+                # строки, которые сейчас правит администратор, пропускаем — не ждём их
+                cur.execute(
+                    """
+                    SELECT id, passport_iv, passport_encrypted, passport_key_id
+                    FROM guests
+                    WHERE id > %s
+                      AND passport_encrypted IS NOT NULL
+                      AND COALESCE(passport_key_id, %s) <> %s
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                    """,
+                    (last_id, LEGACY_KEY_ID, target, batch),
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    break
+                plain = decrypt_many(
+                    [(key_id, bytes(iv), bytes(ct)) for _, iv, ct, key_id in rows]
+                )
+                fresh = encrypt_many(plain)
+                execute_values(
+                    cur,
+                    """
+                    UPDATE guests g
+                    SET passport_iv = v.iv, passport_encrypted = v.ct, passport_key_id = v.key_id
+                    FROM (VALUES %s) AS v(id, key_id, iv, ct)
+                    WHERE g.id = v.id
+                    """,
+                    [(r[0], key_id, nonce, ct) for r, (key_id, nonce, ct) in zip(rows, fresh)],
+                )
+                last_id = rows[-1][0]
+                rows_done += len(rows)
+                cur.execute(
+                    "UPDATE key_rotation SET last_guest_id=%s, rows_done=%s WHERE key_id=%s",
+                    (last_id, rows_done, target),
+                )
+            log(f"ключ {target}: перешифровано {rows_done}, последний гость {last_id}")
+            if pause:
+                time.sleep(pause)
+
+        left = remaining(target)
+        if not left:
+            db.execute(
+                "UPDATE key_rotation SET finished_at=now() WHERE key_id=%s", (target,)
+            )
+            log(f"ключ {target}: готово")
+            return 0
+        # пропущенные строки были заняты — проходим таблицу ещё раз
+        log(f"ключ {target}: осталось {left}, новый проход")
+        db.execute("UPDATE key_rotation SET last_guest_id=0 WHERE key_id=%s", (target,))
+    return remaining(target)
+
+
+def remaining(key_id=CURRENT_KEY_ID):
+    return db.fetchone(
+        """
+        SELECT count(*) FROM guests
+        WHERE passport_encrypted IS NOT NULL AND COALESCE(passport_key_id, %s) <> %s
+        """,
+        (LEGACY_KEY_ID, key_id),
+    )[0]
+
+
+def print_status():
+    print(f"текущий ключ: {CURRENT_KEY_ID}")
+    for key_id, cnt in db.fetchall(
+        """
+        SELECT COALESCE(passport_key_id, %s), count(*)
+        FROM guests WHERE passport_encrypted IS NOT NULL
+        GROUP BY 1 ORDER BY 1
+        """,
+        (LEGACY_KEY_ID,),
+    ):
+        print(f"  ключ {key_id}: {cnt} паспортов")
+    for key_id, last_id, done, started, finished in db.fetchall(
+        "SELECT key_id, last_guest_id, rows_done, started_at, finished_at FROM key_rotation ORDER BY key_id"
+    ):
+        state = f"завершена {finished:%d.%m.%Y %H:%M}" if finished else f"остановлена на госте {last_id}"
+        print(f"  ротация на ключ {key_id}: {done} строк, {state}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("new-key", help="создать следующую версию ключа")
+    run = sub.add_parser("run", help="перешифровать паспорта текущим ключом")
+    run.add_argument("--batch", type=int, default=BATCH)
+    run.add_argument("--pause", type=float, default=0.0, help="пауза между пачками, с")
+    sub.add_parser("status", help="сколько паспортов на каком ключе")
+    args = parser.parse_args()
+
+    if args.cmd == "new-key":
+        key_id = generate_key_file()
+        print(f"создан ключ {key_id}; разложите его по рабочим местам, перезапустите их и выполните run")
+        return
+
+    db.connect()
+    try:
+        migrate.ensure_current()
+        if args.cmd == "run":
+            left = reencrypt(args.batch, args.pause)
+            if left:
+                raise SystemExit(f"не перешифровано {left} строк — запустите run ещё раз")
+        else:
+            print_status()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
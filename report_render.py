@@ -0,0 +1,262 @@
+"""Отрисовка отчёта по гостю: DOCX по шаблону, а также PDF, HTML и CSV.
+
+Модуль не трогает ни БД, ни ключи: получает готовые данные и возвращает байты
+файла, поэтому его можно запускать в дочерних процессах.
+
+Данные отчёта — словарь:
+    id, first_name, last_name, passport, phone, email, created_at,
+    bookings: [(номер, заезд, выезд, статус, сумма), ...]
+
+DOCX строится из шаблона: файла GOST_REPORT_TEMPLATE, если он задан, иначе
+стандартного, который собирается в памяти (на диск ничего не пишется). В тексте
+шаблона стоят поля {{first_name}}, {{passport}} и т. п.; абзац, все поля которого
+пусты, удаляется. Строка таблицы с полями {{booking.room}}, {{booking.date_from}},
+{{booking.date_to}}, {{booking.status}}, {{booking.price}} — образец: её XML
+копируется на каждую бронь. При отсутствии броней таблица убирается, а поле
+{{bookings_note}} получает текст «Нет данных о бронированиях.».
+"""
+import copy
+import csv
+import html
+import io
+import multiprocessing.util
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+
+# читаем окружение здесь, а не в config: модуль грузится в дочерних процессах
+TEMPLATE_PATH = os.getenv("GOST_REPORT_TEMPLATE")
+FORMATS = ("docx", "pdf", "html", "csv")
+
+BOOKING_FIELDS = ("room", "date_from", "date_to", "status", "price")
+BOOKING_HEADERS = ("Номер", "Заезд", "Выезд", "Статус", "Сумма")
+PLACEHOLDER = re.compile(r"\{\{\s*([\w.]+)\s*\}\}")
+
+# шаблон читается (или собирается) один раз на процесс
+_template = None
+# профиль LibreOffice этого процесса (TemporaryDirectory)
+_lo_profile = None
+
+
+def report_filename(data, stamp=None, fmt="docx"):
+    stamp = stamp or datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"guest_report_{data['id']}_{stamp}.{fmt}"
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def guest_values(data):
+    return {
+        "first_name": _text(data["first_name"]),
+        "last_name": _text(data["last_name"]),
+        "passport": _text(data["passport"]),
+        "phone": _text(data["phone"]),
+        "email": _text(data["email"]),
+        "created_at": _text(data["created_at"]),
+        "bookings_note": "" if data["bookings"] else "Нет данных о бронированиях.",
+    }
+
+
+def booking_values(booking):
+    return {f"booking.{k}": _text(v) for k, v in zip(BOOKING_FIELDS, booking)}
+
+
+# -------- DOCX --------
+
+
+def _default_template() -> bytes:
+    """Стандартный шаблон — тот же вид, что был у отчёта до шаблонов."""
+    from docx import Document
+    from docx.shared import Pt
+
+    doc = Document()
+    doc.add_heading("Отчёт о проживании гостя", level=1)
+    doc.add_paragraph("ФИО: {{first_name}} {{last_name}}")
+    doc.add_paragraph("Паспорт: {{passport}}")
+    doc.add_paragraph("Телефон: {{phone}}")
+    doc.add_paragraph("E-mail: {{email}}")
+    doc.add_paragraph("Заведён в системе: {{created_at}}")
+    doc.add_paragraph("")
+    doc.add_heading("Бронирования", level=2)
+    doc.add_paragraph("{{bookings_note}}")
+    table = doc.add_table(rows=2, cols=len(BOOKING_FIELDS))
+    for cell, text in zip(table.rows[0].cells, BOOKING_HEADERS):
+        cell.text = text
+    for cell, field in zip(table.rows[1].cells, BOOKING_FIELDS):
+        cell.text = "{{booking.%s}}" % field
+    doc.add_paragraph("")
+    footer = doc.add_paragraph('ООО "ГостиТут"')
+    footer.runs[0].font.size = Pt(10)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def load_template() -> bytes:
+    global _template
+    if _template is None:
+        if TEMPLATE_PATH:
+            with open(TEMPLATE_PATH, "rb") as f:
+                _template = f.read()
+        else:
+            _template = _default_template()
+    return _template
+
+
+def _fill_paragraph(p, values, w_t, drop_empty=True):
+    """Подставляем поля в абзац; True — абзац надо удалить (все поля пусты)."""
+    nodes = list(p.iter(w_t))
+    text = "".join(t.text or "" for t in nodes)
+    if "{{" not in text:
+        return False
+    keys = PLACEHOLDER.findall(text)
+    if drop_empty and keys and not any(values.get(k) for k in keys):
+        return True
+    # поле могло разбиться на несколько кусков текста — собираем в первый
+    nodes[0].text = PLACEHOLDER.sub(lambda m: values.get(m.group(1), ""), text)
+    for t in nodes[1:]:
+        t.text = ""
+    return False
+
+
+def render_docx(data) -> bytes:
+    from docx import Document
+    from docx.oxml.ns import qn
+
+    w_p, w_t, w_tr = qn("w:p"), qn("w:t"), qn("w:tr")
+    doc = Document(io.BytesIO(load_template()))
+    body = doc.element.body
+
+    # Строка-образец: копируем её XML на каждую бронь, без table.add_row()
+    proto = next(
+        (
+            tr
+            for tr in body.iter(w_tr)
+            if "{{booking." in "".join(t.text or "" for t in tr.iter(w_t))
+        ),
+        None,
+    )
+    if proto is not None:
+        if data["bookings"]:
+            for booking in data["bookings"]:
+                values = booking_values(booking)
+                tr = copy.deepcopy(proto)
+                for p in tr.iter(w_p):
+                    _fill_paragraph(p, values, w_t, drop_empty=False)
+                proto.addprevious(tr)
+            proto.getparent().remove(proto)
+        else:
+            table = proto.getparent()
+            table.getparent().remove(table)
+
+    values = guest_values(data)
+    for p in list(body.iter(w_p)):
+        if _fill_paragraph(p, values, w_t):
+            p.getparent().remove(p)
+
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+# -------- PDF, HTML, CSV --------
+
+
+def _profile_uri():
+    """Свой профиль LibreOffice на процесс: параллельные soffice не делят
+    блокировку, а следующие PDF не создают профиль заново. Каталог удаляется
+    при выходе процесса."""
+    global _lo_profile
+    if _lo_profile is None:
+        _lo_profile = tempfile.TemporaryDirectory(prefix="gost_lo_")
+        # воркеры пула процессов выходят без atexit — чистим и через multiprocessing
+        multiprocessing.util.Finalize(None, _lo_profile.cleanup, exitpriority=0)
+    return "file://" + _lo_profile.name
+
+
+def render_pdf(data) -> bytes:
+    """PDF — тот же DOCX, сконвертированный LibreOffice, чтобы вид совпадал."""
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+    if soffice is None:
+        raise RuntimeError("Для PDF нужен LibreOffice (soffice) в PATH")
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "report.docx")
+        with open(src, "wb") as f:
+            f.write(render_docx(data))
+        subprocess.run(
+            [
+                soffice,
+                f"-env:UserInstallation={_profile_uri()}",
+                "--headless",
+                "--convert-to",
+                "pdf",
+                "--outdir",
+                tmp,
+                src,
+            ],
+            check=True,
+            capture_output=True,
+            timeout=120,
+        )
+        with open(os.path.join(tmp, "report.pdf"), "rb") as f:
+            return f.read()
+
+
+def render_html(data) -> bytes:
+    v = {k: html.escape(s) for k, s in guest_values(data).items()}
+    lines = [
+        "<!DOCTYPE html>",
+        '<html lang="ru"><head><meta charset="utf-8">',
+        f"<title>Отчёт о проживании гостя {v['last_name']}</title></head><body>",
+        "<h1>Отчёт о проживании гостя</h1>",
+        f"<p>ФИО: {v['first_name']} {v['last_name']}</p>",
+        f"<p>Паспорт: {v['passport']}</p>",
+    ]
+    for label, key in (("Телефон", "phone"), ("E-mail", "email"), ("Заведён в системе", "created_at")):
+        if v[key]:
+            lines.append(f"<p>{label}: {v[key]}</p>")
+    lines.append("<h2>Бронирования</h2>")
+    if data["bookings"]:
+        lines.append("<table border=\"1\" cellspacing=\"0\" cellpadding=\"4\">")
+        lines.append("<tr>" + "".join(f"<th>{h}</th>" for h in BOOKING_HEADERS) + "</tr>")
+        for booking in data["bookings"]:
+            lines.append(
+                "<tr>" + "".join(f"<td>{html.escape(_text(c))}</td>" for c in booking) + "</tr>"
+            )
+        lines.append("</table>")
+    else:
+        lines.append(f"<p>{v['bookings_note']}</p>")
+    lines.append('<p><small>ООО "ГостиТут"</small></p></body></html>')
+    return "\n".join(lines).encode("utf-8")
+
+
+def render_csv(data) -> bytes:
+    """Одна строка на бронь, данные гостя повторяются (без броней — одна строка)."""
+    buf = io.StringIO()
+    w = csv.writer(buf, delimiter=";")
+    w.writerow(["id", "first_name", "last_name", "passport", "phone", "email", *BOOKING_FIELDS])
+    guest = [
+        data["id"],
+        _text(data["first_name"]),
+        _text(data["last_name"]),
+        _text(data["passport"]),
+        _text(data["phone"]),
+        _text(data["email"]),
+    ]
+    for booking in data["bookings"] or [("",) * len(BOOKING_FIELDS)]:
+        w.writerow(guest + [_text(c) for c in booking])
+    # BOM, чтобы Excel узнал UTF-8
+    return buf.getvalue().encode("utf-8-sig")
+
+
+RENDERERS = {"docx": render_docx, "pdf": render_pdf, "html": render_html, "csv": render_csv}
+
+
+def render_report(data, stamp=None, fmt="docx"):
+    """(имя файла, содержимое) — единица работы для пула процессов."""
+    return report_filename(data, stamp, fmt), RENDERERS[fmt](data)
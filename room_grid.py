@@ -0,0 +1,209 @@
+from itertools import groupby
+
+from PyQt6.QtCore import Qt, QRect
+from PyQt6.QtGui import QColor, QPainter, QPen
+from PyQt6.QtWidgets import QAbstractScrollArea, QFrame
+
+from config import (
+    COLOR_FREE,
+    COLOR_CLEANING,
+    COLOR_OCCUPIED,
+    COLOR_BOOKED,
+    SECTION_FONT,
+    ROOM_FONT,
+)
+
+# Размеры, px
+TILE_H = 48
+TILE_GAP = 6
+PAD = 8  # отступ плиток от края колонки
+COL_GAP = 18
+COL_MIN_W = 120
+HEADER_H = 28  # строка с названиями категорий
+MIN_COL_H = 320
+STEP = TILE_H + TILE_GAP
+
+STATUS_COLORS = {
+    "свободен": QColor(COLOR_FREE),
+    "уборка": QColor(COLOR_CLEANING),
+    "занят": QColor(COLOR_OCCUPIED),
+    "бронь": QColor(COLOR_BOOKED),
+}
+COLOR_UNKNOWN = QColor(COLOR_FREE)
+SELECTED_PEN = QPen(QColor("#333"), 2)
+
+
+class RoomGrid(QAbstractScrollArea):
+    """Плитки номеров на главной: колонка на категорию, всё рисуется одним виджетом.
+
+    Плитки не виджеты, а прямоугольники, которые считаются по позиции номера
+    в колонке: рисуются только попавшие во viewport, клик определяется по
+    координатам. Смена статуса перерисовывает одну плитку.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = []  # (id категории, название, [room_id, ...])
+        self.rooms = {}  # room_id -> [номер, статус, id категории]
+        self.positions = {}  # room_id -> (колонка, строка)
+        self.selected = None
+        self.setFrameShape(QFrame.Shape.NoFrame)
+        self.setMinimumHeight(HEADER_H + MIN_COL_H)
+        self.viewport().setFont(ROOM_FONT)
+
+    # -------- данные --------
+
+    def set_rooms(self, rows):
+        """rows — (id категории, название, номер, статус, id номера), по категории и номеру."""
+        self.columns = [
+            (cat_id, cat_name, [r[4] for r in rooms])
+            for (cat_id, cat_name), rooms in groupby(rows, key=lambda r: (r[0], r[1]))
+        ]
+        self.rooms = {r[4]: [r[2], r[3], r[0]] for r in rows}
+        self.positions = {
+            rid: (col, row)
+            for col, (_, _, room_ids) in enumerate(self.columns)
+            for row, rid in enumerate(room_ids)
+        }
+        if self.selected not in self.rooms:
+            self.selected = None
+        self._update_scrollbars()
+        self.viewport().update()
+
+    def patch(self, room_ids, rows):
+        """Обновляем номера room_ids по rows; False — состав колонок поменялся, нужен set_rooms."""
+        found = {r[4]: r for r in rows}
+        for rid in room_ids:
+            row, room = found.get(rid), self.rooms.get(rid)
+            if row is None and room is None:
+                continue
+            if row is None or room is None or room[2] != row[0]:
+                return False
+        for rid in room_ids:
+            row = found.get(rid)
+            if row is not None and self.rooms[rid][:2] != [row[2], row[3]]:
+                self.rooms[rid][:2] = [row[2], row[3]]
+                self._update_room(rid)
+        return True
+
+    def set_status(self, room_id, status):
+        room = self.rooms.get(room_id)
+        if room is not None and room[1] != status:
+            room[1] = status
+            self._update_room(room_id)
+
+    def selected_room(self):
+        """(id номера, статус) выбранной плитки или None."""
+        if self.selected is None:
+            return None
+        return self.selected, self.rooms[self.selected][1]
+
+    # -------- геометрия --------
+
+    def _col_width(self):
+        n = max(1, len(self.columns))
+        return max(COL_MIN_W, (self.viewport().width() - (n - 1) * COL_GAP) // n)
+
+    def tile_rect(self, col, row):
+        """Прямоугольник плитки в координатах viewport."""
+        col_w = self._col_width()
+        x = col * (col_w + COL_GAP) + PAD - self.horizontalScrollBar().value()
+        y = HEADER_H + PAD + row * STEP - self.verticalScrollBar().value()
+        return QRect(x, y, col_w - 2 * PAD, TILE_H)
+
+    def room_at(self, pos):
+        """id номера под точкой viewport или None."""
+        if pos.y() < HEADER_H:
+            return None
+        col_w = self._col_width()
+        col, dx = divmod(pos.x() + self.horizontalScrollBar().value(), col_w + COL_GAP)
+        if col >= len(self.columns) or not PAD <= dx < col_w - PAD:
+            return None
+        y = pos.y() - HEADER_H - PAD + self.verticalScrollBar().value()
+        row, dy = divmod(y, STEP)
+        room_ids = self.columns[col][2]
+        if y < 0 or dy >= TILE_H or row >= len(room_ids):
+            return None
+        return room_ids[row]
+
+    def _update_room(self, room_id):
+        pos = self.positions.get(room_id)
+        if pos is not None:
+            self.viewport().update(self.tile_rect(*pos).adjusted(-2, -2, 2, 2))
+
+    def _update_scrollbars(self):
+        vp = self.viewport()
+        n = len(self.columns)
+        width = n * self._col_width() + max(0, n - 1) * COL_GAP
+        most = max((len(c[2]) for c in self.columns), default=0)
+        height = 2 * PAD + most * STEP
+        page_h = max(0, vp.height() - HEADER_H)
+        hbar, vbar = self.horizontalScrollBar(), self.verticalScrollBar()
+        hbar.setRange(0, max(0, width - vp.width()))
+        hbar.setPageStep(vp.width())
+        vbar.setRange(0, max(0, height - page_h))
+        vbar.setPageStep(page_h)
+        vbar.setSingleStep(STEP)
+
+    # -------- события и отрисовка --------
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_scrollbars()
+
+    def scrollContentsBy(self, dx, dy):
+        # всё рисуется заново из данных, сдвигать пиксели не нужно
+        self.viewport().update()
+
+    def mousePressEvent(self, event):
+        rid = self.room_at(event.position().toPoint())
+        if rid is not None and rid != self.selected:
+            previous, self.selected = self.selected, rid
+            if previous is not None:
+                self._update_room(previous)
+            self._update_room(rid)
+        super().mousePressEvent(event)
+
+    def paintEvent(self, event):
+        p = QPainter(self.viewport())
+        p.setRenderHint(QPainter.RenderHint.Antialiasing)
+        vp = self.viewport().rect()
+        x0 = self.horizontalScrollBar().value()
+        y0 = self.verticalScrollBar().value()
+        col_w = self._col_width()
+        p.fillRect(vp, self.palette().window())
+
+        # видимые строки плиток — одни и те же для всех колонок
+        row0 = max(0, (y0 - PAD) // STEP)
+        row1 = (y0 + vp.height() - HEADER_H) // STEP + 1
+        for col, (_, cat_name, room_ids) in enumerate(self.columns):
+            x = col * (col_w + COL_GAP) - x0
+            if x + col_w < 0 or x > vp.width():
+                continue
+            body = QRect(x, HEADER_H, col_w, vp.height() - HEADER_H)
+            p.setPen(Qt.PenStyle.NoPen)
+            p.setBrush(Qt.GlobalColor.white)
+            p.drawRoundedRect(body, 8, 8)
+
+            p.save()
+            p.setClipRect(body)
+            for row in range(row0, min(row1, len(room_ids))):
+                rid = room_ids[row]
+                number, status, _ = self.rooms[rid]
+                rect = self.tile_rect(col, row)
+                p.setBrush(STATUS_COLORS.get(status, COLOR_UNKNOWN))
+                if rid == self.selected:
+                    p.setPen(SELECTED_PEN)
+                    p.drawRoundedRect(rect.adjusted(1, 1, -1, -1), 8, 8)
+                else:
+                    p.setPen(Qt.PenStyle.NoPen)
+                    p.drawRoundedRect(rect, 8, 8)
+                p.setPen(Qt.GlobalColor.black)
+                p.drawText(rect, Qt.AlignmentFlag.AlignCenter, str(number))
+            p.restore()
+
+            p.setFont(SECTION_FONT)
+            p.setPen(self.palette().windowText().color())
+            p.drawText(QRect(x, 0, col_w, HEADER_H), Qt.AlignmentFlag.AlignCenter, cat_name)
+            p.setFont(ROOM_FONT)
+        p.end()
@@ -0,0 +1,150 @@
+"""Показатели для страницы «Статистика»: загрузка, ADR и RevPAR.
+
+Всё считается в Postgres; в Python приходят только готовые строки по
+периодам. Проданные номеро-ночи и выручку даёт витрина stats_daily (день ×
+категория, по свёртке daily_room_occupancy; пересчитываются только изменённые
+дни — migrations/0004_stats_sold_only.py), а доступные — каждый день
+запрошенного периода × число номеров категории, с продажами или без.
+    загрузка = проданные номеро-ночи / доступные номеро-ночи
+    ADR      = выручка / проданные номеро-ночи
+    RevPAR   = выручка / доступные номеро-ночи
+"""
+from db import db
+
+GRAINS = ("day", "week", "month")
+
+# день периода × категория: доступно, продано, выручка (дни без продаж — нули)
+GRID_SQL = """
+    SELECT d::date AS day, c.type_id, c.rooms AS available,
+           COALESCE(s.rooms_sold, 0) AS sold, COALESCE(s.revenue, 0) AS revenue
+    FROM generate_series(%(d_from)s::date, %(d_to)s::date - 1, interval '1 day') d
+    CROSS JOIN (
+        SELECT type_id, count(*) AS rooms
+        FROM rooms
+        WHERE type_id IS NOT NULL
+          AND (%(type_id)s::int IS NULL OR type_id = %(type_id)s::int)
+        GROUP BY type_id
+    ) c
+    LEFT JOIN stats_daily s ON s.day = d::date AND s.type_id = c.type_id
+"""
+
+
+# ключ pg_advisory_xact_lock: одни и те же дни пересчитывает один процесс
+REFRESH_LOCK_KEY = 0x73_74_61_74
+
+
+def refresh_stats(force=False):
+    """Пересчитываем строки витрины за дни, где с прошлого раза менялись продажи.
+
+    Диапазон дней копят триггеры свёртки в stats_state; force — все дни.
+    Читатели страницы не блокируются: до конца транзакции они видят прежние строки.
+    """
+    # диапазон забираем отдельной короткой транзакцией: изменения, пришедшие во
+    # время пересчёта, пометят дни заново, и следующий пересчёт их подхватит
+    with db.transaction() as cur:
+        cur.execute("SELECT dirty_from, dirty_to FROM stats_state FOR UPDATE")
+        claimed = cur.fetchone()
+        if claimed[0] is None and not force:
+            return False
+        lo, hi = (None, None) if force else claimed
+        cur.execute("UPDATE stats_state SET dirty_from = NULL, dirty_to = NULL")
+    # None — без границы
+    days = {"lo": lo, "hi": hi}
+    try:
+        with db.transaction() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+            cur.execute(
+                """
+                DELETE FROM stats_daily
+                WHERE (%(lo)s::date IS NULL OR day >= %(lo)s::date)
+                  AND (%(hi)s::date IS NULL OR day <= %(hi)s::date)
+                """,
+                days,
+            )
+            cur.execute(
+                """
+                INSERT INTO stats_daily (day, type_id, rooms_sold, revenue)
+                SELECT o.day, r.type_id, count(*), sum(o.revenue)
+                FROM daily_room_occupancy o
+                JOIN rooms r ON r.id = o.room_id
+                WHERE r.type_id IS NOT NULL
+                  AND (%(lo)s::date IS NULL OR o.day >= %(lo)s::date)
+                  AND (%(hi)s::date IS NULL OR o.day <= %(hi)s::date)
+                GROUP BY o.day, r.type_id
+                """,
+                days,
+            )
+            cur.execute("UPDATE stats_state SET refreshed_at = now()")
+    except Exception:
+        # забранные дни возвращаем, чтобы их пересчитал следующий вызов
+        if claimed[0] is not None:
+            db.execute("SELECT gost_stats_mark(%s, %s)", claimed)
+        raise
+    return True
+
+
+def fetch_by_period(grain, d_from, d_to, type_id=None):
+    """Показатели по дням, неделям или месяцам в [d_from, d_to).
+
+    Последняя колонка — изменение RevPAR к предыдущему периоду (lag()).
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Неизвестный период: {grain}")
+    return db.fetchall(
+        f"""
+        WITH g AS ({GRID_SQL}),
+        p AS (
+            SELECT date_trunc(%(grain)s, g.day)::date AS period,
+                   sum(g.sold) AS sold,
+                   sum(g.available) AS available,
+                   sum(g.revenue) AS revenue
+            FROM g
+            GROUP BY 1
+        ), m AS (
+            SELECT period, sold, available, revenue,
+                   revenue / NULLIF(available, 0) AS revpar
+            FROM p
+        )
+        SELECT period,
+               round(100.0 * sold / NULLIF(available, 0), 1) AS occupancy,
+               round(revenue / NULLIF(sold, 0), 2) AS adr,
+               round(revpar, 2) AS revpar,
+               round(revpar - lag(revpar) OVER (ORDER BY period), 2) AS revpar_delta,
+               round(revenue, 2) AS revenue
+        FROM m
+        ORDER BY period
+        """,
+        {"grain": grain, "d_from": d_from, "d_to": d_to, "type_id": type_id},
+    )
+
+
+def fetch_by_category(d_from, d_to):
+    """Показатели по категориям за [d_from, d_to) и доля каждой в выручке."""
+    return db.fetchall(
+        f"""
+        WITH g AS ({GRID_SQL}),
+        c AS (
+            SELECT g.type_id,
+                   sum(g.sold) AS sold,
+                   sum(g.available) AS available,
+                   sum(g.revenue) AS revenue
+            FROM g
+            GROUP BY g.type_id
+        )
+        SELECT rt.name,
+               round(100.0 * c.sold / NULLIF(c.available, 0), 1) AS occupancy,
+               round(c.revenue / NULLIF(c.sold, 0), 2) AS adr,
+               round(c.revenue / NULLIF(c.available, 0), 2) AS revpar,
+               round(100.0 * c.revenue / NULLIF(sum(c.revenue) OVER (), 0), 1) AS revenue_share,
+               round(c.revenue, 2) AS revenue
+        FROM c JOIN room_types rt ON rt.id = c.type_id
+        ORDER BY c.revenue DESC, rt.name
+        """,
+        {"d_from": d_from, "d_to": d_to, "type_id": None},
+    )
+
+
+def load_stats(grain, d_from, d_to, type_id=None):
+    """Всё для страницы одним вызовом в фоне: (по периодам, по категориям)."""
+    refresh_stats()
+    return fetch_by_period(grain, d_from, d_to, type_id), fetch_by_category(d_from, d_to)
@@ -0,0 +1,206 @@
+from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt, pyqtSignal
+
+# Сколько строк подгружаем за один запрос
+PAGE_SIZE = 200
+
+
+class LazyTableModel(QAbstractTableModel):
+    """Таблица, которая подгружает строки из БД страницами по мере прокрутки.
+
+    fetch_page(after, limit, *query_args) выполняется в фоновом потоке и
+    возвращает до limit строк, идущих после строки after (None — с начала);
+    render(row) превращает строку в тексты колонок. В памяти только то, что
+    пользователь уже пролистал.
+
+    fetch_rows(keys, *query_args) — необязательный запрос тех же строк по
+    ключам key_of(row); через него update_rows() точечно обновляет строки,
+    изменённые на других рабочих местах.
+    """
+
+    failed = pyqtSignal(object)
+
+    def __init__(
+        self,
+        worker,
+        key,
+        headers,
+        fetch_page,
+        render,
+        fetch_rows=None,
+        key_of=lambda row: row[0],
+        page_size=PAGE_SIZE,
+        parent=None,
+    ):
+        super().__init__(parent)
+        self.worker = worker
+        self.key = key
+        self.headers = headers
+        self.fetch_page = fetch_page
+        self.render = render
+        self.fetch_rows = fetch_rows
+        self.key_of = key_of
+        self.page_size = page_size
+        self.query_args = ()
+        self.rows = []
+        self._loading = False
+        self._exhausted = False
+        # растёт при каждой перезагрузке: ответы для старого набора строк отбрасываем
+        self._generation = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.render(self.rows[index.row()])[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._loading or self._exhausted:
+            return
+        self._request(self.rows[-1] if self.rows else None)
+
+    def row_at(self, row):
+        """Исходная строка запроса или None, если строка не выбрана."""
+        if 0 <= row < len(self.rows):
+            return self.rows[row]
+        return None
+
+    def set_query_args(self, *args):
+        """Меняем параметры запроса (например, фильтры) и перечитываем таблицу."""
+        self.query_args = args
+        self.reload()
+
+    def reload(self):
+        """Сбрасываем таблицу и заново грузим первую страницу."""
+        self.beginResetModel()
+        self.rows = []
+        self._exhausted = False
+        self._generation += 1
+        self.endResetModel()
+        # ключ задачи тот же, поэтому недогруженная страница отменяется
+        self._request(None)
+
+    def update_rows(self, keys):
+        """Перечитываем уже загруженные строки с ключами keys.
+
+        Новые строки здесь не добавляются — они появятся при следующей
+        перезагрузке, чтобы не сбивать пользователю прокрутку.
+        """
+        if self.fetch_rows is None:
+            return
+        keys = {self.key_of(r) for r in self.rows} & set(keys)
+        if not keys:
+            return
+        generation = self._generation
+        self.worker.submit(
+            None,
+            self.fetch_rows,
+            list(keys),
+            *self.query_args,
+            on_done=lambda rows: self._patch(generation, keys, rows),
+            on_error=self.failed.emit,
+        )
+
+    def _patch(self, generation, keys, rows):
+        if generation != self._generation:
+            return
+        fresh = {}
+        for r in rows:
+            fresh.setdefault(self.key_of(r), []).append(r)
+        # строки одного ключа идут подряд: (первая, последняя + 1)
+        blocks = {}
+        for i, r in enumerate(self.rows):
+            k = self.key_of(r)
+            if k in keys:
+                blocks[k] = (blocks.get(k, (i,))[0], i + 1)
+        # с конца, чтобы замена не сдвигала ещё не обработанные блоки
+        for k, (first, last) in sorted(blocks.items(), key=lambda kv: kv[1], reverse=True):
+            new = fresh.get(k, [])
+            if len(new) == last - first:
+                self.rows[first:last] = new
+                self.dataChanged.emit(
+                    self.index(first, 0), self.index(last - 1, len(self.headers) - 1)
+                )
+                continue
+            self.beginRemoveRows(QModelIndex(), first, last - 1)
+            del self.rows[first:last]
+            self.endRemoveRows()
+            if new:
+                self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+                self.rows[first:first] = new
+                self.endInsertRows()
+
+    def _request(self, after):
+        self._loading = True
+        self.worker.submit(
+            self.key,
+            self.fetch_page,
+            after,
+            self.page_size,
+            *self.query_args,
+            on_done=self._append,
+            on_error=self._failed,
+        )
+
+    def _append(self, rows):
+        self._loading = False
+        if len(rows) < self.page_size:
+            self._exhausted = True
+        if rows:
+            first = len(self.rows)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+
+    def _failed(self, e):
+        self._loading = False
+        self._exhausted = True
+        self.failed.emit(e)
+
+
+class RowsTableModel(QAbstractTableModel):
+    """Небольшая таблица готовых строк (итоги, справочники) без подгрузки."""
+
+    def __init__(self, headers, render=None, parent=None):
+        super().__init__(parent)
+        self.headers = headers
+        self.render = render or (lambda row: tuple("" if v is None else str(v) for v in row))
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.render(self.rows[index.row()])[index.column()]
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.headers[section]
+        return None
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = list(rows)
+        self.endResetModel()
+
+    def row_at(self, row):
+        if 0 <= row < len(self.rows):
+            return self.rows[row]
+        return None
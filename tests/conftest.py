@@ -0,0 +1,49 @@
+"""Общие фикстуры тестов.
+
+Тесты с базой идут, только если задан GOST_TEST_DSN (например,
+"dbname=gost_test user=postgres"): схема gost_test создаётся всеми
+миграциями, как на новой базе, и удаляется после теста.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA = "gost_test"
+
+
+@pytest.fixture
+def scratch_db():
+    dsn = os.environ.get("GOST_TEST_DSN")
+    if not dsn:
+        pytest.skip("GOST_TEST_DSN не задан")
+    import psycopg2
+
+    import migrate
+    from db import db
+    from refdata import refdata
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        # расширения ставим в public, иначе они уйдут вместе со схемой теста
+        cur.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    saved_dsn = db.dsn
+    db.dsn = f"{dsn} options='-c search_path={SCHEMA},public'"
+    db.connect()
+    try:
+        migrate.upgrade(log=lambda _: None)
+        refdata.invalidate()
+        yield db
+    finally:
+        db.close()
+        db.dsn = saved_dsn
+        refdata.invalidate()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
@@ -0,0 +1,44 @@
+from datetime import date
+
+import pytest
+
+import availability as availability_module
+from availability import Availability
+
+ROOMS = [(1, "101", "свободен")]
+# брони 1 и 2 пересекаются — так бывает, если bookings_no_overlap не создано
+BOOKINGS = [
+    (1, date(2025, 1, 1), date(2025, 1, 10), 1),
+    (1, date(2025, 1, 2), date(2025, 1, 4), 2),
+]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    def load(no_overlap, bookings):
+        db = availability_module.db
+        monkeypatch.setattr(db, "fetchone", lambda sql, params=None: (no_overlap,))
+        monkeypatch.setattr(
+            db, "fetchall", lambda sql, params=None: ROOMS if "FROM rooms" in sql else bookings
+        )
+        a = Availability()
+        a.load()
+        return a
+
+    return load
+
+
+def test_overlapping_bookings_without_constraint(cache):
+    a = cache(False, BOOKINGS)
+    # бинарный поиск нашёл бы только бронь 2 и счёл бы 5-е число свободным
+    assert not a.is_free(1, date(2025, 1, 5), date(2025, 1, 6))
+    assert not a.is_free(1, date(2025, 1, 5), date(2025, 1, 6), exclude_booking=2)
+    assert a.is_free(1, date(2025, 1, 10), date(2025, 1, 12))
+    assert a.free_rooms(date(2025, 1, 3), date(2025, 1, 5), exclude_booking=1) == []
+
+
+def test_constraint_present_uses_bisect(cache):
+    a = cache(True, BOOKINGS[:1] + [(1, date(2025, 1, 15), date(2025, 1, 20), 3)])
+    assert a.is_free(1, date(2025, 1, 10), date(2025, 1, 15))
+    assert not a.is_free(1, date(2025, 1, 9), date(2025, 1, 12))
+    assert a.is_free(1, date(2025, 1, 12), date(2025, 1, 18), exclude_booking=3)
@@ -0,0 +1,52 @@
+import base64
+import importlib
+import os
+
+import pytest
+
+
+@pytest.fixture
+def two_keys(monkeypatch, tmp_path):
+    """crypto_utils с двумя версиями ключа: 1 — исходный, 2 — текущий."""
+    import config
+    import crypto_utils
+
+    monkeypatch.setenv("GOST_KEY", base64.b64encode(os.urandom(32)).decode())
+    monkeypatch.setenv("GOST_KEYRING", "2:" + base64.b64encode(os.urandom(32)).decode())
+    monkeypatch.setenv("GOST_KEYS_DIR", str(tmp_path))
+    monkeypatch.delenv("GOST_KEY_ID", raising=False)
+    importlib.reload(config)
+    yield importlib.reload(crypto_utils)
+    monkeypatch.undo()
+    importlib.reload(config)
+    importlib.reload(crypto_utils)
+
+
+@pytest.mark.parametrize("count, workers", [(10, 1), (5000, 4)])
+def test_batch_round_trip_after_rotation(two_keys, count, workers):
+    cu = two_keys
+    assert sorted(cu.KEYRING) == [1, 2] and cu.CURRENT_KEY_ID == 2
+    data = [f"4510 {i:06d}".encode() for i in range(count)]
+    items = cu.encrypt_many(data, workers)
+    assert {key_id for key_id, _, _ in items} == {2}
+    assert cu.decrypt_many(items, workers) == data
+
+
+def test_legacy_and_current_keys_in_one_batch(two_keys):
+    cu = two_keys
+    legacy_nonce = os.urandom(12)
+    legacy_ct = cu._CIPHERS[1].encrypt(legacy_nonce, b"old", None)
+    (current,) = cu.encrypt_many([b"new"])
+    # NULL в passport_key_id — исходный ключ
+    items = [(None, legacy_nonce, legacy_ct), (1, legacy_nonce, legacy_ct), current]
+    assert cu.decrypt_many(items) == [b"old", b"old", b"new"]
+    assert cu.aes_decrypt(legacy_nonce, legacy_ct, None) == b"old"
+
+
+def test_wrong_key_id_is_rejected(two_keys):
+    from cryptography.exceptions import InvalidTag
+
+    cu = two_keys
+    ((_, nonce, ct),) = cu.encrypt_many([b"x"])
+    with pytest.raises(InvalidTag):
+        cu.decrypt_many([(1, nonce, ct)])
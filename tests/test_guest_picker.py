@@ -0,0 +1,27 @@
+from db import escape_like
+from guest_picker import _like, search_guests
+
+
+def test_search_matches_every_word_and_ranks_closer_first(scratch_db):
+    db = scratch_db
+    for first_name, last_name, phone in (
+        ("Иван", "Петров", "+79990001122"),
+        ("Пётр", "Иванов", "+79990003344"),
+        ("Анна", "Иванова", None),
+        ("Иван", "Сидоров_", "+79990005566"),
+    ):
+        db.execute(
+            "INSERT INTO guests(first_name, last_name, phone) VALUES (%s, %s, %s)",
+            (first_name, last_name, phone),
+        )
+
+    assert [r[2] for r in search_guests("Иванов")][:1] == ["Иванов"]
+    assert {r[2] for r in search_guests("иван пет")} == {"Петров"}
+    assert [r[2] for r in search_guests("0003")] == ["Иванов"]
+    # _ и % в тексте — обычные символы, а не шаблон ILIKE
+    assert [r[2] for r in search_guests("ов_")] == ["Сидоров_"]
+
+
+def test_like_patterns_escape_user_input():
+    assert escape_like(r"1_0%\a") == r"1\_0\%\\a"
+    assert _like("10_") == r"%10\_%"
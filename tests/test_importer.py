@@ -0,0 +1,32 @@
+from crypto_utils import aes_decrypt
+from importer import import_rows
+
+ROWS = [
+    (2, {"first_name": "Иван", "last_name": "Петров", "passport": "4510 123456"}),
+    (3, {"first_name": "Иван", "last_name": "Петров", "passport": "4510 654321"}),
+    (4, {"first_name": "Иван", "last_name": "Петров", "passport": "4510 123456"}),
+]
+
+
+def test_reimport_reuses_existing_guests(scratch_db):
+    db = scratch_db
+    assert import_rows(iter(ROWS), log=lambda _: None) == (3, [])
+    ids = [r[0] for r in db.fetchall("SELECT id FROM guests ORDER BY id")]
+    assert len(ids) == 2
+
+    room_id = db.fetchone("INSERT INTO rooms(number) VALUES ('T-1') RETURNING id")[0]
+    again = [
+        (2, {**ROWS[0][1], "room": "T-1", "date_from": "2025-01-01", "date_to": "2025-01-03",
+             "total_price": "100"}),
+    ]
+    assert import_rows(iter(again), log=lambda _: None) == (1, [])
+    assert [r[0] for r in db.fetchall("SELECT id FROM guests ORDER BY id")] == ids
+    iv, ct, key_id = db.fetchone(
+        """
+        SELECT g.passport_iv, g.passport_encrypted, g.passport_key_id
+        FROM bookings b JOIN guests g ON g.id = b.guest_id
+        WHERE b.room_id = %s
+        """,
+        (room_id,),
+    )
+    assert aes_decrypt(bytes(iv), bytes(ct), key_id) == b"4510 123456"
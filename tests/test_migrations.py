@@ -0,0 +1,27 @@
+import pytest
+
+import migrate
+
+
+def test_overlapping_bookings_block_the_constraint(scratch_db):
+    db = scratch_db
+    room_id = db.fetchone("INSERT INTO rooms(number) VALUES ('T-1') RETURNING id")[0]
+    db.execute("ALTER TABLE bookings DROP CONSTRAINT bookings_no_overlap")
+    ids = [
+        db.fetchone(
+            """
+            INSERT INTO bookings(room_id, date_from, date_to, status)
+            VALUES (%s, %s, %s, 'active') RETURNING id
+            """,
+            (room_id, d_from, d_to),
+        )[0]
+        for d_from, d_to in (("2025-01-01", "2025-01-05"), ("2025-01-03", "2025-01-07"))
+    ]
+    with pytest.raises(RuntimeError, match=f"{ids[0]} и {ids[1]}"):
+        with db.transaction() as cur:
+            migrate.module(5).up(cur)
+
+    db.execute("UPDATE bookings SET status = 'cancelled' WHERE id = %s", (ids[1],))
+    with db.transaction() as cur:
+        migrate.module(5).up(cur)
+    assert db.fetchone("SELECT 1 FROM pg_constraint WHERE conname = 'bookings_no_overlap'")
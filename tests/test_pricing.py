@@ -0,0 +1,111 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+import pricing as pricing_module
+from pricing import Pricing
+
+# 2025-01-03 — пятница
+FRI = date(2025, 1, 3)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    """Pricing с правилами и продажами из словаря вместо таблиц price_*."""
+
+    def make(rooms, capacity=None, seasons=(), weekdays=(), stay=(), occupancy=(), sold=()):
+        tables = {
+            "price_seasons": list(seasons),
+            "price_weekdays": list(weekdays),
+            "price_stay_discounts": list(stay),
+            "price_occupancy_surcharges": list(occupancy),
+            "daily_room_occupancy": list(sold),
+        }
+
+        def fetchall(sql, params=None):
+            return next(rows for table, rows in tables.items() if table in sql)
+
+        monkeypatch.setattr(pricing_module.db, "fetchall", fetchall)
+        refdata = pricing_module.refdata
+        monkeypatch.setattr(
+            refdata, "room_prices", lambda ids: {r: rooms[r] for r in ids if r in rooms}
+        )
+        monkeypatch.setattr(
+            refdata, "type_capacity", lambda ids: {t: (capacity or {}).get(t, 0) for t in ids}
+        )
+        return Pricing()
+
+    return make
+
+
+def test_without_rules_price_is_base_times_nights_minus_guest_discount(engine):
+    p = engine({1: (1, Decimal("1000.00"))})
+    assert p.quote(1, FRI, date(2025, 1, 6), discount=10) == Decimal("2700.00")
+    # бронь короче ночи — за одну ночь
+    assert p.quote(1, FRI, FRI) == Decimal("1000.00")
+
+
+def test_kopecks_round_half_up(engine):
+    p = engine({1: (1, Decimal("100.10"))}, seasons=[(FRI, date(2025, 1, 4), None, Decimal("1.05"))])
+    # 105.105 → 105.11, а не банковское 105.10
+    assert p.quote(1, FRI, date(2025, 1, 4)) == Decimal("105.11")
+
+
+def test_category_season_overrides_general_one(engine):
+    p = engine(
+        {1: (1, Decimal("1000")), 2: (2, Decimal("1000"))},
+        seasons=[
+            (FRI, date(2025, 1, 5), None, Decimal("1.2")),
+            (date(2025, 1, 4), date(2025, 1, 5), 1, Decimal("1.5")),
+        ],
+    )
+    stays = [(1, FRI, date(2025, 1, 6), 0), (2, FRI, date(2025, 1, 6), 0)]
+    assert p.price_stays(stays) == [Decimal("3700.00"), Decimal("3400.00")]
+
+
+def test_weekday_multiplier(engine):
+    p = engine({1: (1, Decimal("1000"))}, weekdays=[(5, Decimal("2.0"))])
+    # пятница ×1, суббота ×2
+    assert p.quote(1, FRI, date(2025, 1, 5)) == Decimal("3000.00")
+
+
+@pytest.mark.parametrize(
+    "nights, expected",
+    [(2, Decimal("2000.00")), (3, Decimal("2850.00")), (8, Decimal("7200.00"))],
+)
+def test_stay_length_discount_tiers(engine, nights, expected):
+    p = engine({1: (1, Decimal("1000"))}, stay=[(3, Decimal("5")), (7, Decimal("10"))])
+    assert p.quote(1, date(2025, 1, 1), date(2025, 1, 1 + nights)) == expected
+
+
+def test_guest_discount_applies_after_stay_discount(engine):
+    p = engine({1: (1, Decimal("333.33"))}, stay=[(3, Decimal("5"))])
+    # 999.99 × 0.95 = 949.9905 → 949.99; × 0.875 = 831.241… → 831.24
+    assert p.quote(1, date(2025, 1, 1), date(2025, 1, 4), discount=Decimal("12.5")) == Decimal(
+        "831.24"
+    )
+
+
+def test_occupancy_surcharge_tiers(engine):
+    p = engine(
+        {1: (1, Decimal("1000"))},
+        capacity={1: 2},
+        occupancy=[(Decimal("50"), Decimal("10")), (Decimal("100"), Decimal("25"))],
+        # (категория, ночь от начала, продано номеров)
+        sold=[(1, 0, 1), (1, 2, 2)],
+    )
+    # 50 % → +10 %, 0 % → без надбавки, 100 % → +25 %
+    assert p.quote(1, FRI, date(2025, 1, 6)) == Decimal("3350.00")
+
+
+@pytest.mark.parametrize("room_id", [None, 99])
+def test_unknown_room_is_an_error(engine, room_id):
+    p = engine({1: (1, Decimal("1000"))})
+    with pytest.raises(ValueError):
+        p.quote(room_id, FRI, date(2025, 1, 4))
+
+
+def test_room_without_category_is_free(engine):
+    p = engine({1: (None, None)})
+    assert p.quote(1, FRI, date(2025, 1, 4)) == Decimal("0.00")
@@ -0,0 +1,87 @@
+from datetime import date
+from decimal import Decimal
+
+import stats
+
+
+def seed_category(db, rooms):
+    """Категория с rooms номерами; возвращаем (type_id, [room_id])."""
+    type_id = db.fetchone(
+        "INSERT INTO room_types(name, base_price) VALUES ('Тест', 1000) RETURNING id"
+    )[0]
+    room_ids = [
+        db.fetchone(
+            "INSERT INTO rooms(number, type_id) VALUES (%s, %s) RETURNING id",
+            (f"T-{i}", type_id),
+        )[0]
+        for i in range(rooms)
+    ]
+    return type_id, room_ids
+
+
+def test_occupancy_uses_every_day_of_period(scratch_db):
+    db = scratch_db
+    type_id, (room_a, room_b) = seed_category(db, 2)
+    # 6 проданных ночей в начале октября, весь ноябрь пустой
+    for room_id, d_from, d_to in (
+        (room_a, date(2025, 10, 3), date(2025, 10, 6)),
+        (room_b, date(2025, 10, 10), date(2025, 10, 13)),
+    ):
+        db.execute(
+            """
+            INSERT INTO bookings(room_id, date_from, date_to, status, total_price)
+            VALUES (%s, %s, %s, 'active', 3000)
+            """,
+            (room_id, d_from, d_to),
+        )
+    stats.refresh_stats(force=True)
+    d_from, d_to = date(2025, 10, 1), date(2025, 12, 1)
+    days = (d_to - d_from).days
+
+    by_category = {row[0]: row for row in stats.fetch_by_category(d_from, d_to)}
+    _, occupancy, adr, revpar, _, revenue = by_category["Тест"]
+    assert occupancy == round(Decimal(100 * 6) / (2 * days), 1)
+    assert adr == Decimal("1000.00")
+    assert revenue == Decimal("6000.00")
+    assert revpar == round(Decimal(6000) / (2 * days), 2)
+
+    by_month = stats.fetch_by_period("month", d_from, d_to, type_id)
+    assert [(row[0], row[1]) for row in by_month] == [
+        (date(2025, 10, 1), round(Decimal(100 * 6) / (2 * 31), 1)),
+        (date(2025, 11, 1), Decimal("0.0")),
+    ]
+
+
+def test_refresh_recomputes_only_changed_days(scratch_db):
+    db = scratch_db
+    type_id, (room_a,) = seed_category(db, 1)
+    stats.refresh_stats(force=True)
+    assert stats.refresh_stats() is False
+
+    db.execute(
+        """
+        INSERT INTO bookings(room_id, date_from, date_to, status, total_price)
+        VALUES (%s, '2025-10-03', '2025-10-06', 'active', 3000)
+        """,
+        (room_a,),
+    )
+    assert db.fetchone("SELECT dirty_from, dirty_to FROM stats_state") == (
+        date(2025, 10, 3),
+        date(2025, 10, 5),
+    )
+    # строка вне помеченных дней не пересчитывается — так видно, что пересчёт не полный
+    db.execute(
+        "INSERT INTO stats_daily VALUES ('2025-01-01', %s, 99, 0)", (type_id,)
+    )
+    assert stats.refresh_stats() is True
+    assert db.fetchone("SELECT dirty_from FROM stats_state") == (None,)
+    assert db.fetchall(
+        "SELECT day, rooms_sold, revenue FROM stats_daily WHERE type_id = %s ORDER BY day",
+        (type_id,),
+    ) == [
+        (date(2025, 1, 1), 99, Decimal(0)),
+        (date(2025, 10, 3), 1, Decimal(1000)),
+        (date(2025, 10, 4), 1, Decimal(1000)),
+        (date(2025, 10, 5), 1, Decimal(1000)),
+    ]
+    assert stats.refresh_stats() is False
@@ -0,0 +1,161 @@
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from config import GOST_POOL_MAX
+from db import db
+
+
+class _TaskSignals(QObject):
+    done = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class DbTask(QRunnable):
+    """Функция работы с БД, выполняемая в фоновом потоке.
+
+    Всё, что функция делает через db.*, идёт через одно соединение пула,
+    закреплённое за потоком на время задачи.
+    """
+
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = _TaskSignals()
+        self.cancelled = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def run(self):
+        if self.cancelled:
+            self.signals.done.emit(None)
+            return
+        try:
+            with db.connection() as conn:
+                with self._lock:
+                    self._conn = conn
+                try:
+                    result = None if self.cancelled else self.fn(*self.args)
+                finally:
+                    with self._lock:
+                        self._conn = None
+        except Exception as e:
+            self.signals.failed.emit(e)
+            return
+        self.signals.done.emit(result)
+
+    def cancel(self):
+        """Помечаем задачу устаревшей и прерываем её запрос на сервере."""
+        self.cancelled = True
+        # под замком: соединение не успеет вернуться в пул к чужому запросу
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.cancel()
+                except Exception:
+                    pass
+
+
+class JobCancelled(Exception):
+    """Долгую задачу отменил пользователь."""
+
+
+class _JobSignals(QObject):
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class ProgressJob(QRunnable):
+    """Долгая задача fn(*args, progress=...) с ходом работы для GUI.
+
+    progress(готово, всего) передаёт прогресс в GUI-поток; после cancel()
+    очередной вызов progress прерывает задачу исключением JobCancelled.
+    """
+
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = _JobSignals()
+        self.cancelled = False
+
+    def _progress(self, done, total):
+        if self.cancelled:
+            raise JobCancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, progress=self._progress)
+        except Exception as e:
+            self.signals.failed.emit(e)
+            return
+        self.signals.done.emit(result)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class DbWorker(QObject):
+    """Очередь фоновых запросов с доставкой результата в GUI-поток.
+
+    Задачи с одинаковым ключом вытесняют друг друга: новая перезагрузка
+    отменяет предыдущую, и её результат уже не попадёт в виджеты.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        # одно соединение пула оставляем GUI-потоку
+        self.pool.setMaxThreadCount(max(1, GOST_POOL_MAX - 1))
+        self._latest = {}
+        self._tasks = set()
+
+    def submit(self, key, fn, *args, on_done=None, on_error=None):
+        """Запускаем fn(*args) в фоне; key=None — задачу не вытесняем."""
+        if key is not None:
+            prev = self._latest.get(key)
+            if prev is not None:
+                prev.cancel()
+        task = DbTask(fn, *args)
+        task.setAutoDelete(False)
+        task.signals.done.connect(lambda result: self._finish(key, task, on_done, result))
+        task.signals.failed.connect(lambda err: self._finish(key, task, on_error, err))
+        if key is not None:
+            self._latest[key] = task
+        self._tasks.add(task)
+        self.pool.start(task)
+        return task
+
+    def start_job(self, fn, *args, on_progress=None, on_done=None, on_error=None):
+        """Запускаем долгую задачу с прогрессом; вернём её, чтобы можно было отменить."""
+        job = ProgressJob(fn, *args)
+        job.setAutoDelete(False)
+        if on_progress is not None:
+            job.signals.progress.connect(on_progress)
+        job.signals.done.connect(lambda result: self._finish(None, job, on_done, result))
+        job.signals.failed.connect(lambda err: self._finish(None, job, on_error, err))
+        self._tasks.add(job)
+        self.pool.start(job)
+        return job
+
+    def _finish(self, key, task, callback, value):
+        self._tasks.discard(task)
+        if key is not None and self._latest.get(key) is task:
+            del self._latest[key]
+        if task.cancelled or callback is None:
+            return
+        callback(value)
+
+    def shutdown(self):
+        """Отменяем чтения и долгие задачи, дожидаемся записей и остановки потоков.
+
+        Задачи без ключа (запись через submit_write) не прерываем: отмена
+        запроса на сервере откатила бы правку, которую пользователь уже сделал.
+        """
+        for task in list(self._tasks):
+            if isinstance(task, ProgressJob) or task in self._latest.values():
+                task.cancel()
+        self.pool.waitForDone()